@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark password hashing costs.
+
+Times one hash for each candidate policy (PBKDF2-SHA256 at several iteration
+counts, scrypt at several work factors) and translates it into what matters
+for sizing: logins per second per worker, how long a 60-student class takes
+to log in at once on the given number of cores, and the memory each scrypt
+hash needs while it runs.
+
+Usage:
+    python bench_password_hashing.py [--cores 1] [--workers 2] [--repeat 5] [--json results.json]
+"""
+import argparse
+import json
+import math
+import time
+
+from webapp.credentials import HashPolicy, hash_password, verify_password
+
+PBKDF2_ITERATIONS = (20000, 100000, 260000, 600000)
+SCRYPT_PARAMS = ((2 ** 14, 8, 1), (2 ** 15, 8, 1), (2 ** 16, 8, 1))
+CLASS_SIZE = 60
+
+
+def candidate_policies():
+    for iterations in PBKDF2_ITERATIONS:
+        yield f'pbkdf2:sha256:{iterations}', HashPolicy('pbkdf2', iterations, None, None, None)
+    for n, r, p in SCRYPT_PARAMS:
+        yield f'scrypt:{n}:{r}:{p}', HashPolicy('scrypt', None, n, r, p)
+
+
+def time_verify(policy, repeat):
+    password_hash = hash_password('correct horse battery staple', policy=policy)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert verify_password(password_hash, 'correct horse battery staple')
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark password hashing policies.')
+    parser.add_argument('--cores', type=int, default=1, help='CPU cores available to the app (default: 1)')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn workers (default: 2)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed verifications per policy (default: 5)')
+    parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    parallel = max(1, min(args.cores, args.workers))
+    results = {'cores': args.cores, 'workers': args.workers, 'policies': {}}
+
+    print(f"{'policy':<24}{'ms/login':>10}{'logins/s':>10}{f'class of {CLASS_SIZE}':>14}{'memory':>10}")
+    for name, policy in candidate_policies():
+        seconds = time_verify(policy, args.repeat)
+        memory_mb = 128 * policy.scrypt_n * policy.scrypt_r * policy.scrypt_p / 2 ** 20 if policy.method == 'scrypt' else 0
+        class_seconds = math.ceil(CLASS_SIZE / parallel) * seconds
+        results['policies'][name] = {
+            'ms_per_login': round(seconds * 1000, 2),
+            'logins_per_sec': round(parallel / seconds, 1),
+            'class_login_seconds': round(class_seconds, 2),
+            'memory_mb_per_hash': round(memory_mb, 1)
+        }
+        print(f"{name:<24}{seconds * 1000:>10.1f}{parallel / seconds:>10.1f}{class_seconds:>13.1f}s"
+              f"{(f'{memory_mb:.0f} MB' if memory_mb else '-'):>10}")
+
+    print(f"\nThroughput assumes {parallel} hash(es) in parallel (min of cores and workers).")
+    print("scrypt memory is per concurrent login; keep workers x memory below the instance limit.")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
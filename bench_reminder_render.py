@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark reminder email construction for bulk sends.
+
+Compares building multipart reminder messages with the shared, precompiled
+ReminderRenderer against compiling the templates for every message.
+
+Usage:
+    python bench_reminder_render.py [--count 10000] [--json results.json]
+"""
+import argparse
+import json
+import time
+
+from webapp.email_service import ReminderRenderer, ReminderRow
+
+
+def make_rows(count):
+    return [
+        ReminderRow(f'student{i}@student.pgpc.edu', f'Student {i}', 'BSCS', f'BSCS-{i % 4 + 1}A')
+        for i in range(count)
+    ]
+
+
+def bench_precompiled(rows, sender):
+    renderer = ReminderRenderer()
+    start = time.perf_counter()
+    total_bytes = 0
+    for _, message in renderer.build_messages(rows, sender):
+        total_bytes += len(message.as_bytes())
+    return time.perf_counter() - start, total_bytes
+
+
+def bench_per_message(rows, sender):
+    start = time.perf_counter()
+    total_bytes = 0
+    for row in rows:
+        # Compiles both templates again for every recipient
+        renderer = ReminderRenderer()
+        total_bytes += len(renderer.build_message(row, sender).as_bytes())
+    return time.perf_counter() - start, total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reminder message construction.')
+    parser.add_argument('--count', type=int, default=10000, help='Number of recipients (default: 10000)')
+    parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    rows = make_rows(args.count)
+    sender = 'admin@pgpc.edu'
+    results = {'recipients': args.count}
+
+    for name, bench in (('precompiled', bench_precompiled), ('per_message_compile', bench_per_message)):
+        elapsed, total_bytes = bench(rows, sender)
+        results[name] = {
+            'seconds': round(elapsed, 3),
+            'messages_per_sec': round(args.count / elapsed, 1) if elapsed > 0 else None,
+            'avg_message_bytes': total_bytes // args.count if args.count else 0
+        }
+        print(f"{name:>20}: {elapsed:.3f}s for {args.count} messages "
+              f"({results[name]['messages_per_sec']} msg/s, {results[name]['avg_message_bytes']} bytes avg)")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
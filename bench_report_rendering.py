@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Benchmark PDF report rendering.
+
+Renders synthetic data for each report at several staff counts and records
+render time, PDF size and (with --memory) the peak Python memory traced
+while rendering:
+
+- results:        combined all-staff results, regular layout, into memory
+- results_large:  combined results, large-report layout, into a spooled file
+- detailed:       detailed results of one staff type
+- individual:     every staff member's individual report, one after another
+
+Staff are split 3:1 between teaching and non-teaching. The data is seeded,
+so PDF sizes only change when the layout does. Pass --baseline with a JSON
+file from an earlier run to fail (exit 1) when a report got slower or its
+size changed by more than --tolerance.
+
+Usage:
+    python bench_report_rendering.py [--sizes 10,100,1000] [--reports results,detailed]
+                                     [--repeat 3] [--memory] [--json results.json]
+                                     [--baseline old.json] [--tolerance 0.25]
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from webapp.reports import (CriteriaScore, StaffComment, StaffReportData, render_detailed_pdf,
+                            render_individual_staff_pdf, render_results_pdf)
+
+SPOOL_MAX_BYTES = 4 * 1024 * 1024
+DEFAULT_SIZES = (10, 100, 1000)
+# Slowdowns smaller than this are timer noise, whatever the ratio
+MIN_SLOWDOWN_SECONDS = 0.05
+COMMENTS_PER_STAFF = 3
+
+
+def synthetic_sections(staff, criteria_count, seed=1):
+    rng = random.Random(seed)
+    criteria = [f'Criteria {i + 1}' for i in range(criteria_count)]
+    sections = []
+    for staff_type, count in (('teaching', staff - staff // 4), ('non_teaching', staff // 4)):
+        results = []
+        for i in range(count):
+            scores = {crit: rng.uniform(1, 5) for crit in criteria}
+            results.append(dict(scores, StaffName=f'Staff Member {staff_type[0].upper()}{i:05d}',
+                                TotalScore=sum(scores.values()), Rank=0))
+        results.sort(key=lambda x: x['TotalScore'], reverse=True)
+        for rank, result in enumerate(results, 1):
+            result['Rank'] = rank
+        sections.append((staff_type, results, criteria))
+    return sections
+
+
+def synthetic_staff_reports(sections, seed=1):
+    rng = random.Random(seed)
+    submitted = datetime(2024, 5, 1)
+    reports = []
+    for _, results, criteria in sections:
+        for i, staff in enumerate(results):
+            scores = tuple(CriteriaScore(crit, staff[crit], rng.randint(5, 60)) for crit in criteria)
+            comments = tuple(StaffComment(f'Comment {n + 1} about {staff["StaffName"]}: clear lectures, '
+                                          f'helpful during consultation hours.', submitted + timedelta(days=n))
+                             for n in range(COMMENTS_PER_STAFF))
+            reports.append(StaffReportData(f'{i:08d}-0000-0000-0000-000000000000', staff['StaffName'],
+                                           staff['TotalScore'] / len(criteria), scores, comments))
+    return reports
+
+
+def render_results(sections, reports):
+    buffer = BytesIO()
+    render_results_pdf(sections, buffer)
+    return len(buffer.getvalue())
+
+
+def render_results_large(sections, reports):
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as output:
+        render_results_pdf(sections, output, large=True)
+        return output.tell()
+
+
+def render_detailed(sections, reports):
+    staff_type, results, criteria = sections[0]
+    buffer = BytesIO()
+    render_detailed_pdf(staff_type, results, criteria, buffer)
+    return len(buffer.getvalue())
+
+
+def render_individual(sections, reports):
+    return sum(len(render_individual_staff_pdf(report)) for report in reports)
+
+
+REPORTS = {
+    'results': render_results,
+    'results_large': render_results_large,
+    'detailed': render_detailed,
+    'individual': render_individual,
+}
+
+
+def measure(render, sections, reports, repeat, memory):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = render(sections, reports)
+        timings.append(time.perf_counter() - start)
+    result = {'seconds': round(min(timings), 3), 'pdf_bytes': size}
+    if memory:
+        tracemalloc.start()
+        render(sections, reports)
+        result['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a previous run's results, as printable strings."""
+    regressions = []
+    for key, result in results.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        slowdown = result['seconds'] - old['seconds']
+        if slowdown > old['seconds'] * tolerance and slowdown > MIN_SLOWDOWN_SECONDS:
+            regressions.append(f"{key}: {old['seconds']:.3f}s -> {result['seconds']:.3f}s")
+        if abs(result['pdf_bytes'] - old['pdf_bytes']) > old['pdf_bytes'] * tolerance:
+            regressions.append(f"{key}: {old['pdf_bytes']} -> {result['pdf_bytes']} bytes")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PDF report rendering.')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Comma-separated staff counts (default: 10,100,1000)')
+    parser.add_argument('--reports', default=','.join(REPORTS), help=f"Comma-separated reports (default: all of {', '.join(REPORTS)})")
+    parser.add_argument('--criteria', type=int, default=4, help='Criteria columns (default: 4)')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed renders per report, best is kept (default: 1)')
+    parser.add_argument('--memory', action='store_true', help='Also trace peak Python memory (one extra render each)')
+    parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative change vs baseline (default: 0.25)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    report_names = [name.strip() for name in args.reports.split(',')]
+    unknown = [name for name in report_names if name not in REPORTS]
+    if unknown:
+        parser.error(f"unknown report(s): {', '.join(unknown)}")
+
+    results = {}
+    print(f"{'report':<16}{'staff':>7}{'seconds':>10}{'PDF KB':>10}{'ms/staff':>10}" + (f"{'peak MB':>10}" if args.memory else ''))
+    for staff in sizes:
+        sections = synthetic_sections(staff, args.criteria)
+        reports = synthetic_staff_reports(sections) if 'individual' in report_names else []
+        for name in report_names:
+            result = measure(REPORTS[name], sections, reports, args.repeat, args.memory)
+            results[f'{name}@{staff}'] = result
+            print(f"{name:<16}{staff:>7}{result['seconds']:>10.3f}{result['pdf_bytes'] / 1024:>10.0f}"
+                  f"{result['seconds'] * 1000 / staff:>10.2f}" + (f"{result['peak_mb']:>10.1f}" if args.memory else ''))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'criteria': args.criteria, 'results': results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent evaluation submissions.
+
+Seeds benchmark students into the configured database (DATABASE_URL), then
+posts the evaluation form for all of them from several threads through the
+Flask test client. Reports end-to-end request latency, the time spent
+inside the submission transaction (from first write to commit) and
+throughput in submissions/sec.
+
+--mode picks direct commits (one transaction per request), group commit
+(SUBMISSION_GROUP_COMMIT) or both, run one after the other for comparison.
+
+Usage:
+    python bench_submissions.py [--students 200] [--threads 8] [--rounds 1]
+                                [--mode direct|group|both] [--json results.json]
+
+Benchmark students use the BENCH- prefix; pass --cleanup to remove them and
+their submissions afterwards. The app is created with OUTBOX_DISPATCHER=off,
+so no email dispatcher thread polls the database during the measurement.
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from webapp import create_app, submissions
+from webapp.models import db, Student, Survey, Question, SurveyStatus, Teacher, SurveySession, Answer, StudentComment
+from webapp.score_index import delete_score_cells
+
+BENCH_PREFIX = 'BENCH-'
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values_ms):
+    if not values_ms:
+        return {}
+    return {
+        'count': len(values_ms),
+        'mean_ms': round(statistics.mean(values_ms), 2),
+        'p50_ms': round(percentile(values_ms, 50), 2),
+        'p95_ms': round(percentile(values_ms, 95), 2),
+        'p99_ms': round(percentile(values_ms, 99), 2),
+        'max_ms': round(max(values_ms), 2)
+    }
+
+
+def seed_students(count):
+    """Create missing benchmark students and return their (uuid, student_id) pairs."""
+    password_hash = generate_password_hash('bench', method='pbkdf2:sha256:1000')
+    existing = {s.student_id for s in Student.query.filter(Student.student_id.like(f'{BENCH_PREFIX}%'))}
+    for i in range(count):
+        student_id = f'{BENCH_PREFIX}{i:05d}'
+        if student_id not in existing:
+            db.session.add(Student(
+                student_id=student_id,
+                full_name=f'Bench Student {i}',
+                email=f'{student_id.lower()}@bench.pgpc.edu',
+                program='BSCS',
+                section='BSCS-2A',
+                password_hash=password_hash,
+                password_changed=True
+            ))
+    db.session.commit()
+    return [(str(s.id), s.student_id) for s in Student.query.filter(Student.student_id.like(f'{BENCH_PREFIX}%'))
+            .order_by(Student.student_id).limit(count)]
+
+
+def cleanup():
+    bench_ids = [s.id for s in Student.query.filter(Student.student_id.like(f'{BENCH_PREFIX}%'))]
+    if not bench_ids:
+        return 0
+    session_ids = [s.session_id for s in SurveySession.query.filter(SurveySession.student_uuid.in_(bench_ids))]
+    if session_ids:
+        Answer.query.filter(Answer.session_id.in_(session_ids)).delete(synchronize_session=False)
+        delete_score_cells(session_ids)
+        StudentComment.query.filter(StudentComment.session_id.in_(session_ids)).delete(synchronize_session=False)
+        SurveySession.query.filter(SurveySession.session_id.in_(session_ids)).delete(synchronize_session=False)
+    Student.query.filter(Student.id.in_(bench_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(bench_ids)
+
+
+def build_form(question_ids, teacher_ids, seed):
+    form = {}
+    for t_index, teacher_id in enumerate(teacher_ids):
+        for q_index, question_id in enumerate(question_ids):
+            form[f'score_{teacher_id}_{question_id}'] = str((seed + t_index + q_index) % 5 + 1)
+        form[f'comment_{teacher_id}'] = f'Benchmark comment {seed}'
+    return form
+
+
+def instrument_transactions(samples, lock):
+    """Time write_submission + commit of direct (non-grouped) submissions by wrapping save_submission."""
+    original = submissions.save_submission
+
+    def timed_save(submission):
+        started = time.perf_counter()
+        try:
+            return original(submission)
+        finally:
+            with lock:
+                samples.append((time.perf_counter() - started) * 1000)
+
+    submissions.save_submission = timed_save
+    return original
+
+
+def run_mode(app, mode, students, question_ids, teacher_ids, args):
+    """Submit every student's form `args.rounds` times and return the measurements."""
+    app.config['SUBMISSION_GROUP_COMMIT'] = mode == 'group'
+
+    transaction_ms = []
+    request_ms = []
+    errors = []
+    lock = threading.Lock()
+    original_save = instrument_transactions(transaction_ms, lock)
+
+    def submit(job):
+        (student_uuid, student_id), round_no = job
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = student_uuid
+            sess['user_id'] = student_uuid
+            sess['user_role'] = 'student'
+        started = time.perf_counter()
+        response = client.post('/submit_evaluation', data=build_form(question_ids, teacher_ids, round_no))
+        elapsed = (time.perf_counter() - started) * 1000
+        with client.session_transaction() as sess:
+            failed = [message for category, message in sess.get('_flashes', []) if category != 'success']
+        with lock:
+            request_ms.append(elapsed)
+            if response.status_code != 302 or failed:
+                errors.append(f'{student_id}: HTTP {response.status_code} {failed}')
+
+    jobs = [(student, round_no) for round_no in range(args.rounds) for student in students]
+    wall_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(submit, jobs))
+    finally:
+        submissions.save_submission = original_save
+    wall = time.perf_counter() - wall_start
+
+    results = {
+        'mode': mode,
+        'wall_seconds': round(wall, 3),
+        'submissions_per_sec': round(len(jobs) / wall, 1) if wall > 0 else None,
+        'errors': len(errors),
+        'request': summarize(request_ms),
+        'transaction': summarize(transaction_ms)
+    }
+    if mode == 'group':
+        from webapp.group_commit import get_group_commit_writer
+        results['group_commit'] = get_group_commit_writer(app).stats()
+
+    print(f"[{mode}] Throughput: {results['submissions_per_sec']} submissions/sec "
+          f"({wall:.2f}s wall, {len(errors)} errors)")
+    for name in ('request', 'transaction'):
+        summary = results[name]
+        if summary:
+            print(f"{name:>12}: p50 {summary['p50_ms']} ms | p95 {summary['p95_ms']} ms | "
+                  f"p99 {summary['p99_ms']} ms | max {summary['max_ms']} ms")
+    if 'group_commit' in results:
+        print(f"{'batches':>12}: {results['group_commit']}")
+    for error in errors[:10]:
+        print(f"  ! {error}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent evaluation submissions.')
+    parser.add_argument('--students', type=int, default=200, help='Number of benchmark students (default: 200)')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent submitters (default: 8)')
+    parser.add_argument('--rounds', type=int, default=1, help='Submissions per student; >1 exercises resubmission (default: 1)')
+    parser.add_argument('--teachers', type=int, default=10, help='Staff evaluated per submission (default: 10)')
+    parser.add_argument('--mode', choices=('direct', 'group', 'both'), default='both',
+                        help='Commit strategy to benchmark (default: both)')
+    parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+    parser.add_argument('--cleanup', action='store_true', help='Remove benchmark students and submissions afterwards')
+    args = parser.parse_args()
+
+    os.environ.setdefault('OUTBOX_DISPATCHER', 'off')
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        status = SurveyStatus.query.get(1)
+        survey = Survey.query.filter_by(is_active=True).first()
+        if not status or not status.is_active or not survey:
+            print("❌ Activate the evaluation period and a survey before benchmarking.")
+            return
+        question_ids = [str(q.id) for q in Question.query.filter_by(survey_id=survey.id)]
+        teacher_ids = [str(t.id) for t in Teacher.query.limit(args.teachers)]
+        students = seed_students(args.students)
+
+    print(f"Submitting {len(question_ids)} questions x {len(teacher_ids)} staff for "
+          f"{len(students)} students, {args.rounds} round(s), {args.threads} threads")
+
+    results = {
+        'students': len(students),
+        'rounds': args.rounds,
+        'threads': args.threads,
+        'questions': len(question_ids),
+        'staff': len(teacher_ids),
+        'modes': {}
+    }
+    modes = ('direct', 'group') if args.mode == 'both' else (args.mode,)
+    for mode in modes:
+        results['modes'][mode] = run_mode(app, mode, students, question_ids, teacher_ids, args)
+
+    if args.cleanup:
+        with app.app_context():
+            print(f"🧹 Removed {cleanup()} benchmark students")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
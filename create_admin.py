@@ -13,7 +13,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'webapp'))
 from webapp import create_app
 from webapp.database import db
 from webapp.models import User
-from werkzeug.security import generate_password_hash
+from webapp.credentials import hash_password
 
 def create_admin_user():
     """Create the default admin user."""
@@ -32,7 +32,7 @@ def create_admin_user():
             # Create admin user
             admin_user = User(
                 email='admin@pgpc.edu',
-                password_hash=generate_password_hash('adminpass', method='pbkdf2:sha256'),
+                password_hash=hash_password('adminpass'),
                 role='staff',
                 name='System Administrator'
             )
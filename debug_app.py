@@ -10,6 +10,8 @@ try:
     from webapp import create_app
     
     print("Creating app...")
+    # Served through the debug reloader: only its child process starts background workers
+    os.environ.setdefault('FLASK_DEBUG', '1')
     app = create_app()
     
     print("App created successfully!")
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Load test for the student evaluation path: login -> student home -> submit.
+
+Seeds a synthetic department with sections, teachers and students into the
+configured database, then runs many virtual students concurrently. Each
+virtual student logs in, loads the dashboard, reads the evaluation form from
+the page and submits it. Per-step latency percentiles, throughput and error
+rates are printed and can be saved as JSON to compare runs.
+
+Targets:
+    --target client         in-process Flask test client (default)
+    --target http --base-url http://127.0.0.1:8000
+                            a running server (e.g. gunicorn) over HTTP
+
+The database comes from DATABASE_URL; --database-url overrides it (use
+sqlite:///loadtest.db for a throwaway local database). An evaluation period
+and an active teaching survey are required; --activate switches them on.
+
+All virtual students come from one IP, so login throttling (webapp/ratelimit.py)
+would shed most logins as one client. The in-process app is created with
+LOGIN_RATE_LIMIT_BACKEND=off unless --login-throttle is given; for
+--target http, start the server with LOGIN_RATE_LIMIT_BACKEND=off. It also
+runs with OUTBOX_DISPATCHER=off, so no email dispatcher thread adds queries
+to the measured requests.
+
+Usage:
+    python loadtest.py --students 500 --threads 16 --activate --json run.json
+    python loadtest.py --seed-only --students 2000 --database-url postgresql://...
+    python loadtest.py --target http --base-url http://127.0.0.1:8000 --no-seed
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+LOAD_PROGRAM = 'LOAD'
+NON_TEACHING_DEPARTMENT = 'Admin'
+STUDENT_PREFIX = 'LOAD-'
+STEPS = ('login', 'student_home', 'submit_evaluation')
+
+SCORE_FIELD_RE = re.compile(r'name="score_([0-9a-fA-F-]{36})_([0-9a-fA-F-]{36})"')
+TOKEN_FIELD_RE = re.compile(r'name="submission_token" value="([^"]+)"')
+
+
+# --- Seeding ---
+
+def seed(app, students, sections, teachers_per_section, password):
+    """Create the synthetic department, sections, teachers and students if missing."""
+    from werkzeug.security import generate_password_hash
+    from webapp.models import db, Department, Section, Teacher, Student
+
+    with app.app_context():
+        department = Department.query.filter_by(name=LOAD_PROGRAM).first()
+        if not department:
+            department = Department(name=LOAD_PROGRAM)
+            db.session.add(department)
+            db.session.flush()
+
+        section_names = [f'{i + 1}A' for i in range(sections)]
+        existing_sections = {s.name: s for s in Section.query.filter_by(department_id=department.id)}
+        for name in section_names:
+            if name not in existing_sections:
+                existing_sections[name] = Section(name=name, department_id=department.id)
+                db.session.add(existing_sections[name])
+        db.session.flush()
+
+        existing_teachers = {t.email for t in Teacher.query.filter(Teacher.email.like('load-teacher-%'))}
+        for s_index, name in enumerate(section_names):
+            for t_index in range(teachers_per_section):
+                email = f'load-teacher-{s_index}-{t_index}@load.pgpc.edu'
+                if email in existing_teachers:
+                    continue
+                teacher = Teacher(name=f'Load Teacher {name}-{t_index}', email=email,
+                                  department=LOAD_PROGRAM, section=f'{LOAD_PROGRAM}-{name}')
+                teacher.departments_assigned.append(department)
+                teacher.sections_assigned.append(existing_sections[name])
+                db.session.add(teacher)
+
+        # One hash for everyone: same cost per login as a real account, without N hashes at seed time
+        password_hash = generate_password_hash(password)
+        existing_students = {s for (s,) in db.session.query(Student.student_id)
+                             .filter(Student.student_id.like(f'{STUDENT_PREFIX}%'))}
+        for i in range(students):
+            student_id = f'{STUDENT_PREFIX}{i:06d}'
+            if student_id in existing_students:
+                continue
+            db.session.add(Student(
+                student_id=student_id,
+                full_name=f'Load Student {i}',
+                email=f'{student_id.lower()}@load.pgpc.edu',
+                program=LOAD_PROGRAM,
+                section=f'{LOAD_PROGRAM}-{section_names[i % len(section_names)]}',
+                password_hash=password_hash,
+                password_changed=True
+            ))
+        db.session.commit()
+        print(f"Seeded: {students} students, {sections} sections, {teachers_per_section} teachers per section")
+
+
+def activate(app):
+    """Open the evaluation period and make sure one teaching survey is active."""
+    from webapp.models import db, Survey, SurveyStatus
+
+    with app.app_context():
+        status = SurveyStatus.query.get(1)
+        if not status:
+            status = SurveyStatus(id=1)
+            db.session.add(status)
+        status.is_active = True
+        if not Survey.query.filter_by(is_active=True).first():
+            survey = Survey.query.filter_by(staff_type='teaching').first()
+            if not survey:
+                raise SystemExit('No teaching survey exists to activate.')
+            survey.is_active = True
+        db.session.commit()
+
+
+def reset_submissions(app):
+    """Remove earlier load-test submissions so every run starts from first-time submits."""
+    from webapp.models import db, Student, SurveySession, Answer, StudentComment
+    from webapp.score_index import delete_score_cells
+
+    with app.app_context():
+        student_ids = db.session.query(Student.id).filter(Student.student_id.like(f'{STUDENT_PREFIX}%'))
+        session_ids = [s for (s,) in db.session.query(SurveySession.session_id)
+                       .filter(SurveySession.student_uuid.in_(student_ids))]
+        for start in range(0, len(session_ids), 500):
+            chunk = session_ids[start:start + 500]
+            Answer.query.filter(Answer.session_id.in_(chunk)).delete(synchronize_session=False)
+            delete_score_cells(chunk)
+            StudentComment.query.filter(StudentComment.session_id.in_(chunk)).delete(synchronize_session=False)
+            SurveySession.query.filter(SurveySession.session_id.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+        return len(session_ids)
+
+
+# --- Clients ---
+
+class TestClientSession:
+    """One virtual student driving the app through the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def post(self, path, data):
+        response = self.client.post(path, data=data)
+        return response.status_code, response.headers.get('Location', ''), ''
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, '', response.get_data(as_text=True)
+
+    def last_flash_category(self):
+        with self.client.session_transaction() as sess:
+            flashes = sess.get('_flashes') or []
+        return flashes[-1][0] if flashes else None
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpSession:
+    """One virtual student driving a running server over HTTP (stdlib only)."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.headers.get('Location', ''), response.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Location', ''), ''
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode(data).encode()
+        return self._open(urllib.request.Request(self.base_url + path, data=body, method='POST'))
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def last_flash_category(self):
+        # Flashes live in the signed cookie; the redirect status is the signal over HTTP
+        return None
+
+
+# --- Scenario ---
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.error_samples = []
+        self.completed = 0
+
+    def record(self, step, elapsed_ms, ok, detail=None):
+        with self.lock:
+            self.latencies[step].append(elapsed_ms)
+            if not ok:
+                self.errors[step] += 1
+                if len(self.error_samples) < 20:
+                    self.error_samples.append(f'{step}: {detail}')
+
+    def done(self):
+        with self.lock:
+            self.completed += 1
+
+
+def build_form(html, seed):
+    form = {}
+    staff_ids = []
+    for teacher_id, question_id in SCORE_FIELD_RE.findall(html):
+        form[f'score_{teacher_id}_{question_id}'] = str((seed + len(form)) % 5 + 1)
+        if teacher_id not in staff_ids:
+            staff_ids.append(teacher_id)
+    if staff_ids:
+        form[f'comment_{staff_ids[0]}'] = f'Load test comment {seed}'
+    token = TOKEN_FIELD_RE.search(html)
+    if token:
+        form['submission_token'] = token.group(1)
+    return form
+
+
+def run_student(make_session, recorder, student_index, password):
+    client = make_session()
+    student_id = f'{STUDENT_PREFIX}{student_index:06d}'
+
+    started = time.perf_counter()
+    status, location, _ = client.post('/login', {'loginId': student_id, 'password': password, 'role': 'student'})
+    ok = status == 302 and 'student' in location
+    recorder.record('login', (time.perf_counter() - started) * 1000, ok, f'{student_id} HTTP {status} -> {location}')
+    if not ok:
+        return
+
+    started = time.perf_counter()
+    status, _, html = client.get('/student/home')
+    form = build_form(html, student_index) if status == 200 else {}
+    ok = status == 200 and bool(form)
+    recorder.record('student_home', (time.perf_counter() - started) * 1000, ok,
+                    f'{student_id} HTTP {status}, {len(form)} form fields')
+    if not ok:
+        return
+
+    started = time.perf_counter()
+    status, _, _ = client.post('/submit_evaluation', form)
+    category = client.last_flash_category()
+    ok = status == 302 and category in (None, 'success')
+    recorder.record('submit_evaluation', (time.perf_counter() - started) * 1000, ok,
+                    f'{student_id} HTTP {status}, flash {category}')
+    recorder.done()
+
+
+# --- Reporting ---
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values_ms, errors):
+    if not values_ms:
+        return {'count': 0, 'errors': errors}
+    return {
+        'count': len(values_ms),
+        'errors': errors,
+        'error_rate': round(errors / len(values_ms), 4),
+        'mean_ms': round(statistics.mean(values_ms), 2),
+        'p50_ms': round(percentile(values_ms, 50), 2),
+        'p95_ms': round(percentile(values_ms, 95), 2),
+        'p99_ms': round(percentile(values_ms, 99), 2),
+        'max_ms': round(max(values_ms), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the student login/dashboard/submit path.')
+    parser.add_argument('--students', type=int, default=200, help='Virtual students (default: 200)')
+    parser.add_argument('--sections', type=int, default=4, help='Sections in the load-test department (default: 4)')
+    parser.add_argument('--teachers-per-section', type=int, default=5, help='Teachers per section (default: 5)')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent virtual students (default: 8)')
+    parser.add_argument('--target', choices=('client', 'http'), default='client', help='How to drive the app')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000', help='Server URL for --target http')
+    parser.add_argument('--database-url', help='Override DATABASE_URL for seeding and the test client')
+    parser.add_argument('--password', default='loadtest-password', help='Password of the seeded students')
+    parser.add_argument('--activate', action='store_true', help='Open the evaluation period and activate a teaching survey')
+    parser.add_argument('--no-seed', action='store_true', help='Skip seeding (data already present)')
+    parser.add_argument('--seed-only', action='store_true', help='Seed and exit')
+    parser.add_argument('--keep-submissions', action='store_true',
+                        help='Do not clear earlier load-test submissions (measures resubmission instead)')
+    parser.add_argument('--login-throttle', action='store_true',
+                        help='Keep login throttling on (off by default: all virtual students share one IP; '
+                             'for --target http start the server with LOGIN_RATE_LIMIT_BACKEND=off)')
+    parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    if not args.login_throttle:
+        os.environ['LOGIN_RATE_LIMIT_BACKEND'] = 'off'
+    os.environ.setdefault('OUTBOX_DISPATCHER', 'off')
+
+    from webapp import create_app
+    app = create_app()
+
+    if not args.no_seed:
+        seed(app, args.students, args.sections, args.teachers_per_section, args.password)
+    if args.activate:
+        activate(app)
+    if args.seed_only:
+        return
+    if not args.keep_submissions:
+        print(f"Cleared {reset_submissions(app)} earlier load-test submissions")
+
+    if args.target == 'client':
+        def make_session():
+            return TestClientSession(app)
+    else:
+        def make_session():
+            return HttpSession(args.base_url)
+
+    recorder = Recorder()
+    print(f"Running {args.students} virtual students on {args.threads} threads against {args.target}...")
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = [pool.submit(run_student, make_session, recorder, i, args.password) for i in range(args.students)]
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - wall_start
+
+    results = {
+        'started_at': datetime.utcnow().isoformat() + 'Z',
+        'config': {
+            'students': args.students,
+            'sections': args.sections,
+            'teachers_per_section': args.teachers_per_section,
+            'threads': args.threads,
+            'target': args.target if args.target == 'client' else args.base_url,
+            'database': app.config.get('SQLALCHEMY_DATABASE_URI', '').split('@')[-1],
+            'python': platform.python_version()
+        },
+        'wall_seconds': round(wall, 3),
+        'completed_flows': recorder.completed,
+        'flows_per_sec': round(recorder.completed / wall, 2) if wall > 0 else None,
+        'requests_per_sec': round(sum(len(v) for v in recorder.latencies.values()) / wall, 2) if wall > 0 else None,
+        'steps': {step: summarize(recorder.latencies[step], recorder.errors[step]) for step in STEPS},
+        'error_samples': recorder.error_samples
+    }
+
+    print(f"\nCompleted {recorder.completed}/{args.students} flows in {wall:.2f}s "
+          f"({results['flows_per_sec']} flows/s, {results['requests_per_sec']} req/s)")
+    for step in STEPS:
+        s = results['steps'][step]
+        if s['count']:
+            print(f"{step:>18}: n={s['count']:<5} err={s['error_rate']:.2%}  p50 {s['p50_ms']} ms | "
+                  f"p95 {s['p95_ms']} ms | p99 {s['p99_ms']} ms | max {s['max_ms']} ms")
+    for sample in recorder.error_samples[:10]:
+        print(f"  ! {sample}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,7 @@ import os
 import csv
 from flask.cli import with_appcontext
 import click
-from werkzeug.security import generate_password_hash
+from webapp.credentials import hash_password, BULK
 from webapp import create_app, db
 from webapp.models import (
     User, Student, Teacher, Question, TeacherEvaluation, 
@@ -13,11 +13,11 @@ from webapp.models import (
 from datetime import datetime
 import json
 
-app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+app = create_app()
 
 def create_student_list(file_path=None):
     DEFAULT_STUDENT_PASS = 'studentpass'
-    hashed_pass = generate_password_hash(DEFAULT_STUDENT_PASS, method='pbkdf2:sha256')
+    hashed_pass = hash_password(DEFAULT_STUDENT_PASS, purpose=BULK)
 
     student_data = []
 
@@ -189,7 +189,7 @@ def init_db_command():
         admin_user = User(
             name='Admin User',
             email='admin@pgpc.edu',
-            password_hash=generate_password_hash('adminpass', method='pbkdf2:sha256'),
+            password_hash=hash_password('adminpass'),
             role='staff'
         )
         db.session.add(admin_user)
@@ -198,7 +198,95 @@ def init_db_command():
     
     print("Database initialization complete.")
 
+@click.command('dispatch-outbox')
+@click.option('--once', is_flag=True, help='Drain the outbox once and exit instead of polling.')
+@with_appcontext
+def dispatch_outbox_command(once):
+    """Runs the email outbox dispatcher as a standalone process."""
+    import time
+    from webapp.outbox import dispatch_once
+
+    batch_size = app.config.get('OUTBOX_BATCH_SIZE', 50)
+    max_attempts = app.config.get('OUTBOX_MAX_ATTEMPTS', 5)
+    backoff_seconds = app.config.get('OUTBOX_BACKOFF_SECONDS', 30)
+    poll_seconds = app.config.get('OUTBOX_POLL_SECONDS', 5)
+
+    print("Outbox dispatcher running. Press Ctrl+C to stop.")
+    while True:
+        outcome = dispatch_once(batch_size, max_attempts, backoff_seconds)
+        if any(outcome.values()):
+            print(f"Outbox: {outcome['sent']} sent, {outcome['retry']} scheduled for retry, {outcome['failed']} failed.")
+            continue
+        if once:
+            break
+        time.sleep(poll_seconds)
+
+@click.command('sweep-login-throttle')
+@with_appcontext
+def sweep_login_throttle_command():
+    """Deletes idle login throttle buckets from the database backend."""
+    from webapp.ratelimit import DatabaseBucketStore, BucketRule
+
+    rules = (
+        BucketRule(app.config['LOGIN_RATE_IP_BURST'], app.config['LOGIN_RATE_IP_PER_MINUTE']),
+        BucketRule(app.config['LOGIN_RATE_ID_BURST'], app.config['LOGIN_RATE_ID_PER_MINUTE'])
+    )
+    deleted = DatabaseBucketStore().sweep(rules=rules)
+    print(f"Login throttle: {deleted} idle buckets removed.")
+
+@click.command('sweep-sessions')
+@with_appcontext
+def sweep_sessions_command():
+    """Deletes expired server-side sessions."""
+    from webapp.sessions import make_session_store
+
+    store = make_session_store(app)
+    if store is None:
+        print("Sessions are stored in cookies; nothing to sweep.")
+        return
+    print(f"Sessions: {store.sweep()} expired sessions removed.")
+
+@click.command('sweep-otps')
+@with_appcontext
+def sweep_otps_command():
+    """Deletes expired password reset codes."""
+    from webapp.otp import sweep_expired_otps
+
+    print(f"Password reset codes: {sweep_expired_otps()} expired codes removed.")
+
+@click.command('export-staff-reports')
+@click.option('--output', default='individual_staff_reports.zip', show_default=True, help='ZIP file to write.')
+@click.option('--workers', type=int, default=None, help='Render processes (default: CPU count).')
+@with_appcontext
+def export_staff_reports_command(output, workers):
+    """Writes every staff member's individual report PDF into one ZIP archive."""
+    import time
+    from webapp.reports import collect_staff_report_data, write_staff_reports_zip
+
+    start = time.perf_counter()
+    reports = collect_staff_report_data().values()
+    collected = time.perf_counter()
+    with open(output, 'wb') as archive:
+        count = write_staff_reports_zip(reports, archive, workers=workers)
+    done = time.perf_counter()
+    print(f"Staff reports: {count} reports written to {output} "
+          f"(data {collected - start:.1f}s, rendering {done - collected:.1f}s).")
+
+@click.command('backfill-score-cells')
+@with_appcontext
+def backfill_score_cells_command():
+    """Rebuilds the per-staff score index from all existing answers."""
+    from webapp.score_index import backfill_score_cells
+
+    print(f"Score index: {backfill_score_cells()} score cells written.")
+
 app.cli.add_command(init_db_command)
+app.cli.add_command(dispatch_outbox_command)
+app.cli.add_command(sweep_login_throttle_command)
+app.cli.add_command(sweep_sessions_command)
+app.cli.add_command(sweep_otps_command)
+app.cli.add_command(export_staff_reports_command)
+app.cli.add_command(backfill_score_cells_command)
 
 if __name__ == '__main__':
     init_db_command()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the (student_uuid, survey_id) unique key on survey_sessions.
+Evaluation submissions upsert on this key, so existing databases need it before
+students submit again. Duplicate sessions are removed first, keeping the most
+recent submission of each student for each survey.
+"""
+
+import sys
+
+from sqlalchemy import text
+
+from webapp import create_app
+from webapp.database import db
+
+DEDUPE_TABLES = ('answers', 'student_comments', 'survey_results')
+
+
+def migrate_submission_upsert():
+    """Remove duplicate sessions and create the unique index if it doesn't exist."""
+    app = create_app()
+
+    with app.app_context():
+        try:
+            duplicate_ids = [row[0] for row in db.session.execute(text("""
+                SELECT s.session_id FROM survey_sessions s
+                WHERE EXISTS (
+                    SELECT 1 FROM survey_sessions newer
+                    WHERE newer.student_uuid = s.student_uuid
+                      AND newer.survey_id = s.survey_id
+                      AND (newer.submission_date > s.submission_date
+                           OR (newer.submission_date = s.submission_date AND newer.session_id > s.session_id))
+                )
+            """))]
+
+            for session_id in duplicate_ids:
+                for table in DEDUPE_TABLES:
+                    db.session.execute(text(f"DELETE FROM {table} WHERE session_id = :sid"), {'sid': session_id})
+                db.session.execute(text("DELETE FROM survey_sessions WHERE session_id = :sid"), {'sid': session_id})
+            print(f"🧹 Removed {len(duplicate_ids)} duplicate survey session(s).")
+
+            db.session.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS _student_survey_uc "
+                "ON survey_sessions (student_uuid, survey_id)"
+            ))
+            db.session.commit()
+            print("✅ Unique key on survey_sessions (student_uuid, survey_id) is in place.")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error migrating survey_sessions: {e}")
+            return False
+
+    return True
+
+if __name__ == '__main__':
+    print("🔄 Migrating database for single-transaction evaluation submissions...")
+    success = migrate_submission_upsert()
+
+    if success:
+        print("\n🎉 Migration completed successfully!")
+    else:
+        print("\n❌ Migration failed. Please check the error messages above.")
+        sys.exit(1)
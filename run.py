@@ -1,6 +1,8 @@
 from webapp import create_app
 import os
 
+# Served through the debug reloader: only its child process starts background workers
+os.environ.setdefault('FLASK_DEBUG', '1')
 app = create_app()
 
 if __name__ == '__main__':
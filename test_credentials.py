@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Compatibility of the password hashes made by webapp/credentials.py.
+
+The scrypt hashes below were generated by Werkzeug 2.3.8's
+generate_password_hash; verify_password must accept them, so scrypt hashes
+written today keep working when Werkzeug is upgraded and its own
+check_password_hash takes over. PBKDF2 goes through Werkzeug directly.
+"""
+
+from webapp.credentials import HashPolicy, hash_password, needs_rehash, verify_password
+
+PASSWORD = 'correct horse battery staple'
+
+# Werkzeug 2.3.8: generate_password_hash(password, method=...)
+WERKZEUG_23_HASHES = [
+    (PASSWORD, 'scrypt:16384:8:1$2h9dJUCwSQ6Blcvl$792ba8e30053c516ae962090601d6fed5c53099028b562e4c202f9037f'
+               '19426bf17b500de28a63e7d5deaa2d01d51ad8f286a4499b127862712b3953748b51a1'),
+    (PASSWORD, 'scrypt:1024:8:2$7QYgjFuVXsnj91hV$748827d8ed5b573be8dead1a55636351c61fe16a9363a7eeca0a66b1f6a'
+               '71902f5236f4c24ec3fc828cb71cac54f3e8443410edd77f8571edcc51e686c3c076a'),
+    ('pässwörd', 'scrypt:16384:8:1$5lAUhjg4OuqaRwMh$be2306fb748c9b7575844a00d58deb9d70c64d83aa270f3b7c59e3909'
+                 'd24fe4aedb4b1623cfd5cf4a496bc2ce689cf40eb303d1efab31705306c8c9ec9db31a1'),
+    (PASSWORD, 'pbkdf2:sha256:1000$1zVS57duPtf88GHj$231e95688cd6a3e37eec72166231eeebd46f6523702db5612bd404465'
+               '8677c2c'),
+]
+
+SCRYPT_POLICY = HashPolicy('scrypt', None, 2 ** 14, 8, 1)
+PBKDF2_POLICY = HashPolicy('pbkdf2', 1000, None, None, None)
+
+
+def test_werkzeug_23_hashes_verify():
+    for password, password_hash in WERKZEUG_23_HASHES:
+        assert verify_password(password_hash, password), password_hash
+        assert not verify_password(password_hash, password + 'x'), password_hash
+
+
+def test_hashes_round_trip_in_werkzeug_format():
+    for policy, method in ((SCRYPT_POLICY, 'scrypt:16384:8:1'), (PBKDF2_POLICY, 'pbkdf2:sha256:1000')):
+        password_hash = hash_password(PASSWORD, policy=policy)
+        found_method, salt, digest = password_hash.split('$')
+        assert found_method == method
+        assert len(salt) == 16
+        assert verify_password(password_hash, PASSWORD)
+        assert not verify_password(password_hash, 'wrong')
+        assert not needs_rehash(password_hash, policy=policy)
+
+
+def test_needs_rehash_on_policy_change():
+    password_hash = hash_password(PASSWORD, policy=PBKDF2_POLICY)
+    assert needs_rehash(password_hash, policy=HashPolicy('pbkdf2', 2000, None, None, None))
+    assert needs_rehash(password_hash, policy=SCRYPT_POLICY)
+
+
+def test_malformed_hashes_are_rejected():
+    for password_hash in ('', None, 'scrypt:x:8:1$salt$00', 'scrypt:16384:8:1$nodigest'):
+        assert not verify_password(password_hash, PASSWORD)
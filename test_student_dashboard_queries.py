@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Query-count budget for the student dashboard (/student/home).
+
+Runs against a throwaway in-memory SQLite database, seeds one section with a
+teacher, a non-teaching staff member and a student, and counts the SQL
+statements issued by a warm dashboard request (caches already populated,
+as they are for every student after the first one).
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+# The budget covers the view's own queries; the server-side session read is a
+# single primary-key lookup made before the view runs
+os.environ['SESSION_BACKEND'] = 'cookie'
+# No email dispatcher thread polling the shared in-memory database while queries are counted
+os.environ['OUTBOX_DISPATCHER'] = 'off'
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from webapp import create_app
+from webapp.database import db
+from webapp.models import Department, Section, Teacher, Student, Survey, SurveyStatus
+
+# Statements allowed per warm dashboard request
+FIRST_VISIT_BUDGET = 2      # account load (shared by login_required and Flask-Login) + profile/submission state
+REVIEW_MODE_BUDGET = 3      # ... + previous comments
+
+
+@contextmanager
+def count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def setup_app():
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        bscs = Department(name='BSCS')
+        admin = Department(name='Admin')
+        db.session.add_all([bscs, admin])
+        db.session.flush()
+        section = Section(name='2A', department_id=bscs.id)
+        office = Section(name='Admin-Office', department_id=admin.id)
+        db.session.add_all([section, office])
+        db.session.flush()
+
+        teacher = Teacher(name='Query Teacher', email='query.teacher@pgpc.edu')
+        teacher.departments_assigned.append(bscs)
+        teacher.sections_assigned.append(section)
+        staff = Teacher(name='Query Registrar', email='query.registrar@pgpc.edu')
+        staff.departments_assigned.append(admin)
+        staff.sections_assigned.append(office)
+
+        student = Student(student_id='QRY001', full_name='Query Student', email='qry001@student.pgpc.edu',
+                          program='BSCS', section='BSCS-2A', password_changed=True,
+                          password_hash=generate_password_hash('query-pass', method='pbkdf2:sha256:1000'))
+        db.session.add_all([teacher, staff, student])
+
+        survey = Survey.query.filter_by(staff_type='teaching').first()
+        survey.is_active = True
+        SurveyStatus.query.get(1).is_active = True
+        db.session.commit()
+
+        ids = {'student': str(student.id), 'teacher': str(teacher.id), 'staff': str(staff.id),
+               'questions': [str(q.id) for q in survey.questions]}
+    return app, ids
+
+
+def dashboard_queries(app, client):
+    client.get('/student/home')  # warm the survey state, question and roster caches
+    with app.app_context():
+        engine = db.engine
+    with count_queries(engine) as statements:
+        response = client.get('/student/home')
+    assert response.status_code == 200
+    return statements
+
+
+def test_student_dashboard_query_budget():
+    app, ids = setup_app()
+    client = app.test_client()
+    response = client.post('/login', data={'loginId': 'QRY001', 'password': 'query-pass', 'role': 'student'})
+    assert response.status_code == 302
+
+    statements = dashboard_queries(app, client)
+    print(f"First visit: {len(statements)} queries")
+    assert len(statements) <= FIRST_VISIT_BUDGET, statements
+
+    form = {f"score_{staff_id}_{question_id}": '5'
+            for staff_id in (ids['teacher'], ids['staff']) for question_id in ids['questions']}
+    form[f"comment_{ids['teacher']}"] = 'Clear explanations.'
+    response = client.post('/submit_evaluation', data=form)
+    assert response.status_code == 302
+
+    statements = dashboard_queries(app, client)
+    print(f"Review mode: {len(statements)} queries")
+    assert len(statements) <= REVIEW_MODE_BUDGET, statements
+
+
+if __name__ == '__main__':
+    print("🧪 Checking student dashboard query budget...")
+    try:
+        test_student_dashboard_query_budget()
+    except AssertionError as e:
+        print(f"\n❌ Query budget exceeded: {e}")
+        sys.exit(1)
+    print("\n🎉 Student dashboard stays within its query budget.")
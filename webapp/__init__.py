@@ -1,7 +1,8 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 from datetime import datetime
-from werkzeug.security import generate_password_hash
+from .credentials import hash_password, BULK
 from .database import db 
 # webapp/__init__.py, Line 6 (The problematic line)
 # OLD: from .models import User, Student, Teacher, Question, TeacherEvaluation, SurveyStatus, Survey
@@ -33,7 +34,7 @@ POSTGRES_PORT = os.getenv('POSTGRES_PORT', '5432')
 
 def create_student_list(file_path=None):
     DEFAULT_STUDENT_PASS = 'studentpass'
-    hashed_pass = generate_password_hash(DEFAULT_STUDENT_PASS, method='pbkdf2:sha256')
+    hashed_pass = hash_password(DEFAULT_STUDENT_PASS, purpose=BULK)
 
     student_data = []
 
@@ -199,7 +200,7 @@ def initialize_database(app):
             admin_user = User(
                 name='Admin User',
                 email='admin@pgpc.edu',
-                password_hash=generate_password_hash('adminpass', method='pbkdf2:sha256'),
+                password_hash=hash_password('adminpass'),
                 role='staff'
             )
             db.session.add(admin_user)
@@ -269,10 +270,77 @@ def create_app():
     app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
- 
+
+    # Email outbox dispatcher ('thread' runs inside each worker, 'off' when using `flask dispatch-outbox`)
+    app.config['OUTBOX_DISPATCHER'] = os.getenv('OUTBOX_DISPATCHER', 'thread')
+    app.config['OUTBOX_BATCH_SIZE'] = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+    app.config['OUTBOX_MAX_ATTEMPTS'] = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+    app.config['OUTBOX_BACKOFF_SECONDS'] = int(os.getenv('OUTBOX_BACKOFF_SECONDS', 30))
+    app.config['OUTBOX_POLL_SECONDS'] = int(os.getenv('OUTBOX_POLL_SECONDS', 5))
+
+    # Students reminded within this many hours are skipped on repeat reminder runs (0 disables)
+    app.config['REMINDER_COOLDOWN_HOURS'] = int(os.getenv('REMINDER_COOLDOWN_HOURS', 12))
+
+    # How long a submitted evaluation form token is remembered for duplicate suppression
+    app.config['SUBMISSION_TOKEN_TTL_SECONDS'] = int(os.getenv('SUBMISSION_TOKEN_TTL_SECONDS', 600))
+
+    # Survey status / active survey / ranking flags are cached for this many seconds (0 disables)
+    app.config['SURVEY_STATE_TTL_SECONDS'] = int(os.getenv('SURVEY_STATE_TTL_SECONDS', 5))
+
+    # Group commit: batch concurrent evaluation submissions into shared transactions
+    app.config['SUBMISSION_GROUP_COMMIT'] = os.getenv('SUBMISSION_GROUP_COMMIT', 'false').lower() in ('1', 'true', 'yes')
+    app.config['SUBMISSION_GROUP_COMMIT_MAX_BATCH'] = int(os.getenv('SUBMISSION_GROUP_COMMIT_MAX_BATCH', 50))
+    app.config['SUBMISSION_GROUP_COMMIT_MAX_DELAY_MS'] = int(os.getenv('SUBMISSION_GROUP_COMMIT_MAX_DELAY_MS', 20))
+    app.config['SUBMISSION_GROUP_COMMIT_QUEUE_SIZE'] = int(os.getenv('SUBMISSION_GROUP_COMMIT_QUEUE_SIZE', 1000))
+
+    # Login throttling before password hashing ('memory' per worker, 'database' shared, 'off')
+    app.config['LOGIN_RATE_LIMIT_BACKEND'] = os.getenv('LOGIN_RATE_LIMIT_BACKEND', 'memory').lower()
+    app.config['LOGIN_RATE_IP_BURST'] = int(os.getenv('LOGIN_RATE_IP_BURST', 60))
+    app.config['LOGIN_RATE_IP_PER_MINUTE'] = int(os.getenv('LOGIN_RATE_IP_PER_MINUTE', 60))
+    app.config['LOGIN_RATE_ID_BURST'] = int(os.getenv('LOGIN_RATE_ID_BURST', 5))
+    app.config['LOGIN_RATE_ID_PER_MINUTE'] = int(os.getenv('LOGIN_RATE_ID_PER_MINUTE', 5))
+
+    # Reverse proxies in front of the app whose X-Forwarded-For entry is trusted for the client address
+    # (e.g. 1 on Render). 0 uses the socket address: without a proxy the header is client-controlled.
+    app.config['TRUSTED_PROXY_COUNT'] = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+    if app.config['TRUSTED_PROXY_COUNT'] > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
+
+    # Password hashing policy (see webapp/credentials.py and bench_password_hashing.py)
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2').lower()
+    app.config['PASSWORD_PBKDF2_ITERATIONS'] = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 260000))
+    app.config['PASSWORD_BULK_PBKDF2_ITERATIONS'] = int(os.getenv('PASSWORD_BULK_PBKDF2_ITERATIONS', 20000))
+    app.config['PASSWORD_SCRYPT_N'] = int(os.getenv('PASSWORD_SCRYPT_N', 2 ** 15))
+    app.config['PASSWORD_SCRYPT_R'] = int(os.getenv('PASSWORD_SCRYPT_R', 8))
+    app.config['PASSWORD_SCRYPT_P'] = int(os.getenv('PASSWORD_SCRYPT_P', 1))
+
+    # Password reset verification codes (webapp/otp.py)
+    app.config['PASSWORD_RESET_OTP_TTL_SECONDS'] = int(os.getenv('PASSWORD_RESET_OTP_TTL_SECONDS', 600))
+    app.config['PASSWORD_RESET_OTP_MAX_ATTEMPTS'] = int(os.getenv('PASSWORD_RESET_OTP_MAX_ATTEMPTS', 5))
+
+    # Generated PDF report cache (memory LRU + files under REPORT_CACHE_DIR, default instance/report_cache)
+    app.config['REPORT_CACHE'] = os.getenv('REPORT_CACHE', 'true').lower() in ('1', 'true', 'yes')
+    app.config['REPORT_CACHE_DIR'] = os.getenv('REPORT_CACHE_DIR')
+    app.config['REPORT_CACHE_MAX_MEMORY_MB'] = int(os.getenv('REPORT_CACHE_MAX_MEMORY_MB', 32))
+
+    # Staff count from which the combined results PDF uses the memory-bounded large-report layout
+    app.config['REPORT_LARGE_MODE_STAFF'] = int(os.getenv('REPORT_LARGE_MODE_STAFF', 500))
+
+    # Processes used to render the all-staff report archive (0 = CPU count)
+    app.config['REPORT_BATCH_WORKERS'] = int(os.getenv('REPORT_BATCH_WORKERS', 0)) or None
+
+    # Session storage: 'sql' (shared table), 'filesystem' (SESSION_FILE_DIR) or 'cookie' (signed cookie)
+    app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'sql').lower()
+    app.config['SESSION_FILE_DIR'] = os.getenv('SESSION_FILE_DIR')
+    app.config['SESSION_TTL_SECONDS'] = int(os.getenv('SESSION_TTL_SECONDS', 8 * 3600))
+    app.config['SESSION_SWEEP_INTERVAL_SECONDS'] = int(os.getenv('SESSION_SWEEP_INTERVAL_SECONDS', 600))
+
     db.init_app(app)
     mail.init_app(app)
 
+    from .sessions import init_sessions
+    init_sessions(app)
+
     login_manager = LoginManager()
     login_manager.init_app(app)
     
@@ -281,29 +349,14 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        # We need to handle potential UUID errors here
+        # Typed identity ("student:<uuid>" / "user:<uuid>") queries one table;
+        # the account is cached on g and shared with the view decorators
         try:
-            from uuid import UUID
-            user_id_uuid = UUID(user_id)
-            
-            # Try Student first
-            student = Student.query.get(user_id_uuid)
-            if student:
-                return student
-                
-            # Then try User
-            user = User.query.get(user_id_uuid)
-            if user:
-                return user
-                
-        except (ValueError, TypeError) as e:
-            print(f"Invalid UUID in session: {user_id}, Error: {e}")
-            return None
+            from .identity import load_identity
+            return load_identity(user_id)
         except Exception as e:
             print(f"Database error in user_loader: {e}")
             return None
-            
-        return None
 
     try:
         from .auth import auth
@@ -338,145 +391,6 @@ def create_app():
     def not_found(error):
         return "<h1>Page Not Found</h1>", 404
 
-    # Add forgot password routes directly to app
-    @app.route('/forgot-password', methods=['POST'])
-    def forgot_password():
-        try:
-            data = request.get_json()
-            email = data.get('email', '').strip().lower()
-            user_type = data.get('user_type', 'student')
-            
-            if not email:
-                return jsonify({'success': False, 'message': 'Email is required'}), 400
-            
-            user = None
-            user_name = None
-            
-            if user_type == 'staff':
-                user = User.query.filter_by(email=email).first()
-                if user:
-                    user_name = user.name
-            else:
-                user = Student.query.filter_by(email=email).first()
-                if user:
-                    user_name = user.full_name
-                else:
-                    import csv
-                    csv_path = os.path.join(os.path.dirname(__file__), 'data', 'students_data.csv')
-                    print(f"Looking for CSV at: {csv_path}")
-                    print(f"File exists: {os.path.exists(csv_path)}")
-                    
-                    try:
-                        with open(csv_path, 'r', encoding='utf-8') as file:
-                            reader = csv.DictReader(file)
-                            for row in reader:
-                                row_email = row['email'].strip().lower()
-                                print(f"Comparing: '{row_email}' == '{email}' = {row_email == email}")
-                                if row_email == email:
-                                    user_name = row['full_name']
-                                    user = type('CSVUser', (), {
-                                        'email': email,
-                                        'full_name': user_name,
-                                        'student_id': row['student_id'],
-                                        'is_csv_user': True
-                                    })()
-                                    print(f"Found CSV user: {user_name}")
-                                    break
-                    except Exception as e:
-                        print(f"Error reading CSV: {e}")
-            
-            if not user:
-                return jsonify({'success': False, 'message': 'Email not found in our records'}), 404
-            
-            import random
-            otp_code = str(random.randint(100000, 999999))
-            session[f'reset_otp_{email}'] = otp_code
-            session[f'reset_email_{email}'] = email
-            session[f'reset_user_type_{email}'] = user_type
-            
-            return jsonify({
-                'success': True, 
-                'message': f'Verification code ready for {email}',
-                'otp_code': otp_code,
-                'user_name': user_name
-            }), 200
-            
-        except Exception as e:
-            print(f"Forgot password error: {e}")
-            return jsonify({'success': False, 'message': 'An error occurred'}), 500
-    
-    @app.route('/reset-password', methods=['POST'])
-    def reset_password():
-        try:
-            data = request.get_json()
-            email = data.get('email', '').strip().lower()
-            otp_code = data.get('otp_code', '').strip()
-            new_password = data.get('new_password', '').strip()
-            
-            if not all([email, otp_code, new_password]):
-                return jsonify({'success': False, 'message': 'All fields are required'}), 400
-            
-            if len(new_password) < 6:
-                return jsonify({'success': False, 'message': 'Password must be at least 6 characters'}), 400
-            
-            stored_otp = session.get(f'reset_otp_{email}')
-            if not stored_otp or str(stored_otp) != str(otp_code):
-                return jsonify({'success': False, 'message': 'Invalid verification code'}), 400
-            
-            user_type = session.get(f'reset_user_type_{email}', 'student')
-            
-            if user_type == 'staff':
-                user = User.query.filter_by(email=email).first()
-                if user:
-                    user.password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
-                    db.session.commit()
-                else:
-                    return jsonify({'success': False, 'message': 'User not found'}), 404
-            else:
-                user = Student.query.filter_by(email=email).first()
-                if user:
-                    user.password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
-                    user.password_changed = True
-                    db.session.commit()
-                else:
-                    import csv
-                    csv_path = os.path.join(os.path.dirname(__file__), 'data', 'students_data.csv')
-                    student_found = False
-                    try:
-                        with open(csv_path, 'r', encoding='utf-8') as file:
-                            reader = csv.DictReader(file)
-                            for row in reader:
-                                if row['email'].strip().lower() == email:
-                                    new_student = Student(
-                                        full_name=row['full_name'],
-                                        email=email,
-                                        password_hash=generate_password_hash(new_password, method='pbkdf2:sha256'),
-                                        student_id=row['student_id'],
-                                        program=row['program'],
-                                        section=row['section'],
-                                        password_changed=True
-                                    )
-                                    db.session.add(new_student)
-                                    db.session.commit()
-                                    student_found = True
-                                    break
-                    except Exception as e:
-                        print(f"Error reading CSV for reset: {e}")
-                    
-                    if not student_found:
-                        return jsonify({'success': False, 'message': 'Student not found'}), 404
-            
-            session.pop(f'reset_otp_{email}', None)
-            session.pop(f'reset_email_{email}', None)
-            session.pop(f'reset_user_type_{email}', None)
-            
-            return jsonify({'success': True, 'message': 'Password updated successfully'}), 200
-            
-        except Exception as e:
-            db.session.rollback()
-            print(f"Reset password error: {e}")
-            return jsonify({'success': False, 'message': 'An error occurred while updating password'}), 500
-
     with app.app_context():
         try:
             initialize_database(app)
@@ -485,6 +399,19 @@ def create_app():
             import traceback
             traceback.print_exc()
 
+        # Nothing to backfill yet: every submission from now on writes its own score cells
+        try:
+            from .score_index import mark_score_index_ready_if_empty
+            if mark_score_index_ready_if_empty():
+                print("Database: Score index marked complete (no earlier answers).")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Database: Could not check the score index: {e}")
+
+    # Drain mail left behind by a crashed or restarted worker without waiting for the next reminder run
+    from .outbox import autostart_outbox_dispatcher
+    autostart_outbox_dispatcher(app)
+
     return app
 
 if __name__ == '__main__':
@@ -1,12 +1,19 @@
 # webapp/app.py
-from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify, make_response, current_app, send_from_directory
+from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify, make_response, current_app, send_from_directory, send_file, Response, stream_with_context
 from .models import db, Student, Teacher, Question, TeacherEvaluation, SurveyStatus, SurveySession, Answer, SurveyResult, Survey, RankingStatus, Section, Department, StudentComment
+from .validation import invalidate_validation_contexts
+from .survey_state import get_survey_state, cached_survey_questions, invalidate_survey_state, bump_setup_generation
+from .roster import invalidate_roster, split_student_section, staff_for_section
+from .rankings import publish_ranking_snapshot, get_snapshot
+from .identity import USER_KIND, current_account, session_identity_kind
+from .credentials import hash_password, verify_password, BULK
+from .report_cache import cached_report, cached_report_file, invalidate_report_cache
+from .reports import collect_staff_report_data, render_individual_staff_pdf, render_detailed_pdf, render_results_pdf, write_staff_reports_zip
+from .score_index import delete_score_cells
+from .exports import detailed_results_rows, raw_score_rows, iter_csv, write_xlsx, xlsx_available
 from sqlalchemy import func, text, inspect
 from functools import wraps
 from datetime import datetime
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib import colors
 from io import BytesIO
 import os
 import uuid
@@ -15,7 +22,6 @@ import traceback
 import logging
 from flask_mail import Message
 from . import mail
-from reportlab.lib.styles import getSampleStyleSheet
 
 # In app.py
 # Set up logger for this module
@@ -37,6 +43,12 @@ def login_required(f):
         if not is_logged_in():
             flash('Please log in to access this page.', 'error')
             return redirect(url_for('auth.login'))
+
+        # Loads the account once per request (cached on g, shared with Flask-Login)
+        if session.get('_user_id') and current_account() is None:
+            session.clear()
+            flash('Your account could not be found. Please log in again.', 'error')
+            return redirect(url_for('auth.login'))
         
         # Create a response from the view function's result
         result = f(*args, **kwargs)
@@ -61,7 +73,8 @@ def admin_required(f):
             flash('Please log in to access this page.', 'error')
             return redirect(url_for('auth.login'))
             
-        if session.get('user_role') != 'staff':
+        # The typed session identity tells staff from students without a query
+        if session.get('user_role') != 'staff' or session_identity_kind() != USER_KIND:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({'status': 'error', 'message': 'Admin access required.'}), 403
             flash('Admin access required.', 'error')
@@ -70,6 +83,21 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _evaluation_setup_changed():
+    """
+    Drop cached data derived from surveys, questions, staff and section assignments.
+    The shared setup generation makes the other workers drop theirs too.
+    """
+    bump_setup_generation()
+    invalidate_roster()
+    invalidate_validation_contexts()
+    invalidate_survey_state()
+    invalidate_report_cache()
+
+def current_survey_state():
+    """Cached SurveyStatus / active Survey / RankingStatus snapshot for the hot student paths."""
+    return get_survey_state(ttl=current_app.config.get('SURVEY_STATE_TTL_SECONDS'))
+
 # -----------------------------------------------------------------
 # --- UTILITY/CALCULATION LOGIC ---
 # -----------------------------------------------------------------
@@ -468,8 +496,9 @@ def admin_home():
                 from .models import User
                 current_user_id = session.get('user_id')
                 if current_user_id:
-                    current_user = User.query.get(uuid.UUID(current_user_id))
-                    if current_user:
+                    # Same request-cached account the decorators and Flask-Login use
+                    current_user = current_account()
+                    if isinstance(current_user, User):
                         name_parts = current_user.name.split(' ', 1)
                         SAFE_CONTEXT['admin_info'] = {
                             'first_name': name_parts[0] if name_parts else 'Admin',
@@ -600,62 +629,37 @@ def generate_survey_results():
 
     return redirect(url_for('views.admin_home', _anchor='view-reports'))
 
+def collect_results_sections():
+    """(staff_type, results, criteria) for each staff type, as shown in the combined results PDF."""
+    return [(staff_type,) + tuple(calculate_detailed_scores_by_staff_type(staff_type))
+            for staff_type in ['teaching', 'non_teaching']]
+
+def build_results_pdf():
+    """Renders the multi-page all-staff results PDF and returns its bytes."""
+    buffer = BytesIO()
+    render_results_pdf(collect_results_sections(), buffer)
+    return buffer.getvalue()
+
+def write_large_results_pdf(output):
+    """Renders the all-staff results PDF in large-report mode into the binary file `output`."""
+    render_results_pdf(collect_results_sections(), output, large=True)
+
 @views.route('/report/generate_pdf')
 @admin_required
 def generate_results_pdf():
     """Generates a multi-page PDF report for all staff."""
     try:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
-        styles = getSampleStyleSheet()
-        story = []
-
-        for staff_type in ['teaching', 'non_teaching']:
-            results, criteria = calculate_detailed_scores_by_staff_type(staff_type)
-            
-            if not results:
-                story.append(Paragraph(f'No data available for {staff_type} staff.', styles['h2']))
-                story.append(PageBreak())
-                continue
-
-            story.append(Paragraph(f'{staff_type.title()} Staff Evaluation Results', styles['h1']))
-            story.append(Spacer(1, 12))
-
-            headers = ['NO', 'Staff Name'] + criteria + ['TOTAL', 'RANK']
-            table_data = [headers]
-
-            for i, staff in enumerate(results):
-                row = [i + 1, Paragraph(staff['StaffName'], styles['Normal'])]
-                for crit in criteria:
-                    row.append(f"{staff.get(crit, 0.0):.2f}")
-                row.append(f"{staff['TotalScore']:.2f}")
-                row.append(staff['Rank'])
-                table_data.append(row)
-
-            table = Table(table_data, repeatRows=1)
-            style = TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ])
-            table.setStyle(style)
-            
-            story.append(table)
-            story.append(PageBreak())
+        if Teacher.query.count() >= current_app.config.get('REPORT_LARGE_MODE_STAFF', 500):
+            # Rendered to a spooled temp file (or read from the cache file) and streamed from there
+            pdf_file = cached_report_file('results_pdf_large', (), write_large_results_pdf)
+            return send_file(pdf_file, mimetype='application/pdf', download_name='all_staff_results.pdf')
 
-        if not story:
+        pdf = cached_report('results_pdf', (), build_results_pdf)
+        if pdf is None:
             flash('No data available to generate a report.', 'warning')
             return redirect(url_for('views.admin_home', _anchor='view-reports'))
 
-        doc.build(story)
-        
-        buffer.seek(0)
-        return make_response(buffer.getvalue(), 200, {
+        return make_response(pdf, 200, {
             'Content-Type': 'application/pdf',
             'Content-Disposition': 'inline; filename="all_staff_results.pdf"'
         })
@@ -691,13 +695,11 @@ def post_rankings():
                 'score': teacher['score']
             })
         
-        # Store in app config for global access
-        current_app.config['PUBLISHED_RANKINGS'] = {
-            'rankings': formatted_rankings,
-            'published_date': datetime.utcnow().isoformat()
-        }
+        # Store an immutable snapshot so every worker shows the same rankings
+        publish_ranking_snapshot(formatted_rankings, 'teaching')
         
         db.session.commit()
+        invalidate_survey_state()
         
         flash('Teaching staff rankings posted successfully!', 'success')
         return jsonify({'status': 'success', 'message': 'Rankings posted.'})
@@ -707,54 +709,27 @@ def post_rankings():
         logger.error(f"Error in post_rankings: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def build_detailed_pdf(staff_type):
+    """Renders the detailed results PDF for one staff type and returns its bytes (None if there is no data)."""
+    results, criteria = calculate_detailed_scores_by_staff_type(staff_type)
+    if not results:
+        return None
+
+    buffer = BytesIO()
+    render_detailed_pdf(staff_type, results, criteria, buffer)
+    return buffer.getvalue()
+
 @views.route('/generate_detailed_pdf_report/<staff_type>')
 @admin_required
 def generate_detailed_pdf_report(staff_type):
     """Generates a detailed PDF report for a given staff type."""
     try:
-        results, criteria = calculate_detailed_scores_by_staff_type(staff_type)
-        
-        if not results:
+        pdf = cached_report('detailed_pdf', (staff_type,), lambda: build_detailed_pdf(staff_type))
+        if pdf is None:
             flash(f'No data available to generate a report for {staff_type} staff.', 'warning')
             return redirect(url_for('views.admin_home'))
 
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        
-        story = []
-        story.append(Paragraph(f'{staff_type.title()} Staff Evaluation Results', styles['h1']))
-        story.append(Spacer(1, 12))
-
-        headers = ['NO', 'Staff Name'] + criteria + ['TOTAL', 'RANK']
-        table_data = [headers]
-
-        for i, staff in enumerate(results):
-            row = [i + 1, Paragraph(staff['StaffName'], styles['Normal'])]
-            for crit in criteria:
-                row.append(f"{staff.get(crit, 0.0):.2f}")
-            row.append(f"{staff['TotalScore']:.2f}")
-            row.append(staff['Rank'])
-            table_data.append(row)
-
-        table = Table(table_data)
-        style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ])
-        table.setStyle(style)
-        
-        story.append(table)
-        doc.build(story)
-        
-        buffer.seek(0)
-        return make_response(buffer.getvalue(), 200, {
+        return make_response(pdf, 200, {
             'Content-Type': 'application/pdf',
             'Content-Disposition': f'inline; filename="{staff_type}_results.pdf"'
         })
@@ -764,6 +739,11 @@ def generate_detailed_pdf_report(staff_type):
         flash('Could not generate PDF report.', 'error')
         return redirect(url_for('views.admin_home'))
 
+def build_individual_staff_pdf(teacher):
+    """Renders the individual report (criteria scores and comments) for one staff member and returns its bytes."""
+    report = collect_staff_report_data([teacher.id])[str(teacher.id)]
+    return render_individual_staff_pdf(report)
+
 @views.route('/generate_individual_staff_report/<uuid:teacher_id>')
 @admin_required
 def generate_individual_staff_report(teacher_id):
@@ -774,86 +754,8 @@ def generate_individual_staff_report(teacher_id):
             flash('Staff member not found.', 'error')
             return redirect(url_for('views.admin_home'))
 
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        
-        story = []
-        story.append(Paragraph(f'Individual Staff Report: {teacher.name}', styles['h1']))
-        story.append(Spacer(1, 12))
-        
-        # Calculate individual scores
-        sums = {}
-        counts = {}
-        answers = Answer.query.filter(Answer.response_value.like('%|%')).all()
-        
-        for ans in answers:
-            try:
-                teacher_scores = ans.response_value.split(';')
-                for teacher_score in teacher_scores:
-                    score_str, entity_id = teacher_score.split('|', 1)
-                    if entity_id == str(teacher_id):
-                        score = float(score_str)
-                        question = Question.query.get(ans.question_identifier)
-                        if question:
-                            criteria = question.criteria
-                            if criteria not in sums:
-                                sums[criteria] = 0.0
-                                counts[criteria] = 0
-                            sums[criteria] += score
-                            counts[criteria] += 1
-            except (ValueError, IndexError):
-                continue
-        
-        # Overall score calculation
-        total_score = sum(sums[crit] / counts[crit] for crit in sums if counts[crit] > 0)
-        avg_score = total_score / len(sums) if sums else 0.0
-        
-        # Staff information
-        story.append(Paragraph(f'Staff Name: {teacher.name}', styles['h2']))
-        story.append(Paragraph(f'Overall Score: {avg_score:.2f}/5.00', styles['h2']))
-        story.append(Spacer(1, 12))
-        
-        # Detailed scores by criteria
-        if sums:
-            story.append(Paragraph('Evaluation Scores by Criteria:', styles['h3']))
-            criteria_data = [['Criteria', 'Average Score', 'Total Responses']]
-            
-            for criteria in sorted(sums.keys()):
-                avg = sums[criteria] / counts[criteria] if counts[criteria] > 0 else 0.0
-                criteria_data.append([criteria, f'{avg:.2f}', str(counts[criteria])])
-            
-            criteria_table = Table(criteria_data)
-            criteria_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            story.append(criteria_table)
-            story.append(Spacer(1, 20))
-        
-        # Comments section
-        comments = StudentComment.query.filter_by(teacher_id=teacher_id).all()
-        
-        if comments:
-            story.append(Paragraph('Student Comments and Suggestions:', styles['h3']))
-            story.append(Spacer(1, 12))
-            
-            for i, comment in enumerate(comments, 1):
-                story.append(Paragraph(f'Comment {i}:', styles['h4']))
-                story.append(Paragraph(comment.comment_text, styles['Normal']))
-                story.append(Paragraph(f'Submitted: {comment.created_at.strftime("%B %d, %Y")}', styles['Italic']))
-                story.append(Spacer(1, 12))
-        else:
-            story.append(Paragraph('Student Comments and Suggestions:', styles['h3']))
-            story.append(Paragraph('No comments were submitted for this staff member.', styles['Normal']))
-        
-        doc.build(story)
-        
-        buffer.seek(0)
-        return make_response(buffer.getvalue(), 200, {
+        pdf = cached_report('individual_pdf', (str(teacher_id),), lambda: build_individual_staff_pdf(teacher))
+        return make_response(pdf, 200, {
             'Content-Type': 'application/pdf',
             'Content-Disposition': f'inline; filename="{teacher.name.replace(" ", "_")}_individual_report.pdf"'
         })
@@ -864,6 +766,87 @@ def generate_individual_staff_report(teacher_id):
         flash('Could not generate individual staff report.', 'error')
         return redirect(url_for('views.admin_home'))
 
+def build_staff_reports_zip():
+    """Renders every staff member's individual report into one ZIP archive and returns its bytes."""
+    reports = collect_staff_report_data().values()
+    if not reports:
+        return None
+    buffer = BytesIO()
+    write_staff_reports_zip(reports, buffer, workers=current_app.config.get('REPORT_BATCH_WORKERS'))
+    return buffer.getvalue()
+
+@views.route('/report/individual_reports.zip')
+@admin_required
+def download_all_individual_reports():
+    """Downloads the individual reports of all staff members as a ZIP archive."""
+    try:
+        archive = cached_report('individual_zip', (), build_staff_reports_zip)
+        if archive is None:
+            flash('No staff members to generate reports for.', 'warning')
+            return redirect(url_for('views.admin_home', _anchor='view-reports'))
+
+        return send_file(BytesIO(archive), mimetype='application/zip', as_attachment=True,
+                         download_name=f'individual_staff_reports_{datetime.utcnow():%Y%m%d}.zip')
+
+    except Exception as e:
+        logger.error(f"Error generating individual report archive: {e}")
+        traceback.print_exc()
+        flash('Could not generate the staff report archive.', 'error')
+        return redirect(url_for('views.admin_home', _anchor='view-reports'))
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+def spreadsheet_response(rows, base_name, export_format, sheet_name):
+    """Streams rows as a CSV or XLSX download."""
+    file_name = f'{base_name}_{datetime.utcnow():%Y%m%d}.{export_format}'
+    if export_format == 'xlsx':
+        return send_file(write_xlsx(rows, sheet_name), as_attachment=True, download_name=file_name,
+                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    return Response(stream_with_context(iter_csv(rows)), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename="{file_name}"'
+    })
+
+@views.route('/report/export/<staff_type>.<export_format>')
+@admin_required
+def export_detailed_results(staff_type, export_format):
+    """Exports the detailed results of one staff type as CSV or XLSX."""
+    if staff_type not in ('teaching', 'non_teaching') or export_format not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': 'Unknown export.'}), 404
+    if export_format == 'xlsx' and not xlsx_available():
+        flash('Excel export is not available on this server; use CSV instead.', 'warning')
+        return redirect(url_for('views.admin_home', _anchor='view-reports'))
+
+    try:
+        results, criteria = calculate_detailed_scores_by_staff_type(staff_type)
+        return spreadsheet_response(detailed_results_rows(results, criteria), f'{staff_type}_results',
+                                    export_format, f'{staff_type.replace("_", " ").title()} Results')
+
+    except Exception as e:
+        logger.error(f"Error exporting {staff_type} results as {export_format}: {e}")
+        traceback.print_exc()
+        flash('Could not export the results.', 'error')
+        return redirect(url_for('views.admin_home', _anchor='view-reports'))
+
+@views.route('/report/export/raw_scores.<export_format>')
+@admin_required
+def export_raw_scores(export_format):
+    """Exports every individual score, with students anonymized, as CSV or XLSX."""
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': 'Unknown export.'}), 404
+    if export_format == 'xlsx' and not xlsx_available():
+        flash('Excel export is not available on this server; use CSV instead.', 'warning')
+        return redirect(url_for('views.admin_home', _anchor='view-reports'))
+
+    try:
+        return spreadsheet_response(raw_score_rows(), 'raw_scores', export_format, 'Raw Scores')
+
+    except Exception as e:
+        logger.error(f"Error exporting raw scores as {export_format}: {e}")
+        traceback.print_exc()
+        flash('Could not export the raw scores.', 'error')
+        return redirect(url_for('views.admin_home', _anchor='view-reports'))
+
 # --- EMAIL REMINDER LOGIC ---
 def load_students_from_csv():
     """Load students from CSV file."""
@@ -889,8 +872,6 @@ def load_students_from_csv():
 
 def sync_csv_to_database():
     """Sync CSV student data to database for login functionality."""
-    from werkzeug.security import generate_password_hash
-    
     try:
         csv_students = load_students_from_csv()
         if not csv_students:
@@ -911,7 +892,7 @@ def sync_csv_to_database():
                     student_id=student_data['student_id'],
                     program=student_data['program'],
                     section=student_data['section'],
-                    password_hash=generate_password_hash(student_data['student_id'], method='pbkdf2:sha256'),
+                    password_hash=hash_password(student_data['student_id'], purpose=BULK),
                     password_changed=False  # Force password change on first login
                 )
                 db.session.add(new_student)
@@ -979,74 +960,77 @@ def get_completion_stats_by_program():
 @views.route('/send-reminders', methods=['POST'])
 @admin_required
 def send_reminders():
-    """Send reminders using CSV data and email service."""
+    """Queue reminder emails for students who have not submitted the target survey."""
     data = request.get_json(silent=True) or {}
     target_program = data.get('program_name')
-    
+    target_section = data.get('section')
+    target_survey = data.get('survey_id')
+
     try:
-        csv_students = load_students_from_csv()
-        if not csv_students:
-            return jsonify({'status': 'error', 'message': 'Could not load student data'}), 500
-        
-        # Get completed student IDs
-        completed_student_ids = set()
-        completed_sessions = SurveySession.query.all()
-        for session in completed_sessions:
-            student = Student.query.get(session.student_uuid)
-            if student:
-                completed_student_ids.add(student.student_id)
-        
-        # Filter students to remind
-        students_to_remind = []
-        for student in csv_students:
-            if target_program and student['program'] != target_program:
-                continue
-            if student['student_id'] not in completed_student_ids:
-                students_to_remind.append(student)
-        
-        if not students_to_remind:
-            program_msg = f" in {target_program}" if target_program else ""
-            return jsonify({'status': 'info', 'message': f'All students{program_msg} have completed their evaluations.'})
-        
-        # Send emails
-        from .email_service import send_reminder_email
-        sent_count = 0
-        failed_count = 0
-        
-        for student in students_to_remind:
+        if target_survey:
             try:
-                success = send_reminder_email(
-                    student['email'], student['full_name'], 
-                    student['program'], student['section']
-                )
-                if success:
-                    sent_count += 1
-                else:
-                    failed_count += 1
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Error sending to {student['full_name']}: {e}")
-        
-        program_suffix = f" in {target_program}" if target_program else ""
-        
-        if sent_count > 0:
-            message = f'✅ Sent {sent_count} email reminders{program_suffix}.'
-            status = 'success'
-        else:
-            message = f'⚠️ {failed_count} emails failed to send.'
-            status = 'warning'
-        
+                target_survey = uuid.UUID(target_survey)
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Invalid survey ID format'}), 400
+
+        # Single NOT EXISTS query (pending and outside the cool-down), streamed straight into the outbox
+        from .reminders import iter_reminder_recipients, attribute_reminders
+        from .outbox import enqueue_reminders, wake_outbox_dispatcher
+        cooldown_hours = current_app.config.get('REMINDER_COOLDOWN_HOURS', 0)
+        recipients = iter_reminder_recipients(target_program, target_section, target_survey, cooldown_hours)
+        batch_id, queued_count = enqueue_reminders(attribute_reminders(recipients, target_survey))
+
+        program_suffix = f" in {target_section or target_program}" if (target_section or target_program) else ""
+
+        if not queued_count:
+            db.session.rollback()
+            if cooldown_hours:
+                message = f'No students{program_suffix} to remind: everyone has completed their evaluation, has a reminder on the way, or was reminded in the last {cooldown_hours} hour(s).'
+            else:
+                message = f'All students{program_suffix} have completed their evaluations.'
+            return jsonify({'status': 'info', 'message': message})
+
+        # The dispatcher delivers the queued emails outside this request
+        db.session.commit()
+        wake_outbox_dispatcher(current_app._get_current_object())
+
         return jsonify({
-            'status': status,
-            'message': message,
-            'sent_count': sent_count,
-            'failed_count': failed_count
+            'status': 'success',
+            'message': f'✅ Queued {queued_count} email reminders{program_suffix}. Delivery continues in the background.',
+            'queued_count': queued_count,
+            'batch_id': batch_id
         })
-        
+
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error in send_reminders: {e}")
         return jsonify({'status': 'error', 'message': 'Error sending reminders'}), 500
 
+@views.route('/api/outbox/stats')
+@admin_required
+def get_outbox_stats():
+    """API endpoint for email outbox delivery progress."""
+    try:
+        from .outbox import outbox_stats
+        stats = outbox_stats(request.args.get('batch_id'))
+        stats['status'] = 'success'
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"Error getting outbox stats: {e}")
+        return jsonify({'status': 'error', 'message': 'Error loading outbox stats'}), 500
+
+@views.route('/api/login-throttle/stats')
+@admin_required
+def get_login_throttle_stats():
+    """API endpoint for login throttling counters of this worker."""
+    from .ratelimit import get_login_throttle
+    throttle = get_login_throttle(current_app)
+    if not throttle:
+        return jsonify({'status': 'success', 'enabled': False})
+    stats = throttle.stats()
+    stats.update({'status': 'success', 'enabled': True})
+    return jsonify(stats)
+
 @views.route('/api/completion-stats')
 @admin_required
 def get_completion_stats():
@@ -1142,18 +1126,10 @@ def post_final_ranking():
             })
         
         # Store rankings in database for all users to access
-        from flask import current_app
-        import json
-        
-        rankings_data = {
-            'rankings': formatted_rankings,
-            'published_date': datetime.utcnow().isoformat()
-        }
-        
-        # Store in app config for global access
-        current_app.config['PUBLISHED_RANKINGS'] = rankings_data
+        publish_ranking_snapshot(formatted_rankings, 'teaching')
         
         db.session.commit()
+        invalidate_survey_state()
         flash('Final rankings have been successfully posted and are now visible to students.', 'success')
         return jsonify({'status': 'success', 'message': 'Final rankings posted'}), 200
     except Exception as e:
@@ -1233,6 +1209,7 @@ def activate_survey_by_id(survey_id):
             logger.debug("Updated global SurveyStatus to active.")
 
         db.session.commit()
+        _evaluation_setup_changed()
         logger.debug("Database commit successful for survey activation.")
 
         global_active_status = SurveyStatus.query.get(1).is_active if SurveyStatus.query.get(1) else False
@@ -1316,6 +1293,7 @@ def deactivate_survey_by_id(survey_id):
             logger.debug("Created new global SurveyStatus record (inactive).")
 
         db.session.commit()
+        _evaluation_setup_changed()
         logger.debug("Database commit successful for survey deactivation.")
 
         global_active_status = SurveyStatus.query.get(1).is_active if SurveyStatus.query.get(1) else False
@@ -1545,6 +1523,7 @@ def save_teacher_profile():
                 flash('Staff not found.', 'error')
         
         db.session.commit()
+        _evaluation_setup_changed()
         
     except Exception as e:
         db.session.rollback()
@@ -1562,6 +1541,7 @@ def delete_teacher_profile(teacher_id_str):
         if teacher:
             db.session.delete(teacher)
             db.session.commit()
+            _evaluation_setup_changed()
             flash('Teacher profile deleted successfully.', 'success')
         else:
             flash('Teacher not found.', 'error')
@@ -1590,6 +1570,7 @@ def create_survey():
         )
         db.session.add(new_survey)
         db.session.commit()
+        _evaluation_setup_changed()
         flash(f'Survey "{title}" created successfully.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -1613,6 +1594,7 @@ def delete_survey(survey_identifier):
             Question.query.filter_by(survey_id=survey_uuid).delete()
             db.session.delete(survey)
             db.session.commit()
+            _evaluation_setup_changed()
             flash(f'Survey "{survey.title}" and all its questions deleted successfully.', 'success')
         else:
             flash('Survey not found.', 'error')
@@ -1654,6 +1636,7 @@ def add_question():
         )
         db.session.add(question)
         db.session.commit()
+        _evaluation_setup_changed()
         flash('Question added successfully!', 'success')
             
     except Exception as e:
@@ -1675,6 +1658,7 @@ def delete_question(question_id_str):
         if question:
             db.session.delete(question)
             db.session.commit()
+            _evaluation_setup_changed()
             flash('Question deleted successfully.', 'success')
         else:
             flash('Question not found.', 'error')
@@ -1727,6 +1711,7 @@ def edit_question(question_id_str):
             question.survey_id = None
 
         db.session.commit()
+        _evaluation_setup_changed()
         flash('Question updated successfully!', 'success')
 
     except ValueError:
@@ -1868,15 +1853,34 @@ def student_home():
     }
 
     try:
-        # Get current student
+        # Survey status, active survey and ranking flags come from the cached survey state
+        survey_state = current_survey_state()
+        is_survey_active = survey_state.is_active
+        safe_context['survey_active'] = is_survey_active
+
+        # One round trip for the student profile and their submission (for the active survey, if any)
         current_student = None
         if student_id_str:
             try:
-                current_student = Student.query.get(uuid.UUID(student_id_str))
+                student_uuid = uuid.UUID(student_id_str)
             except ValueError:
                 logger.error("Invalid UUID format for student_id in session: %s", student_id_str)
                 flash('Invalid user session ID format.', 'error')
                 return redirect(url_for('auth.login'))
+
+            session_join = SurveySession.student_uuid == Student.id
+            if survey_state.survey_id:
+                session_join = db.and_(session_join, SurveySession.survey_id == survey_state.survey_id)
+            current_student = db.session.query(
+                Student.full_name, Student.student_id, Student.program, Student.section, Student.email,
+                SurveySession.session_id, SurveySession.submission_date
+            ).outerjoin(
+                SurveySession, session_join
+            ).filter(
+                Student.id == student_uuid
+            ).order_by(
+                SurveySession.submission_date.desc()
+            ).first()
         
         if not current_student:
              logger.error("Student profile not found in DB for session ID: %s", student_id_str)
@@ -1892,58 +1896,19 @@ def student_home():
             'email': current_student.email
         }
         
-        # Check if survey is active
-        survey_status = SurveyStatus.query.get(1)
-        is_survey_active = survey_status.is_active if survey_status else False
-        safe_context['survey_active'] = is_survey_active
-        
         # Check if student has already submitted evaluation
-        has_submitted = SurveySession.query.filter_by(student_uuid=current_student.id).first() is not None
+        has_submitted = current_student.session_id is not None
         safe_context['evaluation_complete'] = has_submitted
 
-        # Parse student's section (handle BSCS-2A format)
-        student_full_section = current_student.section  # e.g., "BSCS-2A"
-        if '-' in student_full_section:
-            student_program, student_section = student_full_section.split('-', 1)
-        else:
-            student_program = current_student.program
-            student_section = student_full_section
-        
-        # Get teachers assigned to the student's section (teaching staff)
-        teaching_staff = Teacher.query.join(
-            Teacher.sections_assigned
-        ).join(
-            Section.department
-        ).filter(
-            Section.name == student_section,
-            Department.name == student_program
-        ).options(
-            db.joinedload(Teacher.departments_assigned),
-            db.joinedload(Teacher.sections_assigned)
-        ).all()
+        # Teaching staff of the student's section plus all non-teaching staff, from the roster cache
+        student_program, student_section = split_student_section(current_student.section, current_student.program)
+        safe_context['my_teachers'] = staff_for_section(student_program, student_section, survey_state.setup_generation)
         
-        # Get all non-teaching staff (all students evaluate non-teaching staff)
-        non_teaching_staff = Teacher.query.join(
-            Teacher.departments_assigned
-        ).filter(
-            Department.name == 'Admin'
-        ).options(
-            db.joinedload(Teacher.departments_assigned),
-            db.joinedload(Teacher.sections_assigned)
-        ).all()
-        
-        # Combine teaching and non-teaching staff
-        safe_context['my_teachers'] = teaching_staff + non_teaching_staff
-        
-        # Always load questions from active survey
-        active_survey = Survey.query.filter_by(is_active=True).first()
-        if active_survey:
-            safe_context['questions'] = Question.query.filter_by(survey_id=active_survey.id).all()
-        elif not safe_context['questions']:
-            # Fallback to any survey for display
-            any_survey = Survey.query.first()
-            if any_survey:
-                safe_context['questions'] = Question.query.filter_by(survey_id=any_survey.id).all()
+        # Questions of the active survey (or any survey for display), cached with the survey state
+        safe_context['questions'] = cached_survey_questions(
+            survey_state.display_survey_id, ttl=current_app.config.get('SURVEY_STATE_TTL_SECONDS'),
+            generation=survey_state.setup_generation
+        )
         
         # Handle survey states and load previous data if needed
         if is_survey_active:
@@ -1966,25 +1931,24 @@ def student_home():
                 safe_context['show_form'] = False
                 safe_context['survey_closed_message'] = 'The survey is currently closed.'
         
-        # Load previous comments if in review mode
+        # One-time token so a double-clicked submit is only stored once
+        if safe_context['can_submit']:
+            from .submissions import new_submission_token
+            safe_context['submission_token'] = new_submission_token()
+
+        # Load previous comments and scores if in review mode
         if safe_context['review_mode'] and has_submitted:
-            existing_session = SurveySession.query.filter_by(student_uuid=current_student.id).first()
-            if existing_session:
-                safe_context['previous_comments'] = StudentComment.query.filter_by(session_id=existing_session.session_id).all()
-            else:
-                safe_context['previous_comments'] = []
+            safe_context['previous_comments'] = StudentComment.query.filter_by(session_id=current_student.session_id).all()
+            # Previous scores for prefilling the form: {(staff_id, question_id): score}
+            from .submissions import get_answer_map
+            safe_context['answer_map'] = get_answer_map(current_student.session_id, current_student.submission_date)
         
         # Get published rankings
-        ranking_status = RankingStatus.query.first()
-        logger.info(f"Ranking status: {ranking_status}")
-        if ranking_status:
-            logger.info(f"is_posted_teaching: {ranking_status.is_posted_teaching}")
-        
-        if ranking_status and ranking_status.is_posted_teaching:
-            # Get real rankings from app config
-            published_data = current_app.config.get('PUBLISHED_RANKINGS', {})
-            logger.info(f"Published data: {published_data}")
-            safe_context['published_rankings'] = published_data.get('rankings', [])
+        logger.info(f"is_posted_teaching: {survey_state.is_posted_teaching}")
+        
+        if survey_state.is_posted_teaching:
+            # Latest published snapshot, cached per process by snapshot ID
+            safe_context['published_rankings'] = get_snapshot(survey_state.teaching_ranking_snapshot_id)
             safe_context['rankings_posted'] = True
             logger.info(f"Rankings posted: True, count: {len(safe_context['published_rankings'])}")
         else:
@@ -2026,6 +1990,7 @@ def reset_student_submission(student_id):
         existing_session = SurveySession.query.filter_by(student_uuid=student.id).first()
         if existing_session:
             Answer.query.filter_by(session_id=existing_session.session_id).delete()
+            delete_score_cells([existing_session.session_id])
             db.session.delete(existing_session)
             db.session.commit()
             flash(f'Reset submission for student {student_id}. They can now resubmit.', 'success')
@@ -2113,6 +2078,7 @@ def create_department():
         department = Department(name=name)
         db.session.add(department)
         db.session.commit()
+        _evaluation_setup_changed()
         
         return jsonify({
             'status': 'success',
@@ -2146,6 +2112,7 @@ def update_department(dept_id):
         
         department.name = name
         db.session.commit()
+        _evaluation_setup_changed()
         
         return jsonify({
             'status': 'success',
@@ -2185,6 +2152,7 @@ def delete_department(dept_id):
         
         db.session.delete(department)
         db.session.commit()
+        _evaluation_setup_changed()
         
         return jsonify({'status': 'success', 'message': 'Department deleted successfully'})
     except Exception as e:
@@ -2221,6 +2189,7 @@ def create_section():
         section = Section(name=name, department_id=dept_uuid)
         db.session.add(section)
         db.session.commit()
+        _evaluation_setup_changed()
         
         return jsonify({
             'status': 'success',
@@ -2262,6 +2231,7 @@ def update_section(section_id):
         
         section.name = name
         db.session.commit()
+        _evaluation_setup_changed()
         
         return jsonify({
             'status': 'success',
@@ -2295,6 +2265,7 @@ def delete_section(section_id):
         
         db.session.delete(section)
         db.session.commit()
+        _evaluation_setup_changed()
         
         return jsonify({'status': 'success', 'message': 'Section deleted successfully'})
     except Exception as e:
@@ -2307,152 +2278,6 @@ def delete_section(section_id):
 def test_forgot():
     return jsonify({'message': 'Route is working', 'method': request.method})
 
-@views.route('/forgot-password', methods=['POST'])
-def forgot_password():
-    """Handle forgot password requests for both staff and students."""
-    try:
-        data = request.get_json()
-        email = data.get('email', '').strip().lower()
-        user_type = data.get('user_type', 'student')
-        
-        if not email:
-            return jsonify({'success': False, 'message': 'Email is required'}), 400
-        
-        user = None
-        user_name = None
-        
-        if user_type == 'staff':
-            from .models import User
-            user = User.query.filter_by(email=email).first()
-            if user:
-                user_name = user.name
-        else:
-            user = Student.query.filter_by(email=email).first()
-            if user:
-                user_name = user.full_name
-            else:
-                import csv
-                import os
-                csv_path = os.path.join(os.path.dirname(__file__), 'data', 'students_data.csv')
-                print(f"Looking for CSV at: {csv_path}")
-                print(f"File exists: {os.path.exists(csv_path)}")
-                
-                try:
-                    with open(csv_path, 'r', encoding='utf-8') as file:
-                        reader = csv.DictReader(file)
-                        for row in reader:
-                            row_email = row['email'].strip().lower()
-                            print(f"Comparing: '{row_email}' == '{email}' = {row_email == email}")
-                            if row_email == email:
-                                user_name = row['full_name']
-                                user = type('CSVUser', (), {
-                                    'email': email,
-                                    'full_name': user_name,
-                                    'student_id': row['student_id'],
-                                    'is_csv_user': True
-                                })()
-                                print(f"Found CSV user: {user_name}")
-                                break
-                except Exception as e:
-                    print(f"Error reading CSV: {e}")
-        
-        if not user:
-            return jsonify({'success': False, 'message': 'Email not found in our records'}), 404
-        
-        import random
-        otp_code = str(random.randint(100000, 999999))
-        session[f'reset_otp_{email}'] = otp_code
-        session[f'reset_email_{email}'] = email
-        session[f'reset_user_type_{email}'] = user_type
-        
-        return jsonify({
-            'success': True, 
-            'message': f'Verification code ready for {email}',
-            'otp_code': otp_code,
-            'user_name': user_name
-        }), 200
-        
-    except Exception as e:
-        print(f"Forgot password error: {e}")
-        return jsonify({'success': False, 'message': 'An error occurred'}), 500
-
-@views.route('/reset-password', methods=['POST'])
-def reset_password():
-    """Reset password after OTP verification."""
-    try:
-        from werkzeug.security import generate_password_hash
-        
-        data = request.get_json()
-        email = data.get('email', '').strip().lower()
-        otp_code = data.get('otp_code', '').strip()
-        new_password = data.get('new_password', '').strip()
-        
-        if not all([email, otp_code, new_password]):
-            return jsonify({'success': False, 'message': 'All fields are required'}), 400
-        
-        if len(new_password) < 6:
-            return jsonify({'success': False, 'message': 'Password must be at least 6 characters'}), 400
-        
-        stored_otp = session.get(f'reset_otp_{email}')
-        if not stored_otp or str(stored_otp) != str(otp_code):
-            return jsonify({'success': False, 'message': 'Invalid verification code'}), 400
-        
-        user_type = session.get(f'reset_user_type_{email}', 'student')
-        
-        if user_type == 'staff':
-            from .models import User
-            user = User.query.filter_by(email=email).first()
-            if user:
-                user.password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
-                db.session.commit()
-            else:
-                return jsonify({'success': False, 'message': 'User not found'}), 404
-        else:
-            user = Student.query.filter_by(email=email).first()
-            if user:
-                user.password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
-                user.password_changed = True
-                db.session.commit()
-            else:
-                import csv
-                import os
-                csv_path = os.path.join(os.path.dirname(__file__), 'data', 'students_data.csv')
-                student_found = False
-                try:
-                    with open(csv_path, 'r', encoding='utf-8') as file:
-                        reader = csv.DictReader(file)
-                        for row in reader:
-                            if row['email'].strip().lower() == email:
-                                new_student = Student(
-                                    full_name=row['full_name'],
-                                    email=email,
-                                    password_hash=generate_password_hash(new_password, method='pbkdf2:sha256'),
-                                    student_id=row['student_id'],
-                                    program=row['program'],
-                                    section=row['section'],
-                                    password_changed=True
-                                )
-                                db.session.add(new_student)
-                                db.session.commit()
-                                student_found = True
-                                break
-                except Exception as e:
-                    print(f"Error reading CSV for reset: {e}")
-                
-                if not student_found:
-                    return jsonify({'success': False, 'message': 'Student not found'}), 404
-        
-        session.pop(f'reset_otp_{email}', None)
-        session.pop(f'reset_email_{email}', None)
-        session.pop(f'reset_user_type_{email}', None)
-        
-        return jsonify({'success': True, 'message': 'Password updated successfully'}), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"Reset password error: {e}")
-        return jsonify({'success': False, 'message': 'An error occurred while updating password'}), 500
-
 @views.route('/admin/update-profile', methods=['POST'])
 @admin_required
 def update_admin_profile():
@@ -2499,7 +2324,6 @@ def update_admin_profile():
 def update_admin_password():
     """Update admin password."""
     try:
-        from werkzeug.security import check_password_hash, generate_password_hash
         from .models import User
         
         user_id = session.get('user_id')
@@ -2515,14 +2339,14 @@ def update_admin_password():
             return jsonify({'status': 'error', 'message': 'All fields are required'}), 400
         
         # Verify current password
-        if not check_password_hash(user.password_hash, current_password):
+        if not verify_password(user.password_hash, current_password):
             return jsonify({'status': 'error', 'message': 'Current password is incorrect'}), 400
         
         if len(new_password) < 6:
             return jsonify({'status': 'error', 'message': 'New password must be at least 6 characters'}), 400
         
         # Update password
-        user.password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
+        user.password_hash = hash_password(new_password)
         db.session.commit()
         
         return jsonify({'status': 'success', 'message': 'Password updated successfully'})
@@ -2571,128 +2395,113 @@ def update_admin_photo():
 @views.route('/submit_evaluation', methods=['POST'])
 @login_required
 def submit_evaluation():
+    from .submissions import (
+        Submission, SUBMISSION_TOKEN_FIELD, parse_submission_form, store_submission,
+        claim_submission_token, finish_submission_token, release_submission_token, settle_submission_token_when_done
+    )
+    from .validation import get_validation_context, validate_submission
+    from .group_commit import SubmissionInFlight
+
+    if session.get('user_role') != 'student':
+        flash('Access denied.', 'error')
+        return redirect(url_for('auth.login'))
+
+    student_id_str = session.get('user_id')
+    token = request.form.get(SUBMISSION_TOKEN_FIELD)
+
+    # A repeated POST of the same form to this worker replays the first outcome without touching the
+    # database; a retry that reaches another worker is made harmless by the session upsert instead
+    claimed, previous_flashes = claim_submission_token(
+        student_id_str, token, ttl=current_app.config.get('SUBMISSION_TOKEN_TTL_SECONDS')
+    )
+    if not claimed:
+        logger.info(f"Duplicate evaluation submission suppressed for student {student_id_str}")
+        if previous_flashes is None:
+            flash('Your evaluation is still being processed. Please refresh in a moment.', 'info')
+        for category, message in previous_flashes or []:
+            flash(message, category)
+        return redirect(url_for('views.student_home'))
+
+    outcome = []
+    stored = False
+    in_flight = None
     try:
+        student_uuid = uuid.UUID(student_id_str)
+
+        # Global status and active survey come from the cached survey state
+        survey_state = current_survey_state()
+
         # Check if the global survey status is active
-        survey_status_obj = SurveyStatus.query.get(1)
-        if not survey_status_obj or not survey_status_obj.is_active:
-            flash('The evaluation period is currently inactive. You cannot submit evaluations.', 'error')
+        if not survey_state.is_active:
+            outcome.append(('error', 'The evaluation period is currently inactive. You cannot submit evaluations.'))
             return redirect(url_for('views.student_home'))
 
-        if session.get('user_role') != 'student':
-            flash('Access denied.', 'error')
-            return redirect(url_for('auth.login'))
-        
-        student_id_str = session.get('user_id')
-        student_uuid = uuid.UUID(student_id_str)
+        if not survey_state.survey_id:
+            outcome.append(('error', 'No active survey found.'))
+            return redirect(url_for('views.student_home'))
 
-        existing_session = SurveySession.query.filter_by(student_uuid=student_uuid).first()
-        if existing_session:
-            # Delete existing answers to allow resubmission
-            Answer.query.filter_by(session_id=existing_session.session_id).delete()
-            db.session.delete(existing_session)
-            db.session.commit()
-            logger.info(f"Reset existing submission for student {student_id_str}")
+        question_answers, comments = parse_submission_form(request.form)
 
-        # Get active survey
-        active_survey = Survey.query.filter_by(is_active=True).first()
-        if not active_survey:
-            flash('No active survey found.', 'error')
+        if not question_answers:
+            outcome.append(('warning', '⚠️ No valid answers were recorded. Please ensure all fields are filled.'))
             return redirect(url_for('views.student_home'))
 
-        new_session = SurveySession(
-            student_uuid=student_uuid, 
-            survey_id=active_survey.id,
-            survey_title=active_survey.title, 
-            submission_date=datetime.utcnow()
-        )
-        db.session.add(new_session)
-        db.session.flush()
-
-        # Group answers by question to store multiple teacher scores per question
-        question_answers = {}
-        for key, value in request.form.items():
-            if key.startswith('score_'):
-                try:
-                    _, teacher_id_str, question_id_str = key.split('_')
-                    score = int(value)
-                    question_uuid = uuid.UUID(question_id_str)
-                    
-                    if question_uuid not in question_answers:
-                        question_answers[question_uuid] = []
-                    
-                    question_answers[question_uuid].append(f"{score}|{teacher_id_str}")
-
-                except ValueError as ve:
-                    logger.error("Malformed form key/value: %s=%s, Error: %s", key, value, ve)
-                    continue
-                except Exception as e:
-                    logger.error("Error processing answer for key %s: %s", key, e)
-                    continue
-        
-        # Create one answer per question with all teacher scores combined
-        answers_to_add = []
-        for question_uuid, teacher_scores in question_answers.items():
-            combined_response = ";".join(teacher_scores)  # Combine multiple teacher scores
-            answer = Answer(
-                session_id=new_session.session_id,
-                question_identifier=question_uuid,
-                response_value=combined_response,
-                survey_id=active_survey.id
-            )
-            answers_to_add.append(answer)
+        # Validate against the cached (survey, section) context; no extra queries on a warm cache
+        if 'user_program' not in session or session.get('user_section') is None:
+            # Sessions from before the section and program were stored at login
+            student_row = db.session.query(Student.section, Student.program).filter(Student.id == student_uuid).first()
+            session['user_section'] = student_row.section if student_row else ''
+            session['user_program'] = student_row.program if student_row else None
+        # Resolved exactly like the dashboard, so validation allows the staff the student was shown
+        student_program, student_section = split_student_section(session.get('user_section'), session.get('user_program'))
+        context = get_validation_context(survey_state.survey_id, student_program, student_section,
+                                         generation=survey_state.setup_generation)
+        problems = validate_submission(context, question_answers, comments)
+        if problems:
+            logger.warning(f"Rejected submission from {student_id_str}: {problems[:5]}")
+            outcome.append(('error', 'Your evaluation contained answers that are not part of your survey. '
+                                     'Please reload the page and try again.'))
+            return redirect(url_for('views.student_home'))
 
-        if answers_to_add:
-            try:
-                db.session.add_all(answers_to_add)
-                
-                # Handle comments submission
-                comments_added = 0
-                for key, value in request.form.items():
-                    if key.startswith('comment_') and value.strip():
-                        try:
-                            teacher_id_str = key.replace('comment_', '')
-                            teacher_uuid = uuid.UUID(teacher_id_str)
-                            
-                            # Create comment record
-                            comment = StudentComment(
-                                session_id=new_session.session_id,
-                                teacher_id=teacher_uuid,
-                                comment_text=value.strip()
-                            )
-                            db.session.add(comment)
-                            comments_added += 1
-                            
-                        except ValueError as ve:
-                            logger.warning(f"Invalid teacher ID in comment: {teacher_id_str}, Error: {ve}")
-                            continue
-                        except Exception as e:
-                            logger.error(f"Error processing comment for teacher {teacher_id_str}: {e}")
-                            continue
-                
-                db.session.commit()
-                
-                if comments_added > 0:
-                    flash(f'✅ Your evaluation and {comments_added} comment(s) have been submitted successfully!', 'success')
-                else:
-                    flash('✅ Your evaluation has been submitted successfully!', 'success')
-                    
-            except Exception as commit_error:
-                db.session.rollback()
-                logger.error(f"Database commit error: {commit_error}")
-                logger.error(f"Session data: student_uuid={student_uuid}, survey_id={active_survey.id}")
-                logger.error(f"Answers count: {len(answers_to_add)}")
-                logger.error(f"Session ID: {new_session.session_id}")
-                for i, answer in enumerate(answers_to_add):
-                    logger.error(f"Answer {i}: session_id={answer.session_id}, question_id={answer.question_identifier}, response={answer.response_value}")
-                flash('Database error during submission. Please try again.', 'error')
+        submission = Submission(student_uuid, survey_state.survey_id, survey_state.survey_title, question_answers, comments)
+        if comments:
+            success = [('success', f'✅ Your evaluation and {len(comments)} comment(s) have been submitted successfully!')]
         else:
-            db.session.rollback()
-            flash('⚠️ No valid answers were recorded. Please ensure all fields are filled.', 'warning')
+            success = [('success', '✅ Your evaluation has been submitted successfully!')]
+        try:
+            # Upsert session, replace answers and comments, single commit
+            # (or a shared commit when group commit is enabled)
+            store_submission(submission)
+            stored = True
+        except SubmissionInFlight as still_committing:
+            # May still be stored: keep the token so a retry cannot write it twice
+            logger.warning(f"Submission of {student_id_str} still being committed after the wait")
+            in_flight = (still_committing.future, success)
+            outcome.append(('info', 'Your evaluation is still being saved. Please refresh in a moment.'))
+            return redirect(url_for('views.student_home'))
+        except Exception as commit_error:
+            logger.error(f"Database commit error: {commit_error}")
+            logger.error(f"Session data: student_uuid={student_uuid}, survey_id={survey_state.survey_id}")
+            logger.error(f"Answers count: {len(question_answers)}")
+            outcome.append(('error', 'Database error during submission. Please try again.'))
+            return redirect(url_for('views.student_home'))
+
+        outcome.extend(success)
 
     except Exception as e:
         db.session.rollback()
         logger.error("SUBMISSION ERROR: %s", e)
         traceback.print_exc()
-        flash('An internal error prevented submission. Please try again.', 'error')
+        outcome.append(('error', 'An internal error prevented submission. Please try again.'))
+
+    finally:
+        for category, message in outcome:
+            flash(message, category)
+        if stored:
+            finish_submission_token(student_id_str, token, outcome)
+        elif in_flight:
+            settle_submission_token_when_done(student_id_str, token, *in_flight)
+        else:
+            release_submission_token(student_id_str, token)
         
-    return redirect(url_for('views.student_home'))
\ No newline at end of file
+    return redirect(url_for('views.student_home'))
@@ -1,8 +1,10 @@
 import random
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response, current_app
 from flask_login import login_user, login_required, current_user, logout_user
 from .models import User, Student, db
+from .credentials import hash_password, verify_password, rehash_if_needed
+from .otp import issue_otp, verify_otp, consume_otp
+from .ratelimit import get_login_throttle
 
 # Define the Blueprint
 auth = Blueprint('auth', __name__)
@@ -22,6 +24,16 @@ def login():
             flash('Invalid role selected.', 'error')
             return redirect(url_for('auth.login'))
 
+        # Shed over-limit attempts before any password hashing or CSV scan
+        throttle = get_login_throttle(current_app)
+        if throttle:
+            decision = throttle.check(request.remote_addr, login_id)
+            if not decision.allowed:
+                flash(f'Too many login attempts. Please wait {decision.retry_after} seconds and try again.', 'error')
+                response = make_response(render_template('login.html', sis_title="PGPC SIS Portal"), 429)
+                response.headers['Retry-After'] = str(decision.retry_after)
+                return response
+
         if role == 'staff':
             user = User.query.filter_by(email=login_id).first()
         else:
@@ -30,7 +42,6 @@ def login():
             if not user:
                 import csv
                 import os
-                from flask import current_app
                 
                 csv_path = os.path.join(current_app.root_path, 'data', 'students_data.csv')
                 try:
@@ -42,7 +53,7 @@ def login():
                                     user = Student(
                                         full_name=row['full_name'],
                                         email=row['email'],
-                                        password_hash=generate_password_hash(password, method='pbkdf2:sha256'),
+                                        password_hash=hash_password(password),
                                         student_id=row['student_id'],
                                         program=row['program'],
                                         section=row['section'],
@@ -54,7 +65,15 @@ def login():
                 except FileNotFoundError:
                     pass
 
-        if user and check_password_hash(user.password_hash, password):
+        if user and verify_password(user.password_hash, password):
+            # Upgrade hashes made with an older or bulk-provisioning cost
+            try:
+                if rehash_if_needed(user, password):
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Password rehash failed for {login_id}: {e}")
+
             # 🔐 NEW: Regenerate session to prevent session fixation
             session.clear()
 
@@ -65,11 +84,13 @@ def login():
              session['user_name'] = getattr(user, 'name', user.email)
              session['user_role'] = 'staff'     # <-- REQUIRED, FIXED VALUE
              session['user_section'] = None  
+             session['user_program'] = None
  
             else:
              session['user_name'] = user.full_name
              session['user_role'] = 'student'
              session['user_section'] = user.section
+             session['user_program'] = user.program
  
 
             flash(f'Logged in successfully as {session["user_name"]}!', 'success')
@@ -163,7 +184,7 @@ def change_password():
                 flash('Password must be at least 6 characters long.', 'error')
             else:
                 try:
-                    current_user.password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
+                    current_user.password_hash = hash_password(new_password)
                     current_user.password_changed = True
                     db.session.commit()
                     
@@ -207,7 +228,7 @@ def signup():
             flash('An account with this email or student ID already exists.', 'error')
             return redirect(url_for('auth.signup'))
 
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        hashed_password = hash_password(password)
 
         new_student = Student(
             full_name=name,
@@ -328,12 +349,8 @@ def forgot_password():
         if not user:
             return jsonify({'success': False, 'message': 'Email not found in our records'}), 404
         
-        # Generate OTP and store in session
-        import random
-        otp_code = str(random.randint(100000, 999999))
-        session[f'reset_otp_{email}'] = otp_code
-        session[f'reset_email_{email}'] = email
-        session[f'reset_user_type_{email}'] = user_type
+        # Generate OTP and store it server-side (shared by all workers)
+        otp_code = issue_otp(email, user_type)
         print(f"Storing user_type as: {user_type}")
         
         return jsonify({
@@ -363,17 +380,16 @@ def reset_password():
             return jsonify({'success': False, 'message': 'Password must be at least 6 characters'}), 400
         
         # Verify OTP
-        stored_otp = session.get(f'reset_otp_{email}')
-        if not stored_otp or str(stored_otp) != str(otp_code):
+        user_type = verify_otp(email, otp_code)
+        if not user_type:
             return jsonify({'success': False, 'message': 'Invalid verification code'}), 400
         
-        user_type = session.get(f'reset_user_type_{email}', 'student')
-        
         if user_type == 'staff':
             # Update staff user in database
             user = User.query.filter_by(email=email).first()
             if user:
-                user.password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
+                user.password_hash = hash_password(new_password)
+                consume_otp(email)
                 db.session.commit()
             else:
                 return jsonify({'success': False, 'message': 'User not found'}), 404
@@ -381,8 +397,9 @@ def reset_password():
             # Update student in database
             user = Student.query.filter_by(email=email).first()
             if user:
-                user.password_hash = generate_password_hash(new_password, method='pbkdf2:sha256')
+                user.password_hash = hash_password(new_password)
                 user.password_changed = True
+                consume_otp(email)
                 db.session.commit()
             else:
                 # Handle CSV student - create database entry
@@ -400,13 +417,14 @@ def reset_password():
                                 new_student = Student(
                                     full_name=row['full_name'],
                                     email=email,
-                                    password_hash=generate_password_hash(new_password, method='pbkdf2:sha256'),
+                                    password_hash=hash_password(new_password),
                                     student_id=row['student_id'],
                                     program=row['program'],
                                     section=row['section'],
                                     password_changed=True
                                 )
                                 db.session.add(new_student)
+                                consume_otp(email)
                                 db.session.commit()
                                 student_found = True
                                 break
@@ -416,11 +434,6 @@ def reset_password():
                 if not student_found:
                     return jsonify({'success': False, 'message': 'Student not found'}), 404
         
-        # Clear session data
-        session.pop(f'reset_otp_{email}', None)
-        session.pop(f'reset_email_{email}', None)
-        session.pop(f'reset_user_type_{email}', None)
-        
         return jsonify({'success': True, 'message': 'Password updated successfully'}), 200
         
     except Exception as e:
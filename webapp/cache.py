@@ -0,0 +1,84 @@
+# webapp/cache.py
+"""
+Small in-process caches shared by the request handlers.
+
+Everything here lives in the memory of one worker process. It is meant for
+short-lived values that are cheap to lose (a restart simply empties it).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe mapping whose entries expire ``ttl`` seconds after they are set.
+
+    When ``max_entries`` is reached the oldest entry is evicted first.
+    """
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, expires_at, now):
+        return expires_at is not None and expires_at <= now
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if self._expired(expires_at, now):
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires_at, value)
+            self._evict()
+
+    def add(self, key, value, ttl=None):
+        """Set ``key`` only if it is absent (or expired). Returns (added, current_value)."""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and not self._expired(item[0], now):
+                return False, item[1]
+            self._data.pop(key, None)
+            self._data[key] = (now + ttl if ttl else None, value)
+            self._evict()
+            return True, value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evict(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        while self._data:
+            oldest_key, (expires_at, _) = next(iter(self._data.items()))
+            if len(self._data) > self.max_entries or self._expired(expires_at, now):
+                del self._data[oldest_key]
+            else:
+                break
@@ -0,0 +1,121 @@
+# webapp/credentials.py
+"""
+Password hashing policy.
+
+Every place that creates or checks a password hash goes through this module,
+so the cost is chosen in one place (the app config) instead of per call site.
+
+Two costs are configured:
+- interactive: passwords a person chose or is about to type (password
+  changes, resets, admin accounts). PASSWORD_HASH_METHOD selects 'pbkdf2'
+  (PASSWORD_PBKDF2_ITERATIONS rounds of PBKDF2-SHA256) or the memory-hard
+  'scrypt' (PASSWORD_SCRYPT_N / _R / _P).
+- bulk: default passwords written while provisioning many students at once
+  (CSV sync, database seeding), hashed with PASSWORD_BULK_PBKDF2_ITERATIONS.
+  These passwords must be changed on first login anyway.
+
+PBKDF2 hashes are made and checked by Werkzeug itself. Werkzeug 2.2 has
+no scrypt, so scrypt hashes are made here in exactly the format Werkzeug
+2.3 uses ("scrypt:<n>:<r>:<p>$salt$hex"): they keep verifying after a
+Werkzeug upgrade, and test_credentials.py pins that with hashes generated
+by Werkzeug 2.3. After a successful login, a hash that does not match the
+current interactive policy is replaced with one that does; see
+`rehash_if_needed`.
+"""
+import hashlib
+import hmac
+import secrets
+import string
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+DEFAULT_METHOD = 'pbkdf2'
+DEFAULT_PBKDF2_ITERATIONS = 260000
+DEFAULT_BULK_PBKDF2_ITERATIONS = 20000
+DEFAULT_SCRYPT_N = 2 ** 15
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+
+SALT_LENGTH = 16
+_SALT_CHARS = string.ascii_letters + string.digits
+
+HashPolicy = namedtuple('HashPolicy', ['method', 'pbkdf2_iterations', 'scrypt_n', 'scrypt_r', 'scrypt_p'])
+
+
+def get_hash_policy(purpose=INTERACTIVE, config=None):
+    """Hashing policy for 'interactive' or 'bulk' hashes, read from the app config when available."""
+    if config is None:
+        config = current_app.config if has_app_context() else {}
+
+    if purpose == BULK:
+        return HashPolicy('pbkdf2', config.get('PASSWORD_BULK_PBKDF2_ITERATIONS', DEFAULT_BULK_PBKDF2_ITERATIONS),
+                          None, None, None)
+    return HashPolicy(
+        config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        config.get('PASSWORD_PBKDF2_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS),
+        config.get('PASSWORD_SCRYPT_N', DEFAULT_SCRYPT_N),
+        config.get('PASSWORD_SCRYPT_R', DEFAULT_SCRYPT_R),
+        config.get('PASSWORD_SCRYPT_P', DEFAULT_SCRYPT_P)
+    )
+
+
+def _method_string(policy):
+    if policy.method == 'scrypt':
+        return f'scrypt:{policy.scrypt_n}:{policy.scrypt_r}:{policy.scrypt_p}'
+    return f'pbkdf2:sha256:{policy.pbkdf2_iterations}'
+
+
+def _scrypt(password, salt, n, r, p):
+    """Hex digest the way Werkzeug 2.3's scrypt method computes it."""
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt.encode('utf-8'), n=n, r=r, p=p,
+                          maxmem=132 * n * r * p).hex()
+
+
+def hash_password(password, purpose=INTERACTIVE, policy=None):
+    """Hash a password with the configured policy for `purpose` ('interactive' or 'bulk')."""
+    policy = policy or get_hash_policy(purpose)
+    if policy.method != 'scrypt':
+        return generate_password_hash(password, method=_method_string(policy), salt_length=SALT_LENGTH)
+    salt = ''.join(secrets.choice(_SALT_CHARS) for _ in range(SALT_LENGTH))
+    return f'{_method_string(policy)}${salt}${_scrypt(password, salt, policy.scrypt_n, policy.scrypt_r, policy.scrypt_p)}'
+
+
+def verify_password(password_hash, password):
+    """Check a password against a stored PBKDF2 or scrypt hash."""
+    if not password_hash or password is None:
+        return False
+    if not password_hash.startswith('scrypt:'):
+        return check_password_hash(password_hash, password)
+    try:
+        method, salt, expected = password_hash.split('$', 2)
+        n, r, p = (int(part) for part in method.split(':')[1:4])
+        actual = _scrypt(password, salt, n, r, p)
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(password_hash, policy=None):
+    """True when a stored hash was not made with the current interactive policy."""
+    policy = policy or get_hash_policy(INTERACTIVE)
+    method = (password_hash or '').split('$', 1)[0]
+    return method != _method_string(policy)
+
+
+def rehash_if_needed(account, password):
+    """
+    After a successful password check, upgrade the account's hash to the
+    current interactive policy. The caller commits.
+
+    Returns:
+        bool: True if the hash was replaced
+    """
+    if not needs_rehash(account.password_hash):
+        return False
+    account.password_hash = hash_password(password)
+    return True
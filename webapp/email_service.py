@@ -1,74 +1,144 @@
 import smtplib
 import os
+from collections import namedtuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 # Load environment variables
 load_dotenv()
 
+REMINDER_SUBJECT = "Reminder: Complete Your Teacher Evaluation - PGPC"
+
+# Lightweight row used for bulk rendering (no ORM objects needed)
+ReminderRow = namedtuple('ReminderRow', ['email', 'full_name', 'program', 'section'])
+
+
+class ReminderRenderer:
+    """
+    Renders reminder emails from the templates in templates/email.
+
+    The HTML and plain-text templates are compiled once when the renderer is
+    created and reused for every message, so building a whole batch only
+    costs one template render per part.
+    """
+
+    def __init__(self, template_dir=None, evaluation_link=None):
+        if not template_dir:
+            template_dir = os.path.join(os.path.dirname(__file__), 'templates', 'email')
+
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=select_autoescape(['html'])
+        )
+        self.html_template = self.env.get_template('reminder.html')
+        self.text_template = self.env.get_template('reminder.txt')
+        self.evaluation_link = evaluation_link or os.getenv('APP_BASE_URL', 'http://localhost:5000').rstrip('/') + '/login'
+
+    def render_parts(self, row):
+        """Return (subject, text_body, html_body) for one ReminderRow."""
+        context = {
+            'student_name': row.full_name,
+            'program': row.program or '',
+            'section': row.section or '',
+            'evaluation_link': self.evaluation_link
+        }
+        return REMINDER_SUBJECT, self.text_template.render(context), self.html_template.render(context)
+
+    def build_message(self, row, sender):
+        """Build a multipart/alternative message for one ReminderRow."""
+        subject, text_body, html_body = self.render_parts(row)
+
+        message = MIMEMultipart('alternative')
+        message["From"] = sender
+        message["To"] = row.email
+        message["Subject"] = subject
+        # Plain text first so clients that prefer HTML pick the last part
+        message.attach(MIMEText(text_body, "plain", "utf-8"))
+        message.attach(MIMEText(html_body, "html", "utf-8"))
+        return message
+
+    def build_messages(self, rows, sender):
+        """Yield (row, message) pairs for a batch of ReminderRows."""
+        for row in rows:
+            yield row, self.build_message(row, sender)
+
+
+_renderer = None
+
+
+def get_reminder_renderer():
+    """Return the process-wide renderer, compiling the templates on first use."""
+    global _renderer
+    if _renderer is None:
+        _renderer = ReminderRenderer()
+    return _renderer
+
+
+def _smtp_settings():
+    return (
+        os.getenv('MAIL_SERVER', 'smtp.gmail.com'),
+        int(os.getenv('MAIL_PORT', '587')),
+        os.getenv('MAIL_USERNAME'),
+        os.getenv('MAIL_PASSWORD')
+    )
+
+
+def send_reminder_batch(rows):
+    """
+    Send reminder emails for many ReminderRows over a single SMTP connection.
+
+    Yields:
+        tuple: (row, success, error) for each row, in order, as soon as it is sent
+    """
+    smtp_server, smtp_port, sender_email, sender_password = _smtp_settings()
+
+    if not sender_email or not sender_password:
+        print("ERROR: Email credentials not configured in .env file")
+        for row in rows:
+            yield row, False, 'Email credentials not configured'
+        return
+
+    renderer = get_reminder_renderer()
+    with smtplib.SMTP(smtp_server, smtp_port) as server:
+        server.starttls()
+        server.login(sender_email, sender_password)
+
+        for row, message in renderer.build_messages(rows, sender_email):
+            try:
+                server.send_message(message)
+                yield row, True, None
+            except smtplib.SMTPServerDisconnected as e:
+                # Connection is gone; report this row and let the caller retry the rest later
+                yield row, False, str(e)
+                break
+            except Exception as e:
+                print(f"Failed to send email to {row.email}: {str(e)}")
+                yield row, False, str(e)
+
+
 def send_reminder_email(student_email, student_name, program, section):
     """
     Send a reminder email to a student who hasn't completed their evaluation.
-    
+
     Args:
         student_email (str): Student's email address
         student_name (str): Student's full name
         program (str): Student's program (e.g., BSCS)
         section (str): Student's section (e.g., BSCS-2A)
-    
+
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
     try:
-        # Email configuration from environment variables
-        smtp_server = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.getenv('MAIL_PORT', '587'))
-        sender_email = os.getenv('MAIL_USERNAME')
-        sender_password = os.getenv('MAIL_PASSWORD')
-        
-        if not sender_email or not sender_password:
-            print("ERROR: Email credentials not configured in .env file")
-            return False
-        
-        # Create message
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = student_email
-        message["Subject"] = "Reminder: Complete Your Teacher Evaluation - PGPC"
-        
-        # Email body
-        body = f"""
-Dear {student_name},
-
-This is a friendly reminder that you have not yet completed your teacher evaluation for this semester.
-
-Student Details:
-- Name: {student_name}
-- Program: {program}
-- Section: {section}
-
-Please log in to the PGPC Student Information System to complete your evaluation as soon as possible.
-
-Your feedback is important for improving the quality of education at Padre Garcia Polytechnic College.
-
-Thank you for your cooperation.
-
-Best regards,
-PGPC Administration
-        """
-        
-        message.attach(MIMEText(body, "plain"))
-        
-        # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(message)
-        
-        print(f"Reminder email sent successfully to {student_email}")
-        return True
-        
+        row = ReminderRow(student_email, student_name, program, section)
+        for _, success, _ in send_reminder_batch([row]):
+            if success:
+                print(f"Reminder email sent successfully to {student_email}")
+            return success
+        return False
+
     except Exception as e:
         print(f"Failed to send email to {student_email}: {str(e)}")
-        return False
\ No newline at end of file
+        return False
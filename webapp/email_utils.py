@@ -4,7 +4,7 @@ from flask import current_app
 # Mail instance will be set by the app factory
 mail = None
 
-def send_email(to, subject, body):
+def send_email(to, subject, body, html=None):
     """Send email using Flask-Mail"""
     try:
         if not mail:
@@ -17,6 +17,8 @@ def send_email(to, subject, body):
             recipients=[to]
         )
         msg.body = body
+        if html:
+            msg.html = html
         mail.send(msg)
         print(f"Email sent successfully to {to}")
         return True
@@ -29,16 +31,10 @@ def send_email(to, subject, body):
         print(f"=====================\n")
         return True
 
-def send_survey_reminder(student_email, student_name):
+def send_survey_reminder(student_email, student_name, program=None, section=None):
     """Send survey reminder to student"""
-    subject = "Survey Reminder - PGPC SiS"
-    body = f"""
-Dear {student_name},
+    from .email_service import get_reminder_renderer, ReminderRow
 
-This is a reminder that the teacher evaluation survey is now available.
-Please log in to complete your evaluation.
-
-Best regards,
-PGPC Administration
-"""
-    return send_email(student_email, subject, body)
\ No newline at end of file
+    row = ReminderRow(student_email, student_name, program, section)
+    subject, body, html = get_reminder_renderer().render_parts(row)
+    return send_email(student_email, subject, body, html=html)
@@ -0,0 +1,144 @@
+# webapp/exports.py
+"""
+Spreadsheet exports of evaluation results.
+
+Two datasets are exported, each as CSV or XLSX:
+
+- detailed results: one row per staff member with the criteria averages,
+  total and rank (what the detailed PDFs show);
+- raw scores: one row per score a student gave a staff member, with the
+  student replaced by a respondent number that is only meaningful within
+  one export.
+
+Rows are produced by generators reading the database in batches, so neither
+format holds the whole dataset. CSV is streamed to the client in chunks of rows;
+XLSX is written by XlsxWriter in constant_memory mode to a temporary file,
+which is then streamed from disk. XlsxWriter is optional: without it only
+CSV is offered.
+"""
+import csv
+import logging
+import tempfile
+
+from .models import db, Answer, Question, Teacher, ScoreCell, SurveySession
+from .score_index import score_index_ready
+
+try:
+    import xlsxwriter
+except ImportError:  # pragma: no cover - optional dependency
+    xlsxwriter = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 2000
+CSV_ROWS_PER_CHUNK = 500
+
+RAW_SCORE_HEADERS = ['Respondent', 'Survey', 'Staff Name', 'Criteria', 'Question', 'Score']
+
+
+def xlsx_available():
+    return xlsxwriter is not None
+
+
+def detailed_results_rows(results, criteria):
+    """Header and rows of the detailed results table, as produced by calculate_detailed_scores_by_staff_type."""
+    yield ['NO', 'Staff Name'] + list(criteria) + ['TOTAL', 'RANK']
+    for i, staff in enumerate(results, 1):
+        yield ([i, staff['StaffName']]
+               + [round(staff.get(crit, 0.0), 2) for crit in criteria]
+               + [round(staff['TotalScore'], 2), staff['Rank']])
+
+
+def raw_score_rows():
+    """
+    Header and one row per individual score, in submission order.
+
+    Submissions are numbered 1, 2, ... in the order they are read, so rows
+    of the same submission share a respondent number without exposing the
+    session or student.
+    """
+    yield RAW_SCORE_HEADERS
+
+    staff_names = {str(teacher_id): name for teacher_id, name in db.session.query(Teacher.id, Teacher.name)}
+    questions = {str(question_id): (criteria, text)
+                 for question_id, criteria, text in db.session.query(Question.id, Question.criteria, Question.text)}
+
+    respondent = 0
+    last_session = None
+    for session_id, survey_title, staff_id, question_id, score in _score_cells():
+        if session_id != last_session:
+            respondent += 1
+            last_session = session_id
+        criteria, text = questions.get(str(question_id), ('', ''))
+        yield [respondent, survey_title, staff_names.get(str(staff_id), str(staff_id)), criteria, text, score]
+
+
+def _score_cells():
+    """(session_id, survey_title, staff_id, question_id, score) ordered by session, from the index or the answers."""
+    if score_index_ready():
+        rows = db.session.query(
+            ScoreCell.session_id, SurveySession.survey_title, ScoreCell.staff_id, ScoreCell.question_id, ScoreCell.score
+        ).join(SurveySession, SurveySession.session_id == ScoreCell.session_id).order_by(
+            ScoreCell.session_id, ScoreCell.id
+        ).yield_per(EXPORT_BATCH_SIZE)
+        yield from rows
+        return
+
+    logger.warning("Score index not backfilled; run `flask backfill-score-cells`. Exporting from answers instead.")
+    rows = db.session.query(
+        Answer.session_id, SurveySession.survey_title, Answer.question_identifier, Answer.response_value
+    ).join(SurveySession, SurveySession.session_id == Answer.session_id).filter(
+        Answer.response_value.like('%|%')
+    ).order_by(Answer.session_id, Answer.answer_id).yield_per(EXPORT_BATCH_SIZE)
+    for session_id, survey_title, question_id, response_value in rows:
+        for teacher_score in response_value.split(';'):
+            try:
+                score_str, staff_id = teacher_score.split('|', 1)
+                score = int(float(score_str))
+            except (ValueError, IndexError):
+                continue
+            yield session_id, survey_title, staff_id, question_id, score
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back each written line."""
+
+    def write(self, line):
+        return line
+
+
+def iter_csv(rows, rows_per_chunk=CSV_ROWS_PER_CHUNK):
+    """Encode rows as CSV, yielding chunks of `rows_per_chunk` lines."""
+    writer = csv.writer(_LineBuffer())
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow(row))
+        if len(lines) >= rows_per_chunk:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def write_xlsx(rows, sheet_name='Sheet1'):
+    """
+    Write rows to an XLSX workbook in a temporary file and return the file,
+    positioned at the start. The file is deleted when closed.
+    """
+    if xlsxwriter is None:
+        raise RuntimeError('XLSX export requires the XlsxWriter package.')
+
+    output = tempfile.TemporaryFile()
+    # constant_memory flushes each row to disk once the next one starts
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'tmpdir': tempfile.gettempdir()})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name[:31])
+        header_format = workbook.add_format({'bold': True})
+        for row_number, row in enumerate(rows):
+            worksheet.write_row(row_number, 0, row, header_format if row_number == 0 else None)
+        workbook.close()
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
@@ -0,0 +1,201 @@
+# webapp/group_commit.py
+"""
+Group commit for evaluation submissions.
+
+When SUBMISSION_GROUP_COMMIT is enabled, validated submissions are put on a
+bounded in-process queue instead of being committed by the request thread.
+A single writer thread drains the queue and writes everything it collected
+within SUBMISSION_GROUP_COMMIT_MAX_DELAY_MS (or up to
+SUBMISSION_GROUP_COMMIT_MAX_BATCH submissions) in one transaction. Each
+request waits on a Future that resolves once its submission is committed.
+
+If a batch fails, it is rolled back and its submissions are retried one by
+one, so a single bad submission only fails its own request.
+
+A request that times out cancels its submission if the writer has not
+picked it up yet, so it is never written after the request reported a
+failure. Once the writer has it, the outcome is final and the request keeps
+waiting for it; if even that takes too long, `SubmissionInFlight` tells the
+caller the submission may still be stored.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime
+
+from .models import db
+from .submissions import write_submission, save_submission, remember_answer_map
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH = 50
+DEFAULT_MAX_DELAY_MS = 20
+DEFAULT_QUEUE_SIZE = 1000
+# How long a request waits for room in the queue / for its commit
+ENQUEUE_TIMEOUT_SECONDS = 5
+RESULT_TIMEOUT_SECONDS = 30
+# Extra wait for a submission the writer is already committing
+IN_FLIGHT_TIMEOUT_SECONDS = 30
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class GroupCommitQueueFull(Exception):
+    """Raised when the submission queue stays full for longer than the enqueue timeout."""
+
+
+class SubmissionInFlight(Exception):
+    """Raised when a submission is still being committed after the wait; `future` resolves with its outcome."""
+
+    def __init__(self, future):
+        super().__init__('Submission is still being committed')
+        self.future = future
+
+
+class GroupCommitWriter(threading.Thread):
+    """Background thread that commits queued submissions in batches."""
+
+    def __init__(self, app, max_batch=DEFAULT_MAX_BATCH, max_delay_ms=DEFAULT_MAX_DELAY_MS,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        super().__init__(name='submission-group-commit', daemon=True)
+        self.app = app
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.batches = 0
+        self.committed = 0
+        self.fallbacks = 0
+        self.commit_seconds = 0.0
+
+    def submit(self, submission, timeout=ENQUEUE_TIMEOUT_SECONDS):
+        """Queue a submission and return a Future resolving to its session_id."""
+        future = Future()
+        try:
+            self.queue.put((submission, future), timeout=timeout)
+        except queue.Full:
+            raise GroupCommitQueueFull('Submission queue is full')
+        return future
+
+    def _collect(self):
+        """
+        Block for the first item, then gather more until the batch is full or
+        the delay has passed. Items whose request already gave up (cancelled
+        futures) are dropped; the rest can no longer be cancelled.
+        """
+        try:
+            first = self.queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = []
+        deadline = time.monotonic() + self.max_delay
+        item = first
+        while True:
+            if item[1].set_running_or_notify_cancel():
+                batch.append(item)
+            if len(batch) >= self.max_batch:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit_batch(self, batch):
+        started = time.perf_counter()
+        submitted_at = datetime.utcnow()
+        try:
+            session_ids = [write_submission(submission, submitted_at) for submission, _ in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Group commit of {len(batch)} submissions failed ({e}); retrying individually")
+            self.fallbacks += 1
+            for submission, future in batch:
+                try:
+                    future.set_result(save_submission(submission))
+                except Exception as item_error:
+                    future.set_exception(item_error)
+            return
+
+        self.batches += 1
+        self.committed += len(batch)
+        self.commit_seconds += time.perf_counter() - started
+        for (submission, future), session_id in zip(batch, session_ids):
+            remember_answer_map(session_id, submitted_at, submission.answers)
+            future.set_result(session_id)
+
+    def run(self):
+        while not self.stop_event.is_set() or not self.queue.empty():
+            batch = self._collect()
+            if not batch:
+                continue
+            with self.app.app_context():
+                try:
+                    self._commit_batch(batch)
+                except Exception as e:
+                    logger.error(f"Group commit writer error: {e}")
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                finally:
+                    db.session.remove()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'committed': self.committed,
+            'avg_batch_size': round(self.committed / self.batches, 2) if self.batches else 0,
+            'avg_batch_ms': round(self.commit_seconds * 1000 / self.batches, 2) if self.batches else 0,
+            'fallbacks': self.fallbacks,
+            'queued': self.queue.qsize()
+        }
+
+
+def get_group_commit_writer(app):
+    """Return the process-wide writer thread, starting it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            config = app.config
+            _writer = GroupCommitWriter(
+                app,
+                max_batch=config.get('SUBMISSION_GROUP_COMMIT_MAX_BATCH', DEFAULT_MAX_BATCH),
+                max_delay_ms=config.get('SUBMISSION_GROUP_COMMIT_MAX_DELAY_MS', DEFAULT_MAX_DELAY_MS),
+                queue_size=config.get('SUBMISSION_GROUP_COMMIT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+            )
+            _writer.start()
+            logger.info("Submission group-commit writer started.")
+        return _writer
+
+
+def commit_via_group(app, submission, timeout=RESULT_TIMEOUT_SECONDS):
+    """
+    Queue a submission for the next group commit and wait until it is durable.
+
+    Raises:
+        GroupCommitQueueFull, TimeoutError: the submission was not stored
+        SubmissionInFlight: the writer is still committing it
+    """
+    future = get_group_commit_writer(app).submit(submission)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        if future.cancel():
+            logger.warning("Group commit timed out; submission withdrawn from the queue")
+            raise
+    # The writer already took it, so it will be committed or fail on its own
+    try:
+        return future.result(timeout=IN_FLIGHT_TIMEOUT_SECONDS)
+    except FutureTimeout:
+        raise SubmissionInFlight(future)
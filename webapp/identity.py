@@ -0,0 +1,102 @@
+# webapp/identity.py
+"""
+Typed session identity.
+
+Flask-Login stores whatever `get_id()` returns in the session. Students and
+staff/admin accounts live in different tables, so their IDs carry the kind
+as a prefix ("student:<uuid>" / "user:<uuid>") and the loader queries exactly
+one table. Sessions created before the prefix existed hold a bare UUID and
+fall back to trying both tables.
+
+The loaded account is cached on `g` for the rest of the request, so the
+Flask-Login loader, the custom login_required/admin_required decorators and
+the views all share a single lookup.
+"""
+import logging
+import uuid
+
+from flask import g, session
+
+from .models import Student, User
+
+logger = logging.getLogger(__name__)
+
+STUDENT_KIND = 'student'
+USER_KIND = 'user'
+
+_MODELS = {STUDENT_KIND: Student, USER_KIND: User}
+_UNSET = object()
+
+
+def make_identity(kind, account_id):
+    """Session identity string for an account, e.g. "student:<uuid>"."""
+    return f'{kind}:{account_id}'
+
+
+def parse_identity(identity):
+    """
+    Split a session identity into (kind, UUID).
+
+    Legacy bare UUIDs return kind None. Raises ValueError for malformed values.
+    """
+    identity = str(identity)
+    kind, sep, raw_id = identity.partition(':')
+    if not sep:
+        return None, uuid.UUID(identity)
+    if kind not in _MODELS:
+        raise ValueError(f'Unknown identity kind: {kind}')
+    return kind, uuid.UUID(raw_id)
+
+
+def session_identity_kind():
+    """Kind of the logged-in account from the session alone (no database access), or None."""
+    identity = session.get('_user_id')
+    if identity:
+        try:
+            kind, _ = parse_identity(identity)
+        except ValueError:
+            return None
+        if kind:
+            return kind
+
+    # Legacy sessions: fall back to the role stored at login
+    role = session.get('user_role')
+    if role == 'student':
+        return STUDENT_KIND
+    if role == 'staff':
+        return USER_KIND
+    return None
+
+
+def load_identity(identity):
+    """
+    Load the account for a session identity, querying exactly one table for typed IDs.
+    The result (including a miss) is cached on `g` for the current request.
+    """
+    cached = g.get('_identity_account', _UNSET)
+    if cached is not _UNSET and g.get('_identity_key') == identity:
+        return cached
+
+    try:
+        kind, account_id = parse_identity(identity)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Invalid identity in session: {identity}, Error: {e}")
+        return None
+
+    if kind:
+        account = _MODELS[kind].query.get(account_id)
+    else:
+        # Legacy bare UUID: try Student first, then User
+        account = Student.query.get(account_id) or User.query.get(account_id)
+
+    g._identity_key = identity
+    g._identity_account = account
+    return account
+
+
+def current_account():
+    """The logged-in Student or User for this request (cached), or None."""
+    identity = session.get('_user_id')
+    if not identity:
+        return None
+    return load_identity(identity)
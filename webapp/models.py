@@ -4,8 +4,23 @@ import uuid
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import String, Integer, Boolean, DateTime, Text, Numeric, JSON, BigInteger
 from sqlalchemy.schema import UniqueConstraint
+from sqlalchemy.ext.compiler import compiles
 from flask_login import UserMixin # <--- NEW IMPORT
 
+
+# --- SQLITE COMPATIBILITY (local fallback database and load tests) ---
+
+@compiles(UUID, 'sqlite')
+def _compile_uuid_sqlite(type_, compiler, **kw):
+    # UUIDs are stored as their 36-character string form
+    return 'CHAR(36)'
+
+@compiles(BigInteger, 'sqlite')
+def _compile_biginteger_sqlite(type_, compiler, **kw):
+    # SQLite only auto-increments INTEGER PRIMARY KEY columns
+    return 'INTEGER'
+
+
 # Unified User model for staff/admin login
 class User(db.Model, UserMixin): # <--- MODIFIED: Inherit UserMixin
     """
@@ -22,6 +37,10 @@ class User(db.Model, UserMixin): # <--- MODIFIED: Inherit UserMixin
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    def get_id(self):
+        # Typed identity so the login loader only queries the users table
+        return f'user:{self.id}'
+
     def __repr__(self):
         return f'<User {self.email} ({self.role})>'
 
@@ -57,6 +76,10 @@ class Student(db.Model, UserMixin): # <--- MODIFIED: Inherit UserMixin
     # Relationships: Now links to SurveySession
     sessions = db.relationship('SurveySession', backref='student', lazy='dynamic')
     
+    def get_id(self):
+        # Typed identity so the login loader only queries the students table
+        return f'student:{self.id}'
+
     def __repr__(self):
         return f'<Student {self.student_id} ({self.full_name})>'
 
@@ -206,6 +229,9 @@ class SurveySession(db.Model):
     # Relationships
     answers = db.relationship('Answer', backref='session', lazy='dynamic')
     result = db.relationship('SurveyResult', backref='session', uselist=False, lazy='joined') 
+
+    # One session per student per survey; resubmissions upsert on this key
+    __table_args__ = (UniqueConstraint('student_uuid', 'survey_id', name='_student_survey_uc'),)
     
     def __repr__(self):
         return f'<Session {self.session_id} by {self.student_uuid}>'
@@ -237,6 +263,29 @@ class Answer(db.Model):
         return f'<Answer {self.answer_id} for Session {self.session_id}>'
 
 
+class ScoreCell(db.Model):
+    """
+    One staff member's score for one question in one submission (maps to score_cells table).
+    Normalized copy of the "score|teacher;score|teacher" answers, indexed by staff
+    so per-staff reports read only that staff member's cells.
+    """
+    __tablename__ = 'score_cells'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    # Cells go with their submission or question (explicit deletes still run, for SQLite)
+    session_id = db.Column(db.Integer, db.ForeignKey('survey_sessions.session_id', ondelete='CASCADE'),
+                           nullable=False, index=True)
+    staff_id = db.Column(UUID(as_uuid=True), nullable=False)
+    question_id = db.Column(UUID(as_uuid=True), db.ForeignKey('question.id', ondelete='CASCADE'), nullable=False)
+    survey_id = db.Column(UUID(as_uuid=True), db.ForeignKey('surveys.id'), nullable=True)
+    score = db.Column(db.SmallInteger, nullable=False)
+
+    __table_args__ = (db.Index('ix_score_cells_staff_question', 'staff_id', 'question_id'),)
+
+    def __repr__(self):
+        return f'<ScoreCell {self.score} for {self.staff_id} (Session {self.session_id})>'
+
+
 class SurveyResult(db.Model):
     """
     Stores the final, processed, and calculated results (maps to survey_results table).
@@ -303,4 +352,141 @@ class StudentComment(db.Model):
     teacher = db.relationship('Teacher', backref='student_comments')
     
     def __repr__(self):
-        return f'<StudentComment {self.id} for Teacher {self.teacher_id}>'
\ No newline at end of file
+        return f'<StudentComment {self.id} for Teacher {self.teacher_id}>'
+
+
+class EmailOutbox(db.Model):
+    """
+    Durable queue of outgoing emails (maps to email_outbox table).
+    Request handlers only insert rows here; the outbox dispatcher drains them
+    in batches, so a crashed or timed-out run can resume where it stopped.
+    """
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(36), nullable=False, index=True)  # One reminder run
+    kind = db.Column(db.String(50), nullable=False, default='reminder')
+
+    recipient_email = db.Column(db.String(150), nullable=False)
+    recipient_name = db.Column(db.String(150))
+    payload = db.Column(db.JSON)  # Template data (program, section, student uuid, ...)
+
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    # The dispatcher always looks rows up by status and due time
+    __table_args__ = (db.Index('ix_email_outbox_status_due', 'status', 'next_attempt_at'),)
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} to {self.recipient_email} ({self.status})>'
+
+
+class ReminderLog(db.Model):
+    """
+    Records each reminder delivered to a student (maps to reminder_logs table).
+    Written by the outbox dispatcher when the email is sent; used to skip
+    students reminded within the configured cool-down window.
+    """
+    __tablename__ = 'reminder_logs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_uuid = db.Column(UUID(as_uuid=True), db.ForeignKey('students.id'), nullable=False)
+    survey_id = db.Column(UUID(as_uuid=True), db.ForeignKey('surveys.id'), nullable=True)
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Covers the cool-down lookup done inside the reminder targeting query
+    __table_args__ = (db.Index('ix_reminder_log_student_survey_sent', 'student_uuid', 'survey_id', 'sent_at'),)
+
+    def __repr__(self):
+        return f'<ReminderLog {self.student_uuid} at {self.sent_at}>'
+
+class PublishedRanking(db.Model):
+    """
+    One entry of an immutable published ranking snapshot (maps to published_rankings table).
+    Every post of the rankings writes a new snapshot; students see the latest one.
+    """
+    __tablename__ = 'published_rankings'
+
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_id = db.Column(db.String(36), nullable=False, index=True)  # Groups the entries of one post
+    staff_type = db.Column(db.String(50), nullable=False, default='teaching')  # 'teaching' or 'non_teaching'
+
+    rank = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(150), nullable=False)
+    department = db.Column(db.String(100))
+    score = db.Column(db.Float)
+    published_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Latest snapshot per staff type
+    __table_args__ = (db.Index('ix_published_rankings_type_published', 'staff_type', 'published_at'),)
+
+    def __repr__(self):
+        return f'<PublishedRanking #{self.rank} {self.name} ({self.snapshot_id})>'
+
+
+class AppState(db.Model):
+    """
+    Named counters and markers shared by every worker (maps to app_state table),
+    e.g. that the score index backfill has completed.
+    """
+    __tablename__ = 'app_state'
+
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<AppState {self.key}={self.value}>'
+
+
+class RateLimitBucket(db.Model):
+    """
+    Shared token-bucket state for the login rate limiter (maps to rate_limit_buckets table).
+    Only used when LOGIN_RATE_LIMIT_BACKEND is 'database'.
+    """
+    __tablename__ = 'rate_limit_buckets'
+
+    key = db.Column(db.String(255), primary_key=True)  # e.g. "ip:10.0.0.1" or "login:2023-00123"
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # Unix timestamp of the last refill
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}: {self.tokens:.2f}>'
+
+
+class ServerSession(db.Model):
+    """
+    Server-side session data (maps to server_sessions table).
+    The cookie only carries session_id; data is the serialized session dict.
+    """
+    __tablename__ = 'server_sessions'
+
+    session_id = db.Column(db.String(128), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ServerSession {self.session_id[:8]}... expires {self.expires_at}>'
+
+
+class PasswordResetOTP(db.Model):
+    """
+    Pending password-reset verification code (maps to password_reset_otps table).
+    One row per email; only a keyed digest of the code is stored.
+    """
+    __tablename__ = 'password_reset_otps'
+
+    email = db.Column(db.String(120), primary_key=True)
+    code_digest = db.Column(db.String(64), nullable=False)
+    user_type = db.Column(db.String(20), nullable=False)  # 'staff' or 'student'
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<PasswordResetOTP {self.email} expires {self.expires_at}>'
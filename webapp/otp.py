@@ -0,0 +1,127 @@
+# webapp/otp.py
+"""
+Password-reset verification codes.
+
+Codes are kept in the password_reset_otps table (one row per email, with an
+expiry timestamp) instead of the session, so a reset started on one worker
+can be finished on another and nothing about it travels in the cookie.
+Only an HMAC of email and code is stored; checks compare digests in
+constant time.
+
+Every check reads the row by primary key, so a code that was re-issued or
+used on another worker is never accepted from a stale copy. A failed check
+counts the attempt on that row, and the code is invalidated after
+PASSWORD_RESET_OTP_MAX_ATTEMPTS failures. Expired rows are swept every
+OTP_SWEEP_INTERVAL_SECONDS per worker, or with `flask sweep-otps`.
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .models import db, PasswordResetOTP
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 5
+OTP_SWEEP_INTERVAL_SECONDS = 300
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def _digest(email, code):
+    key = current_app.secret_key
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    return hmac.new(key, f'{email}:{code}'.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def issue_otp(email, user_type, ttl_seconds=None):
+    """
+    Create (or replace) the reset code for an email and commit it.
+
+    Returns:
+        str: the six-digit code
+    """
+    ttl_seconds = ttl_seconds or current_app.config.get('PASSWORD_RESET_OTP_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+    code = f'{secrets.randbelow(1000000):06d}'
+    now = datetime.utcnow()
+
+    db.session.merge(PasswordResetOTP(
+        email=email,
+        code_digest=_digest(email, code),
+        user_type=user_type,
+        attempts=0,
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl_seconds)
+    ))
+    db.session.commit()
+    _maybe_sweep()
+    return code
+
+
+def verify_otp(email, code):
+    """
+    Check a reset code against its database row.
+
+    Returns:
+        str: the user_type the code was issued for, or None if it is wrong or expired
+    """
+    if not code:
+        return None
+    row = PasswordResetOTP.query.get(email)
+    if row is None or row.expires_at <= datetime.utcnow():
+        return None
+    if hmac.compare_digest(row.code_digest, _digest(email, str(code).strip())):
+        return row.user_type
+
+    max_attempts = current_app.config.get('PASSWORD_RESET_OTP_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    try:
+        row.attempts += 1
+        if row.attempts >= max_attempts:
+            db.session.delete(row)
+            logger.warning(f"Password reset code for {email} invalidated after {row.attempts} failed attempts")
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recording failed reset code attempt: {e}")
+    return None
+
+
+def consume_otp(email):
+    """Stage deletion of an email's reset code after a successful reset. The caller commits."""
+    PasswordResetOTP.query.filter(PasswordResetOTP.email == email).delete(synchronize_session=False)
+
+
+def sweep_expired_otps():
+    """Delete expired reset codes and commit. Returns the number removed."""
+    removed = PasswordResetOTP.query.filter(
+        PasswordResetOTP.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def _maybe_sweep():
+    global _last_sweep
+    if time.monotonic() - _last_sweep < OTP_SWEEP_INTERVAL_SECONDS:
+        return
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    try:
+        _last_sweep = time.monotonic()
+        removed = sweep_expired_otps()
+        if removed:
+            logger.info(f"Swept {removed} expired password reset codes")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error sweeping expired password reset codes: {e}")
+    finally:
+        _sweep_lock.release()
@@ -0,0 +1,312 @@
+# webapp/outbox.py
+"""
+Durable email outbox.
+
+Routes call `enqueue_reminders()` and return immediately; the rows are drained
+by a dispatcher, either a background thread inside the web worker or a
+separate `flask dispatch-outbox` process. Failed sends are retried with
+exponential backoff and rows left in 'sending' by a crashed dispatcher are
+reclaimed after a lease timeout.
+
+With OUTBOX_DISPATCHER='thread' each worker starts its dispatcher from
+create_app, so rows left 'pending' (or leased by a dead dispatcher) when a
+worker crashed or restarted are retried without waiting for the next
+reminder run.
+
+A delivered reminder is logged in reminder_logs in the same commit that
+marks its row sent, which is what starts the student's reminder cool-down.
+"""
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, and_
+
+from .models import db, EmailOutbox, ReminderLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 30
+DEFAULT_POLL_SECONDS = 5
+INSERT_CHUNK_SIZE = 500
+# Rows stuck in 'sending' longer than this are considered abandoned
+LEASE_SECONDS = 300
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def enqueue_reminders(students, batch_id=None):
+    """
+    Bulk-insert one reminder row per student into the outbox.
+
+    `students` is an iterable of dicts with at least 'email' and 'full_name'
+    (plus optional 'program', 'section', 'student_uuid' and 'survey_id').
+    The caller owns the transaction and must commit.
+
+    Returns:
+        tuple: (batch_id, number of rows queued)
+    """
+    batch_id = batch_id or str(uuid.uuid4())
+    now = datetime.utcnow()
+    rows = []
+    queued = 0
+    for student in students:
+        rows.append({
+            'batch_id': batch_id,
+            'kind': 'reminder',
+            'recipient_email': student['email'],
+            'recipient_name': student['full_name'],
+            'payload': {
+                'program': student.get('program'),
+                'section': student.get('section'),
+                'student_uuid': str(student['student_uuid']) if student.get('student_uuid') else None,
+                'survey_id': str(student['survey_id']) if student.get('survey_id') else None
+            },
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now
+        })
+
+        # Insert in chunks so a streamed recipient list is never held in memory at once
+        if len(rows) >= INSERT_CHUNK_SIZE:
+            db.session.bulk_insert_mappings(EmailOutbox, rows)
+            queued += len(rows)
+            rows = []
+
+    if rows:
+        db.session.bulk_insert_mappings(EmailOutbox, rows)
+        queued += len(rows)
+    return batch_id, queued
+
+
+def claim_batch(limit=DEFAULT_BATCH_SIZE):
+    """
+    Lock up to `limit` due rows for sending and commit the claim.
+
+    Each row is claimed with a conditional UPDATE that only matches while
+    the row still has the status and attempt count it was read with, so
+    when several dispatchers (one per gunicorn worker) read the same rows,
+    exactly one of them gets each row. On PostgreSQL, SKIP LOCKED also keeps
+    them from reading the same rows in the first place.
+
+    Returns plain dicts so the rows can be used outside the session.
+    """
+    now = datetime.utcnow()
+    lease_expired = now - timedelta(seconds=LEASE_SECONDS)
+
+    query = db.session.query(
+        EmailOutbox.id, EmailOutbox.kind, EmailOutbox.recipient_email, EmailOutbox.recipient_name,
+        EmailOutbox.payload, EmailOutbox.status, EmailOutbox.attempts
+    ).filter(or_(
+        and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.locked_at <= lease_expired)
+    )).order_by(EmailOutbox.id).limit(limit)
+
+    if db.engine.dialect.name == 'postgresql':
+        query = query.with_for_update(skip_locked=True)
+
+    claimed = []
+    for row in query.all():
+        attempts = row.attempts or 0
+        updated = EmailOutbox.query.filter(
+            EmailOutbox.id == row.id,
+            EmailOutbox.status == row.status,
+            EmailOutbox.attempts == row.attempts
+        ).update({'status': 'sending', 'locked_at': now, 'attempts': attempts + 1}, synchronize_session=False)
+        if updated != 1:
+            # Another dispatcher claimed it first
+            continue
+        claimed.append({
+            'id': row.id,
+            'kind': row.kind,
+            'email': row.recipient_email,
+            'full_name': row.recipient_name,
+            'payload': row.payload or {},
+            'attempts': attempts + 1
+        })
+    db.session.commit()
+    return claimed
+
+
+def _record_result(row, success, error, outcome, max_attempts, backoff_seconds):
+    """Mark one claimed row as sent, failed, or due for a retry with backoff."""
+    outbox_row = EmailOutbox.query.get(row['id'])
+    if not outbox_row:
+        return
+
+    if success:
+        outbox_row.status = 'sent'
+        outbox_row.sent_at = datetime.utcnow()
+        outbox_row.last_error = None
+        _log_delivered_reminder(outbox_row)
+        outcome['sent'] += 1
+    elif row['attempts'] >= max_attempts:
+        outbox_row.status = 'failed'
+        outbox_row.last_error = error
+        outcome['failed'] += 1
+        logger.error(f"Outbox row {row['id']} to {row['email']} failed permanently: {error}")
+    else:
+        delay = backoff_seconds * (2 ** (row['attempts'] - 1))
+        outbox_row.status = 'pending'
+        outbox_row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        outbox_row.last_error = error
+        outcome['retry'] += 1
+        logger.warning(f"Outbox row {row['id']} to {row['email']} will retry in {delay}s: {error}")
+
+    # Commit per row so a crash mid-batch never re-sends a delivered email.
+    db.session.commit()
+
+
+def _log_delivered_reminder(outbox_row):
+    """Add the reminder_logs row for a delivered reminder (committed with the row's status)."""
+    payload = outbox_row.payload or {}
+    if outbox_row.kind != 'reminder' or not payload.get('student_uuid'):
+        return
+    survey_id = payload.get('survey_id')
+    db.session.add(ReminderLog(
+        student_uuid=uuid.UUID(payload['student_uuid']),
+        survey_id=uuid.UUID(survey_id) if survey_id else None,
+        sent_at=outbox_row.sent_at
+    ))
+
+
+def dispatch_once(batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                  backoff_seconds=DEFAULT_BACKOFF_SECONDS):
+    """
+    Claim and send one batch over a single SMTP connection. Must run inside an app context.
+
+    Returns:
+        dict: counts of 'sent', 'retry' and 'failed' rows in this batch
+    """
+    from .email_service import send_reminder_batch, ReminderRow
+
+    rows = claim_batch(batch_size)
+    outcome = {'sent': 0, 'retry': 0, 'failed': 0}
+    if not rows:
+        return outcome
+
+    reminder_rows = [
+        ReminderRow(row['email'], row['full_name'], row['payload'].get('program'), row['payload'].get('section'))
+        for row in rows
+    ]
+
+    handled = 0
+    batch_error = 'Not attempted: SMTP connection closed'
+    try:
+        for _, success, error in send_reminder_batch(reminder_rows):
+            _record_result(rows[handled], success, error, outcome, max_attempts, backoff_seconds)
+            handled += 1
+    except Exception as e:
+        batch_error = str(e)
+        logger.error(f"Outbox batch aborted after {handled} of {len(rows)} rows: {e}")
+
+    # Rows never reached (connection failure) go back to the queue
+    for row in rows[handled:]:
+        _record_result(row, False, batch_error, outcome, max_attempts, backoff_seconds)
+
+    return outcome
+
+
+def outbox_stats(batch_id=None):
+    """Return row counts per status, optionally limited to one reminder run."""
+    query = db.session.query(EmailOutbox.status, func.count(EmailOutbox.id))
+    if batch_id:
+        query = query.filter(EmailOutbox.batch_id == batch_id)
+
+    counts = {'pending': 0, 'sending': 0, 'sent': 0, 'failed': 0}
+    for status, count in query.group_by(EmailOutbox.status).all():
+        counts[status] = count
+
+    total = sum(counts.values())
+    done = counts['sent'] + counts['failed']
+    return {
+        'batch_id': batch_id,
+        'counts': counts,
+        'total': total,
+        'progress': int((done / total) * 100) if total > 0 else 100
+    }
+
+
+class OutboxDispatcher(threading.Thread):
+    """Background thread that keeps draining the outbox while the app runs."""
+
+    def __init__(self, app):
+        super().__init__(name='outbox-dispatcher', daemon=True)
+        self.app = app
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        config = self.app.config
+        poll_seconds = config.get('OUTBOX_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+
+        while not self.stop_event.is_set():
+            outcome = None
+            with self.app.app_context():
+                try:
+                    outcome = dispatch_once(
+                        batch_size=config.get('OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                        max_attempts=config.get('OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+                        backoff_seconds=config.get('OUTBOX_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS)
+                    )
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Outbox dispatcher error: {e}")
+                finally:
+                    db.session.remove()
+
+            # Keep going while there is work; otherwise sleep until woken or polled.
+            if outcome and any(outcome.values()):
+                continue
+            self.wake_event.wait(poll_seconds)
+            self.wake_event.clear()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+
+def start_outbox_dispatcher(app):
+    """Start the in-process dispatcher thread once per process."""
+    global _dispatcher
+    if app.config.get('OUTBOX_DISPATCHER', 'thread') != 'thread':
+        return None
+
+    with _dispatcher_lock:
+        if _dispatcher is None or not _dispatcher.is_alive():
+            _dispatcher = OutboxDispatcher(app)
+            _dispatcher.start()
+            logger.info("Outbox dispatcher thread started.")
+        return _dispatcher
+
+
+def _in_reloader_parent():
+    """
+    True in processes that will not serve requests: the parent of the Werkzeug
+    reloader (debug runners, `flask run`) and other `flask` CLI commands.
+    The reloader's serving child is marked with WERKZEUG_RUN_MAIN.
+    """
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        return False
+    return (os.environ.get('FLASK_RUN_FROM_CLI') == 'true'
+            or os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes'))
+
+
+def autostart_outbox_dispatcher(app):
+    """Start the dispatcher thread at app creation, except in processes that serve no requests."""
+    if _in_reloader_parent():
+        return None
+    return start_outbox_dispatcher(app)
+
+
+def wake_outbox_dispatcher(app):
+    """Make sure a dispatcher is running and nudge it to drain new rows now."""
+    dispatcher = start_outbox_dispatcher(app)
+    if dispatcher:
+        dispatcher.wake_event.set()
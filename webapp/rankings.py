@@ -0,0 +1,78 @@
+# webapp/rankings.py
+"""
+Published ranking snapshots.
+
+Posting the rankings writes an immutable snapshot to the published_rankings
+table, so every worker process (and every restart) shows the same list.
+The latest snapshot ID per staff type is part of the cached survey state;
+snapshot contents never change, so they are cached per process by ID
+without any invalidation.
+"""
+import logging
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from .cache import TTLCache
+from .models import db, PublishedRanking
+
+logger = logging.getLogger(__name__)
+
+RankingEntry = namedtuple('RankingEntry', ['rank', 'name', 'department', 'score', 'published_at'])
+
+# Snapshots are immutable: no TTL, only a bound on how many are kept in memory
+_snapshots = TTLCache(ttl=0, max_entries=16)
+
+
+def publish_ranking_snapshot(rankings, staff_type='teaching'):
+    """
+    Stage a new snapshot from a list of {'rank', 'name', 'department', 'score'} dicts.
+    The caller commits.
+
+    Returns:
+        str: the new snapshot_id
+    """
+    snapshot_id = str(uuid.uuid4())
+    published_at = datetime.utcnow()
+    db.session.bulk_insert_mappings(PublishedRanking, [
+        {
+            'snapshot_id': snapshot_id,
+            'staff_type': staff_type,
+            'rank': entry['rank'],
+            'name': entry['name'],
+            'department': entry.get('department'),
+            'score': entry.get('score'),
+            'published_at': published_at
+        }
+        for entry in rankings
+    ])
+    logger.info(f"Staged {staff_type} ranking snapshot {snapshot_id} with {len(rankings)} entries")
+    return snapshot_id
+
+
+def latest_snapshot_id(staff_type='teaching'):
+    """Return the ID of the most recently published snapshot for a staff type, or None."""
+    row = db.session.query(PublishedRanking.snapshot_id).filter(
+        PublishedRanking.staff_type == staff_type
+    ).order_by(
+        PublishedRanking.published_at.desc(), PublishedRanking.id.desc()
+    ).first()
+    return row.snapshot_id if row else None
+
+
+def get_snapshot(snapshot_id):
+    """Return the entries of a snapshot as a tuple of RankingEntry, ordered by rank."""
+    if not snapshot_id:
+        return ()
+
+    entries = _snapshots.get(snapshot_id)
+    if entries is None:
+        rows = db.session.query(
+            PublishedRanking.rank, PublishedRanking.name, PublishedRanking.department,
+            PublishedRanking.score, PublishedRanking.published_at
+        ).filter(
+            PublishedRanking.snapshot_id == snapshot_id
+        ).order_by(PublishedRanking.rank)
+        entries = tuple(RankingEntry(*row) for row in rows)
+        _snapshots.set(snapshot_id, entries)
+    return entries
@@ -0,0 +1,259 @@
+# webapp/ratelimit.py
+"""
+Login throttling.
+
+Every login attempt costs a PBKDF2 hash (and, for unknown student IDs, a scan
+of the students CSV). Attempts are therefore metered by two token buckets
+before any of that work happens: one per client IP and one per login ID.
+Each attempt takes a token from both; buckets refill continuously at their
+per-minute rate up to their burst size. An attempt that finds either bucket
+empty is shed with a retry-after hint.
+
+Buckets live in process memory by default. With LOGIN_RATE_LIMIT_BACKEND set
+to 'database' they are kept in the rate_limit_buckets table instead, so all
+worker processes share one budget. LOGIN_RATE_LIMIT_BACKEND='off' disables
+throttling.
+
+The IP is `request.remote_addr`. Behind a reverse proxy, set
+TRUSTED_PROXY_COUNT so ProxyFix takes it from X-Forwarded-For; the header
+is never read otherwise, because clients can set it to anything.
+"""
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+# A whole classroom can share one NAT address, so the IP bucket is generous;
+# the per-ID bucket is what stops password guessing against one account.
+DEFAULT_IP_BURST = 60
+DEFAULT_IP_PER_MINUTE = 60
+DEFAULT_ID_BURST = 5
+DEFAULT_ID_PER_MINUTE = 5
+# Memory backend: prune refilled buckets once this many keys are tracked
+MAX_MEMORY_KEYS = 50000
+
+BucketRule = namedtuple('BucketRule', ['burst', 'per_minute'])
+ThrottleDecision = namedtuple('ThrottleDecision', ['allowed', 'retry_after', 'reason'])
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def _refill(tokens, updated_at, now, rule):
+    """Tokens in a bucket at `now`, given its level at `updated_at`."""
+    elapsed = max(0.0, now - updated_at)
+    return min(float(rule.burst), tokens + elapsed * rule.per_minute / 60.0)
+
+
+def _retry_after(tokens, rule):
+    """Seconds until a bucket holding `tokens` has a whole token again."""
+    if rule.per_minute <= 0:
+        return 60
+    return max(1, math.ceil((1.0 - tokens) * 60.0 / rule.per_minute))
+
+
+class MemoryBucketStore:
+    """Per-process bucket state."""
+
+    def __init__(self, max_keys=MAX_MEMORY_KEYS):
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at, rule)
+        self._lock = threading.Lock()
+
+    def take(self, requests, now):
+        """
+        Atomically take one token from every (key, rule) in `requests`.
+        Nothing is taken unless all buckets have a token.
+
+        Returns:
+            tuple: (allowed, [(key, tokens available before this attempt), ...])
+        """
+        with self._lock:
+            levels = []
+            for key, rule in requests:
+                state = self._buckets.get(key)
+                tokens = _refill(state[0], state[1], now, rule) if state else float(rule.burst)
+                levels.append(tokens)
+
+            allowed = all(tokens >= 1.0 for tokens in levels)
+            for (key, rule), tokens in zip(requests, levels):
+                self._buckets[key] = (tokens - 1.0 if allowed else tokens, now, rule)
+
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return allowed, list(zip((key for key, _ in requests), levels))
+
+    def _prune(self, now):
+        # A bucket that has refilled completely is equivalent to no bucket at all
+        full = [key for key, (tokens, updated_at, rule) in self._buckets.items()
+                if _refill(tokens, updated_at, now, rule) >= rule.burst]
+        for key in full:
+            del self._buckets[key]
+        logger.debug(f"Pruned {len(full)} refilled login throttle buckets")
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseBucketStore:
+    """
+    Bucket state shared by all workers through the rate_limit_buckets table.
+    Uses its own short transaction so the request's session is never touched.
+    """
+
+    def take(self, requests, now):
+        table = RateLimitBucket.__table__
+        with db.engine.begin() as conn:
+            levels = []
+            existing = set()
+            for key, rule in requests:
+                row = conn.execute(
+                    select(table.c.tokens, table.c.updated_at).where(table.c.key == key).with_for_update()
+                ).first()
+                if row:
+                    existing.add(key)
+                    levels.append(_refill(row.tokens, row.updated_at, now, rule))
+                else:
+                    levels.append(float(rule.burst))
+
+            allowed = all(tokens >= 1.0 for tokens in levels)
+            for (key, rule), tokens in zip(requests, levels):
+                values = {'tokens': tokens - 1.0 if allowed else tokens, 'updated_at': now}
+                if key in existing:
+                    conn.execute(table.update().where(table.c.key == key).values(**values))
+                else:
+                    try:
+                        with conn.begin_nested():
+                            conn.execute(table.insert().values(key=key, **values))
+                    except IntegrityError:
+                        # Another worker created the bucket first; its level is close enough
+                        pass
+            return allowed, list(zip((key for key, _ in requests), levels))
+
+    def sweep(self, now=None, rules=()):
+        """Delete buckets idle long enough to have refilled completely."""
+        now = now or time.time()
+        slowest = min((rule.per_minute / max(rule.burst, 1) for rule in rules), default=1.0)
+        idle_seconds = 60.0 / slowest if slowest > 0 else 3600
+        table = RateLimitBucket.__table__
+        with db.engine.begin() as conn:
+            result = conn.execute(table.delete().where(table.c.updated_at < now - idle_seconds))
+        return result.rowcount
+
+    def clear(self):
+        with db.engine.begin() as conn:
+            conn.execute(RateLimitBucket.__table__.delete())
+
+
+class LoginThrottle:
+    """Per-IP and per-login-ID token buckets with shed counters."""
+
+    def __init__(self, store, ip_rule, id_rule):
+        self.store = store
+        self.ip_rule = ip_rule
+        self.id_rule = id_rule
+        self._stats_lock = threading.Lock()
+        self.allowed = 0
+        self.shed_ip = 0
+        self.shed_login_id = 0
+        self.errors = 0
+        self.last_shed_at = None
+
+    def check(self, ip, login_id):
+        """
+        Take one login attempt from the IP and login ID buckets.
+
+        Returns:
+            ThrottleDecision: allowed, retry_after seconds and the bucket that shed ('ip' / 'login_id')
+        """
+        requests = []
+        if ip:
+            requests.append((f'ip:{ip}', self.ip_rule))
+        login_key = (login_id or '').strip().lower()
+        if login_key:
+            requests.append((f'login:{login_key[:200]}', self.id_rule))
+        if not requests:
+            return ThrottleDecision(True, 0, None)
+
+        try:
+            allowed, levels = self.store.take(requests, time.time())
+        except Exception as e:
+            # Fail open: a broken throttle store must not lock everyone out
+            logger.error(f"Login throttle check failed: {e}")
+            with self._stats_lock:
+                self.errors += 1
+            return ThrottleDecision(True, 0, None)
+
+        if allowed:
+            with self._stats_lock:
+                self.allowed += 1
+            return ThrottleDecision(True, 0, None)
+
+        rules = dict(requests)
+        empty = [(key, tokens) for key, tokens in levels if tokens < 1.0]
+        retry_after = max(_retry_after(tokens, rules[key]) for key, tokens in empty)
+        reason = 'ip' if empty[0][0].startswith('ip:') else 'login_id'
+        with self._stats_lock:
+            if reason == 'ip':
+                self.shed_ip += 1
+            else:
+                self.shed_login_id += 1
+            self.last_shed_at = time.time()
+        logger.warning(f"Login attempt shed by {reason} bucket ({empty[0][0]}), retry in {retry_after}s")
+        return ThrottleDecision(False, retry_after, reason)
+
+    def stats(self):
+        with self._stats_lock:
+            shed = self.shed_ip + self.shed_login_id
+            return {
+                'backend': 'database' if isinstance(self.store, DatabaseBucketStore) else 'memory',
+                'allowed': self.allowed,
+                'shed': shed,
+                'shed_ip': self.shed_ip,
+                'shed_login_id': self.shed_login_id,
+                'shed_ratio': round(shed / (shed + self.allowed), 4) if shed + self.allowed else 0.0,
+                'errors': self.errors,
+                'last_shed_at': self.last_shed_at,
+                'ip_rule': self.ip_rule._asdict(),
+                'login_id_rule': self.id_rule._asdict()
+            }
+
+
+def get_login_throttle(app):
+    """Return the process-wide LoginThrottle configured from `app`, or None when disabled."""
+    global _limiter
+    config = app.config
+    backend = config.get('LOGIN_RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'off':
+        return None
+
+    with _limiter_lock:
+        if _limiter is None:
+            store = DatabaseBucketStore() if backend == 'database' else MemoryBucketStore()
+            _limiter = LoginThrottle(
+                store,
+                ip_rule=BucketRule(config.get('LOGIN_RATE_IP_BURST', DEFAULT_IP_BURST),
+                                   config.get('LOGIN_RATE_IP_PER_MINUTE', DEFAULT_IP_PER_MINUTE)),
+                id_rule=BucketRule(config.get('LOGIN_RATE_ID_BURST', DEFAULT_ID_BURST),
+                                   config.get('LOGIN_RATE_ID_PER_MINUTE', DEFAULT_ID_PER_MINUTE))
+            )
+            logger.info(f"Login throttle enabled ({backend} backend).")
+        return _limiter
+
+
+def reset_login_throttle():
+    """Drop the process-wide throttle (and its memory buckets) so it is rebuilt from config."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is not None and isinstance(_limiter.store, MemoryBucketStore):
+            _limiter.store.clear()
+        _limiter = None
@@ -0,0 +1,104 @@
+# webapp/reminders.py
+"""
+Reminder targeting.
+
+Pending students are selected with a single anti-join (NOT EXISTS on
+survey_sessions, plus NOT EXISTS on recent reminder_logs rows and on
+undelivered outbox reminders for the cool-down) and streamed as lightweight
+rows, so sending reminders never loads the whole roster or looks students
+up one by one. The outbox dispatcher writes the reminder_logs row when a
+reminder is actually delivered, so a failed send does not start the cool-down.
+"""
+from datetime import datetime, timedelta
+
+from .models import db, Student, Survey, SurveySession, ReminderLog, EmailOutbox
+
+STREAM_CHUNK_SIZE = 500
+
+
+def active_survey_ids():
+    """IDs of the currently active surveys."""
+    return [row.id for row in db.session.query(Survey.id).filter(Survey.is_active == True)]
+
+
+def pending_reminder_query(program=None, section=None, survey_id=None, cooldown_hours=0):
+    """
+    Build the query for students who still have to submit an evaluation.
+
+    Args:
+        program (str): Only students in this program (e.g. BSCS)
+        section (str): Only students in this section (e.g. BSCS-2A)
+        survey_id (UUID): Survey the student must have submitted; defaults to
+            the currently active survey(s), or any survey if none is active
+        cooldown_hours (int): Skip students reminded within this many hours,
+            and students whose reminder is still waiting in the outbox
+
+    Returns:
+        Query yielding (id, full_name, email, program, section) rows
+    """
+    survey_ids = [survey_id] if survey_id else active_survey_ids()
+
+    submitted = SurveySession.query.filter(SurveySession.student_uuid == Student.id)
+    if survey_ids:
+        submitted = submitted.filter(SurveySession.survey_id.in_(survey_ids))
+
+    query = db.session.query(
+        Student.id, Student.full_name, Student.email, Student.program, Student.section
+    ).filter(
+        Student.is_active == True,
+        ~submitted.exists()
+    )
+
+    if cooldown_hours:
+        since = datetime.utcnow() - timedelta(hours=cooldown_hours)
+        reminded = ReminderLog.query.filter(
+            ReminderLog.student_uuid == Student.id,
+            ReminderLog.sent_at >= since
+        )
+        # An explicit survey only counts reminders for that survey
+        if survey_id:
+            reminded = reminded.filter(ReminderLog.survey_id == survey_id)
+        # Not yet delivered: queued or being sent by the dispatcher
+        in_outbox = EmailOutbox.query.filter(
+            EmailOutbox.recipient_email == Student.email,
+            EmailOutbox.kind == 'reminder',
+            EmailOutbox.status.in_(('pending', 'sending'))
+        )
+        query = query.filter(~reminded.exists(), ~in_outbox.exists())
+
+    if program:
+        query = query.filter(Student.program == program)
+    if section:
+        query = query.filter(Student.section == section)
+
+    return query.order_by(Student.program, Student.section, Student.full_name)
+
+
+def iter_reminder_recipients(program=None, section=None, survey_id=None, cooldown_hours=0):
+    """Stream pending students as dicts in the shape `enqueue_reminders` expects."""
+    query = pending_reminder_query(program, section, survey_id, cooldown_hours)
+    for row in query.yield_per(STREAM_CHUNK_SIZE):
+        yield {
+            'student_uuid': row.id,
+            'full_name': row.full_name,
+            'email': row.email,
+            'program': row.program,
+            'section': row.section
+        }
+
+
+def attribute_reminders(recipients, survey_id=None):
+    """
+    Pass recipients through with the survey their reminder is about.
+
+    The outbox keeps the survey in the row payload and logs it once the
+    reminder is delivered, for the per-survey cool-down.
+    """
+    if not survey_id:
+        # Attribute the reminder to the active survey when there is exactly one
+        survey_ids = active_survey_ids()
+        survey_id = survey_ids[0] if len(survey_ids) == 1 else None
+
+    for recipient in recipients:
+        recipient['survey_id'] = survey_id
+        yield recipient
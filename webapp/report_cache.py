@@ -0,0 +1,281 @@
+# webapp/report_cache.py
+"""
+Generated report cache.
+
+PDF reports are expensive to build (score aggregation plus ReportLab layout)
+but only change when evaluation data does. Finished artifacts are kept in a
+size-bounded in-memory LRU and in files under REPORT_CACHE_DIR (default
+<instance_path>/report_cache, shared by the workers of one host), keyed by
+(report type, parameters, data version).
+
+The data version combines the latest answer ID, answer/comment counts and
+the latest submission time, so any new, changed or deleted submission moves
+to a new version; artifacts of older versions are evicted as soon as one of
+the new version is stored. Changes to staff, sections, questions or surveys
+call `invalidate_report_cache()`, which bumps a generation counter stored in
+the cache directory so other workers stop using their copies too.
+
+Very large reports go through `cached_report_file` instead: they are built
+into a spooled temporary file, stored only on disk, and handed back as an
+open file for streaming, so the artifact is never held in memory whole.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from flask import current_app
+from sqlalchemy import func
+
+from .models import db, Answer, SurveySession, StudentComment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_MEMORY_BYTES = 32 * 1024 * 1024
+# Reports built for streaming stay in memory up to this size, then move to a temp file
+SPOOL_MAX_BYTES = 4 * 1024 * 1024
+_GENERATION_FILE = 'GENERATION'
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class ReportCache:
+    """Byte-bounded LRU in memory, backed by one file per artifact on disk."""
+
+    def __init__(self, directory, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict()  # file name -> bytes
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def file_name(version, key):
+        version_hash = hashlib.sha256(version.encode('utf-8')).hexdigest()[:16]
+        key_hash = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32]
+        return f'{version_hash}-{key_hash}.bin'
+
+    def generation(self):
+        try:
+            with open(os.path.join(self.directory, _GENERATION_FILE), 'r') as file:
+                return file.read().strip() or '0'
+        except FileNotFoundError:
+            return '0'
+
+    def bump_generation(self):
+        new_generation = str(int(self.generation()) + 1)
+        self._write_file(_GENERATION_FILE, new_generation.encode('utf-8'))
+        return new_generation
+
+    def get(self, version, key):
+        name = self.file_name(version, key)
+        with self._lock:
+            data = self._memory.get(name)
+            if data is not None:
+                self._memory.move_to_end(name)
+                self.hits += 1
+                return data
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self._remember(name, data)
+        return data
+
+    def set(self, version, key, data):
+        name = self.file_name(version, key)
+        prefix = name.split('-', 1)[0] + '-'
+        self._evict_other_versions(prefix)
+        try:
+            self._write_file(name, data)
+        except OSError as e:
+            logger.warning(f"Could not write report cache file: {e}")
+        with self._lock:
+            self._remember(name, data)
+
+    def open(self, version, key):
+        """Open a cached artifact for reading from memory or disk, or return None."""
+        name = self.file_name(version, key)
+        with self._lock:
+            data = self._memory.get(name)
+            if data is not None:
+                self._memory.move_to_end(name)
+                self.hits += 1
+                return BytesIO(data)
+        try:
+            file = open(os.path.join(self.directory, name), 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return file
+
+    def set_file(self, version, key, file):
+        """Store the contents of an open binary file (from its current position) on disk only."""
+        name = self.file_name(version, key)
+        self._evict_other_versions(name.split('-', 1)[0] + '-')
+        try:
+            self._write_file(name, file)
+        except OSError as e:
+            logger.warning(f"Could not write report cache file: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                self._remove_file(name)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _remember(self, name, data):
+        # Caller holds the lock
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(name, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[name] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _evict_other_versions(self, prefix):
+        with self._lock:
+            for name in [name for name in self._memory if not name.startswith(prefix)]:
+                self._memory_bytes -= len(self._memory.pop(name))
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin') and not name.startswith(prefix):
+                self._remove_file(name)
+
+    def _write_file(self, name, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                if hasattr(data, 'read'):
+                    shutil.copyfileobj(data, file)
+                else:
+                    file.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def get_report_cache(app=None):
+    """Return the process-wide ReportCache for the app's cache directory, or None when disabled."""
+    app = app or current_app
+    if not app.config.get('REPORT_CACHE', True):
+        return None
+    directory = app.config.get('REPORT_CACHE_DIR') or os.path.join(app.instance_path, 'report_cache')
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            max_bytes = app.config.get('REPORT_CACHE_MAX_MEMORY_MB', DEFAULT_MAX_MEMORY_BYTES // 2 ** 20) * 2 ** 20
+            cache = _caches[directory] = ReportCache(directory, max_bytes)
+        return cache
+
+
+def data_version(cache=None):
+    """Fingerprint of the evaluation data reports are built from, plus the setup generation."""
+    row = db.session.query(
+        db.session.query(func.max(Answer.answer_id)).scalar_subquery(),
+        db.session.query(func.count(Answer.answer_id)).scalar_subquery(),
+        db.session.query(func.max(SurveySession.submission_date)).scalar_subquery(),
+        db.session.query(func.count(StudentComment.id)).scalar_subquery()
+    ).one()
+    generation = cache.generation() if cache else '0'
+    return f'{generation}:{row[0]}:{row[1]}:{row[2]}:{row[3]}'
+
+
+def cached_report(report_type, params, build):
+    """
+    Return the bytes of a report, building it with `build()` only when no
+    artifact for the current data version exists. `build` may return None
+    (nothing to report), which is not cached.
+    """
+    cache = get_report_cache()
+    if cache is None:
+        return build()
+
+    key = (report_type, tuple(params))
+    version = data_version(cache)
+    data = cache.get(version, key)
+    if data is not None:
+        logger.debug(f"Report cache hit: {report_type} {params}")
+        return data
+
+    data = build()
+    if data is not None:
+        cache.set(version, key, data)
+    return data
+
+
+def cached_report_file(report_type, params, build_into):
+    """
+    Like `cached_report`, for reports too large to hold in memory:
+    `build_into(file)` writes the report into a binary file, and an open file
+    positioned at the start is returned (the cached copy when one exists).
+    The caller closes it; `send_file` does so when the response ends.
+    """
+    cache = get_report_cache()
+    key = (report_type, tuple(params))
+    version = None
+    if cache is not None:
+        version = data_version(cache)
+        cached = cache.open(version, key)
+        if cached is not None:
+            logger.debug(f"Report cache hit: {report_type} {params}")
+            return cached
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        build_into(output)
+        if cache is not None:
+            output.seek(0)
+            cache.set_file(version, key, output)
+        output.seek(0)
+    except Exception:
+        output.close()
+        raise
+    return output
+
+
+def invalidate_report_cache():
+    """Drop all cached reports, here and (via the generation file) in the other workers."""
+    cache = get_report_cache()
+    if cache is None:
+        return
+    cache.bump_generation()
+    cache.clear()
@@ -0,0 +1,161 @@
+# webapp/report_layout.py
+"""
+Shared ReportLab layout for the PDF reports.
+
+The paragraph styles, table styles and the results-table builders are made
+once at import and used by every report, instead of each render calling
+getSampleStyleSheet() and rebuilding the same TableStyle. ReportLab only
+reads these objects during layout, so one copy can serve all threads and
+reports as long as nothing mutates them.
+
+`paged_results_tables` is the large-report template: every cell is a plain
+string, and the table is cut into page-sized chunks with fixed row heights
+and column widths, each built only when its page is laid out, so ReportLab
+never measures or splits one huge table and only one page of cells is alive
+at a time.
+"""
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Flowable, Paragraph, Spacer, Table, TableStyle
+
+STYLES = getSampleStyleSheet()
+
+# Large-mode results table geometry (points)
+LARGE_ROW_HEIGHT = 16
+LARGE_HEADER_HEIGHT = 24
+LARGE_FONT_SIZE = 8
+
+_HEADER_ROW = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+]
+
+# Staff results tables (combined and detailed PDFs)
+RESULTS_TABLE_COMMANDS = _HEADER_ROW + [
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+]
+RESULTS_TABLE_STYLE = TableStyle(RESULTS_TABLE_COMMANDS)
+LARGE_RESULTS_TABLE_STYLE = TableStyle(RESULTS_TABLE_COMMANDS + [
+    ('FONTSIZE', (0, 0), (-1, -1), LARGE_FONT_SIZE),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+])
+
+# Criteria table of the individual staff report
+CRITERIA_TABLE_STYLE = TableStyle(_HEADER_ROW + [
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+def title_block(text, style='h1', space_after=12):
+    """Heading paragraph followed by a spacer."""
+    return [Paragraph(text, STYLES[style]), Spacer(1, space_after)]
+
+
+def block_height(flowables, width, height):
+    """Height the flowables take on a page, including the space after each."""
+    return sum(flowable.wrap(width, height)[1] + flowable.getSpaceAfter() for flowable in flowables)
+
+
+def results_headers(criteria):
+    """Header row of a staff results table."""
+    return ['NO', 'Staff Name'] + list(criteria) + ['TOTAL', 'RANK']
+
+
+def results_row(number, staff, criteria, name_cell=None):
+    """
+    One staff row of a results table, as strings apart from the name cell.
+    `staff` is a result dict from calculate_detailed_scores_by_staff_type;
+    the name is wrapped in a Paragraph unless `name_cell` is given.
+    """
+    if name_cell is None:
+        name_cell = Paragraph(staff['StaffName'], STYLES['Normal'])
+    return ([str(number), name_cell]
+            + [f"{staff.get(crit, 0.0):.2f}" for crit in criteria]
+            + [f"{staff['TotalScore']:.2f}", str(staff['Rank'])])
+
+
+def results_table(results, criteria, repeat_rows=0):
+    """Staff results table with wrapped names, sized by ReportLab."""
+    data = [results_headers(criteria)]
+    data.extend(results_row(i, staff, criteria) for i, staff in enumerate(results, 1))
+    table = Table(data, repeatRows=repeat_rows)
+    table.setStyle(RESULTS_TABLE_STYLE)
+    return table
+
+
+def paged_results_tables(results, criteria, width, height, first_page_used=0):
+    """
+    Yield one fixed-geometry, deferred Table per page for a large results
+    table in a `width` x `height` frame whose first page already has
+    `first_page_used` points taken.
+    """
+    headers = results_headers(criteria)
+
+    def header_width(text):
+        return stringWidth(text, 'Helvetica-Bold', LARGE_FONT_SIZE) + 12
+
+    fixed_widths = [max(header_width(h), 28) for h in headers[:1]] + \
+        [max(header_width(h), 40) for h in headers[2:]]
+    name_width = max(width - sum(fixed_widths), 100)
+    col_widths = fixed_widths[:1] + [name_width] + fixed_widths[1:]
+
+    # SimpleDocTemplate's frame has 6pt padding on every side
+    frame_height = height - 12
+    first_rows = max(1, int((frame_height - first_page_used - LARGE_HEADER_HEIGHT) // LARGE_ROW_HEIGHT))
+    rows_per_page = max(1, int((frame_height - LARGE_HEADER_HEIGHT) // LARGE_ROW_HEIGHT))
+
+    def page_table(start, stop):
+        data = [headers]
+        for i, staff in enumerate(results[start:stop], start + 1):
+            data.append(results_row(i, staff, criteria, name_cell=_fit_text(staff['StaffName'], name_width - 12)))
+        table = Table(data, colWidths=col_widths,
+                      rowHeights=[LARGE_HEADER_HEIGHT] + [LARGE_ROW_HEIGHT] * (len(data) - 1))
+        table.setStyle(LARGE_RESULTS_TABLE_STYLE)
+        return table
+
+    start = 0
+    rows_this_page = first_rows
+    while start < len(results):
+        stop = start + rows_this_page
+        yield _DeferredTable(lambda start=start, stop=stop: page_table(start, stop))
+        start = stop
+        rows_this_page = rows_per_page
+
+
+class _DeferredTable(Flowable):
+    """Builds its Table only when laid out and drops it once drawn."""
+
+    def __init__(self, build):
+        Flowable.__init__(self)
+        self._build = build
+        self._table = None
+
+    def _get_table(self):
+        if self._table is None:
+            self._table = self._build()
+        return self._table
+
+    def wrap(self, availWidth, availHeight):
+        return self._get_table().wrap(availWidth, availHeight)
+
+    def split(self, availWidth, availHeight):
+        return self._get_table().split(availWidth, availHeight)
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self._get_table().drawOn(canvas, x, y, _sW)
+        self._table = None
+
+
+def _fit_text(text, width):
+    """Truncate `text` with an ellipsis so it fits `width` points in the large-mode font."""
+    if stringWidth(text, 'Helvetica', LARGE_FONT_SIZE) <= width:
+        return text
+    while text and stringWidth(text + '...', 'Helvetica', LARGE_FONT_SIZE) > width:
+        text = text[:-1]
+    return text.rstrip() + '...'
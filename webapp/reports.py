@@ -0,0 +1,224 @@
+# webapp/reports.py
+"""
+Staff report rendering.
+
+Report data is collected from the database for any number of staff
+(`collect_staff_report_data`) into plain tuples, and rendered to PDF
+by `render_individual_staff_pdf`, which touches neither the database nor
+the Flask app. That split lets the batch export render many reports in a
+process pool and write them into a single ZIP archive.
+
+`render_results_pdf` and `render_detailed_pdf` lay out the staff results
+tables; styles and table templates come from `report_layout`.
+"""
+import logging
+import os
+import re
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, PageBreak
+
+from .models import db, Answer, Question, Teacher, StudentComment
+from .report_layout import (STYLES, CRITERIA_TABLE_STYLE, title_block, block_height, results_table,
+                            paged_results_tables)
+from .score_index import score_index_ready, criteria_sums_for_staff
+
+logger = logging.getLogger(__name__)
+
+# Below this many reports the pool start-up costs more than it saves
+MIN_PARALLEL_REPORTS = 8
+
+CriteriaScore = namedtuple('CriteriaScore', ['criteria', 'average', 'count'])
+StaffComment = namedtuple('StaffComment', ['text', 'created_at'])
+StaffReportData = namedtuple('StaffReportData', ['teacher_id', 'name', 'overall', 'criteria', 'comments'])
+
+
+def collect_staff_report_data(teacher_ids=None):
+    """
+    Collect criteria averages and comments for the given staff (all staff when None).
+
+    Scores come from the per-staff score index, so the cost follows the
+    requested staff's evaluations rather than all answers. Before the index
+    is backfilled, answers are scanned once for all requested staff.
+
+    Returns:
+        dict: teacher_id (str) -> StaffReportData, ordered by staff name
+    """
+    teacher_query = db.session.query(Teacher.id, Teacher.name).order_by(Teacher.name)
+    if teacher_ids is not None:
+        teacher_query = teacher_query.filter(Teacher.id.in_(list(teacher_ids)))
+    teachers = [(str(teacher_id), name) for teacher_id, name in teacher_query]
+    wanted = {teacher_id for teacher_id, _ in teachers}
+    if not wanted:
+        return {}
+
+    if score_index_ready():
+        sums = criteria_sums_for_staff(None if teacher_ids is None else wanted)
+    else:
+        logger.warning("Score index not backfilled; run `flask backfill-score-cells`. Scanning answers instead.")
+        sums = _scan_answer_sums(wanted)
+
+    comments = {}
+    comment_query = db.session.query(
+        StudentComment.teacher_id, StudentComment.comment_text, StudentComment.created_at
+    ).order_by(StudentComment.created_at)
+    if teacher_ids is not None:
+        comment_query = comment_query.filter(StudentComment.teacher_id.in_(list(teacher_ids)))
+    for teacher_id, comment_text, created_at in comment_query:
+        comments.setdefault(str(teacher_id), []).append(StaffComment(comment_text, created_at))
+
+    data = {}
+    for teacher_id, name in teachers:
+        criteria_scores = tuple(
+            CriteriaScore(criteria, total / count if count else 0.0, count)
+            for criteria, (total, count) in sorted(sums.get(teacher_id, {}).items())
+        )
+        overall = (sum(score.average for score in criteria_scores) / len(criteria_scores)) if criteria_scores else 0.0
+        data[teacher_id] = StaffReportData(teacher_id, name, overall, criteria_scores,
+                                           tuple(comments.get(teacher_id, ())))
+    return data
+
+
+def _scan_answer_sums(wanted):
+    """Criteria sums for the `wanted` staff IDs from one pass over all answers (used until the index is backfilled)."""
+    criteria_by_question = {str(question_id): criteria
+                            for question_id, criteria in db.session.query(Question.id, Question.criteria)}
+
+    sums = {}  # teacher_id -> {criteria: [sum, count]}
+    answer_rows = db.session.query(Answer.question_identifier, Answer.response_value).filter(
+        Answer.response_value.like('%|%')
+    ).yield_per(2000)
+    for question_id, response_value in answer_rows:
+        criteria = criteria_by_question.get(str(question_id))
+        if criteria is None:
+            continue
+        for teacher_score in response_value.split(';'):
+            try:
+                score_str, entity_id = teacher_score.split('|', 1)
+                if entity_id not in wanted:
+                    continue
+                score = float(score_str)
+            except (ValueError, IndexError):
+                continue
+            cell = sums.setdefault(entity_id, {}).setdefault(criteria, [0.0, 0])
+            cell[0] += score
+            cell[1] += 1
+    return sums
+
+
+def render_individual_staff_pdf(report):
+    """Render one StaffReportData as an individual report PDF and return its bytes."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+
+    story = title_block(f'Individual Staff Report: {report.name}')
+
+    # Staff information
+    story.append(Paragraph(f'Staff Name: {report.name}', STYLES['h2']))
+    story.append(Paragraph(f'Overall Score: {report.overall:.2f}/5.00', STYLES['h2']))
+    story.append(Spacer(1, 12))
+
+    # Detailed scores by criteria
+    if report.criteria:
+        story.append(Paragraph('Evaluation Scores by Criteria:', STYLES['h3']))
+        criteria_data = [['Criteria', 'Average Score', 'Total Responses']]
+        for score in report.criteria:
+            criteria_data.append([score.criteria, f'{score.average:.2f}', str(score.count)])
+
+        criteria_table = Table(criteria_data)
+        criteria_table.setStyle(CRITERIA_TABLE_STYLE)
+        story.append(criteria_table)
+        story.append(Spacer(1, 20))
+
+    # Comments section
+    story.append(Paragraph('Student Comments and Suggestions:', STYLES['h3']))
+    if report.comments:
+        story.append(Spacer(1, 12))
+        for i, comment in enumerate(report.comments, 1):
+            story.append(Paragraph(f'Comment {i}:', STYLES['h4']))
+            story.append(Paragraph(comment.text, STYLES['Normal']))
+            story.append(Paragraph(f'Submitted: {comment.created_at.strftime("%B %d, %Y")}', STYLES['Italic']))
+            story.append(Spacer(1, 12))
+    else:
+        story.append(Paragraph('No comments were submitted for this staff member.', STYLES['Normal']))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def render_detailed_pdf(staff_type, results, criteria, output):
+    """Render the detailed results of one staff type into the binary file `output`."""
+    doc = SimpleDocTemplate(output, pagesize=letter)
+    story = title_block(f'{staff_type.title()} Staff Evaluation Results')
+    story.append(results_table(results, criteria))
+    doc.build(story)
+
+
+def render_results_pdf(sections, output, large=False):
+    """
+    Render the combined results PDF into the binary file `output`.
+
+    Args:
+        sections: (staff_type, results, criteria) per staff type, as returned
+            by calculate_detailed_scores_by_staff_type
+        large: use the memory-bounded layout (plain cells, page-sized chunks)
+    """
+    doc = SimpleDocTemplate(output, pagesize=landscape(letter))
+    story = []
+
+    for staff_type, results, criteria in sections:
+        if not results:
+            story.append(Paragraph(f'No data available for {staff_type} staff.', STYLES['h2']))
+            story.append(PageBreak())
+            continue
+
+        title = title_block(f'{staff_type.title()} Staff Evaluation Results')
+        story.extend(title)
+        if large:
+            story.extend(paged_results_tables(results, criteria, doc.width, doc.height,
+                                              first_page_used=block_height(title, doc.width, doc.height)))
+        else:
+            story.append(results_table(results, criteria, repeat_rows=1))
+        story.append(PageBreak())
+
+    doc.build(story)
+
+
+def report_file_name(report):
+    """File name of a staff member's report inside the batch archive."""
+    safe_name = re.sub(r'[^A-Za-z0-9._-]+', '_', report.name).strip('_') or 'staff'
+    return f'{safe_name}_{report.teacher_id[:8]}_individual_report.pdf'
+
+
+def write_staff_reports_zip(reports, output, workers=None):
+    """
+    Render every StaffReportData in `reports` and write the PDFs into a ZIP archive.
+
+    Rendering runs in a pool of `workers` processes (default: CPU count);
+    `workers=1` or a small batch renders in this process.
+
+    Returns:
+        int: number of reports written
+    """
+    reports = list(reports)
+    workers = workers or os.cpu_count() or 1
+
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        if workers > 1 and len(reports) >= MIN_PARALLEL_REPORTS:
+            # 'spawn' so the children do not inherit the web worker's threads or DB connections
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+                chunksize = max(1, len(reports) // (workers * 4))
+                pdfs = pool.map(render_individual_staff_pdf, reports, chunksize=chunksize)
+                for report, pdf in zip(reports, pdfs):
+                    archive.writestr(report_file_name(report), pdf)
+        else:
+            for report in reports:
+                archive.writestr(report_file_name(report), render_individual_staff_pdf(report))
+
+    logger.info(f"Wrote {len(reports)} individual staff reports to archive")
+    return len(reports)
@@ -0,0 +1,98 @@
+# webapp/roster.py
+"""
+Section -> staff roster map.
+
+All teacher/section assignments are loaded in one pass into a map keyed by
+(program, section), e.g. ("BSCS", "2A"), plus one shared list of non-teaching
+(Admin department) staff. Entries are plain (id, name, image_url) tuples, so
+the student dashboard and submission validation look up a student's staff
+with a dictionary access instead of join queries.
+
+The map is cached per evaluation setup generation (see survey_state), which
+the staff, section and department routes bump on every change, so every
+worker rebuilds it once it reloads the survey state; the worker that made
+the change also drops its copy at once with `invalidate_roster()`.
+"""
+import logging
+from collections import namedtuple
+
+from .cache import TTLCache
+from .models import db, Teacher, Section, Department, teacher_section_association, teacher_department_association
+
+logger = logging.getLogger(__name__)
+
+NON_TEACHING_DEPARTMENT = 'Admin'
+# Bounds how long an unused roster stays in memory; changes are picked up through the setup generation
+ROSTER_TTL_SECONDS = 3600
+
+StaffEntry = namedtuple('StaffEntry', ['id', 'name', 'image_url'])
+Roster = namedtuple('Roster', ['by_section', 'non_teaching'])
+
+_roster = TTLCache(ttl=ROSTER_TTL_SECONDS, max_entries=1)
+
+
+def split_student_section(full_section, program=None):
+    """Split a student's section (e.g. "BSCS-2A") into (program, section)."""
+    full_section = full_section or ''
+    if '-' in full_section:
+        return tuple(full_section.split('-', 1))
+    return program, full_section
+
+
+def _build_roster():
+    by_section = {}
+    section_rows = db.session.query(
+        Department.name, Section.name, Teacher.id, Teacher.name, Teacher.image_url
+    ).select_from(Teacher).join(
+        teacher_section_association, teacher_section_association.c.teacher_id == Teacher.id
+    ).join(
+        Section, Section.id == teacher_section_association.c.section_id
+    ).join(
+        Department, Department.id == Section.department_id
+    ).order_by(Teacher.name)
+
+    for program, section, teacher_id, name, image_url in section_rows:
+        by_section.setdefault((program, section), []).append(StaffEntry(teacher_id, name, image_url))
+
+    non_teaching_rows = db.session.query(
+        Teacher.id, Teacher.name, Teacher.image_url
+    ).join(
+        teacher_department_association, teacher_department_association.c.teacher_id == Teacher.id
+    ).join(
+        Department, Department.id == teacher_department_association.c.department_id
+    ).filter(
+        Department.name == NON_TEACHING_DEPARTMENT
+    ).order_by(Teacher.name)
+
+    roster = Roster(
+        by_section={key: tuple(entries) for key, entries in by_section.items()},
+        non_teaching=tuple(StaffEntry(*row) for row in non_teaching_rows)
+    )
+    logger.debug(f"Built staff roster: {len(roster.by_section)} sections, {len(roster.non_teaching)} non-teaching staff")
+    return roster
+
+
+def get_roster(generation=0):
+    """Return the cached roster of a setup generation, building it on first use."""
+    roster = _roster.get(generation)
+    if roster is None:
+        roster = _build_roster()
+        _roster.set(generation, roster)
+    return roster
+
+
+def staff_for_section(program, section, generation=0):
+    """Teaching staff of (program, section) followed by all non-teaching staff, without duplicates."""
+    roster = get_roster(generation)
+    staff = []
+    seen = set()
+    for entry in roster.by_section.get((program, section), ()) + roster.non_teaching:
+        if entry.id not in seen:
+            seen.add(entry.id)
+            staff.append(entry)
+    return staff
+
+
+def invalidate_roster():
+    """Forget the roster so the next read rebuilds it."""
+    _roster.clear()
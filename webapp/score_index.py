@@ -0,0 +1,151 @@
+# webapp/score_index.py
+"""
+Per-staff score index.
+
+Answers store every staff member's score for a question in one string
+("score|teacher;score|teacher"), so finding one staff member's scores means
+reading every answer in the system. The score_cells table holds the same
+data one row per (submission, staff, question), indexed by staff, and is
+written in the same transaction as the answers (`write_submission`).
+
+Databases with answers from before the table existed are filled with
+`flask backfill-score-cells`, which records its completion in app_state;
+until that marker exists, readers fall back to scanning the answers. A
+database with no scored answers at start-up is marked complete right away.
+"""
+import logging
+import uuid
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Answer, AppState, Question, ScoreCell, SurveySession
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 2000
+# app_state key written once every existing answer is in the index
+BACKFILLED_MARKER = 'score_index_backfilled'
+
+
+def score_cell_rows(session_id, survey_id, answers):
+    """
+    ScoreCell mappings for {question_uuid: ["score|teacher_id", ...]} answers.
+    Malformed entries are skipped.
+    """
+    rows = []
+    for question_id, teacher_scores in answers.items():
+        for entry in teacher_scores:
+            try:
+                score_str, staff_id = entry.split('|', 1)
+                rows.append({
+                    'session_id': session_id,
+                    'staff_id': uuid.UUID(staff_id),
+                    'question_id': question_id if isinstance(question_id, uuid.UUID) else uuid.UUID(str(question_id)),
+                    'survey_id': survey_id,
+                    'score': int(float(score_str))
+                })
+            except (ValueError, TypeError):
+                logger.warning(f"Skipping malformed score entry {entry!r} for question {question_id}")
+    return rows
+
+
+def write_score_cells(session_id, survey_id, answers):
+    """Stage the score cells of one submission, replacing any previous ones of the session. The caller commits."""
+    ScoreCell.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+    rows = score_cell_rows(session_id, survey_id, answers)
+    if rows:
+        db.session.bulk_insert_mappings(ScoreCell, rows)
+    return len(rows)
+
+
+def delete_score_cells(session_ids):
+    """Stage deletion of the score cells of the given sessions. The caller commits."""
+    return ScoreCell.query.filter(ScoreCell.session_id.in_(list(session_ids))).delete(synchronize_session=False)
+
+
+def score_index_ready():
+    """
+    True once the index holds every submission: the backfill has completed,
+    or the database had no scored answers when it was first started. Cells
+    written by new submissions alone do not make the index complete.
+    """
+    return db.session.get(AppState, BACKFILLED_MARKER) is not None
+
+
+def mark_score_index_ready_if_empty():
+    """At start-up, mark the index complete when there are no scored answers it could be missing."""
+    if score_index_ready():
+        return False
+    if db.session.query(Answer.answer_id).filter(Answer.response_value.like('%|%')).limit(1).first() is not None:
+        logger.warning("Score index not backfilled; reports scan answers until `flask backfill-score-cells` runs.")
+        return False
+    db.session.add(AppState(key=BACKFILLED_MARKER, value=1))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker marked it first
+        db.session.rollback()
+    return True
+
+
+def criteria_sums_for_staff(staff_ids=None):
+    """
+    Sum and count of scores per (staff, criteria) from the index. Only cells
+    whose submission still exists count, so a cell left behind by a delete
+    path that skipped the index cannot show up in a report.
+
+    Returns:
+        dict: staff_id (str) -> {criteria: [sum, count]}
+    """
+    query = db.session.query(
+        ScoreCell.staff_id, Question.criteria, func.sum(ScoreCell.score), func.count(ScoreCell.id)
+    ).join(Question, Question.id == ScoreCell.question_id).join(
+        SurveySession, SurveySession.session_id == ScoreCell.session_id
+    ).group_by(ScoreCell.staff_id, Question.criteria)
+    if staff_ids is not None:
+        query = query.filter(ScoreCell.staff_id.in_([uuid.UUID(str(staff_id)) for staff_id in staff_ids]))
+
+    sums = {}
+    for staff_id, criteria, total, count in query:
+        sums.setdefault(str(staff_id), {})[criteria] = [float(total or 0), count]
+    return sums
+
+
+def backfill_score_cells(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Rebuild score_cells from all existing answers, committing per batch of answers.
+    Readers use the answers while it runs; the completion marker is written last.
+
+    Returns:
+        int: number of score cells written
+    """
+    AppState.query.filter_by(key=BACKFILLED_MARKER).delete(synchronize_session=False)
+    ScoreCell.query.delete(synchronize_session=False)
+    db.session.commit()
+
+    written = 0
+    last_id = 0
+    while True:
+        batch = db.session.query(
+            Answer.answer_id, Answer.session_id, Answer.survey_id, Answer.question_identifier, Answer.response_value
+        ).filter(
+            Answer.answer_id > last_id, Answer.response_value.like('%|%')
+        ).order_by(Answer.answer_id).limit(batch_size).all()
+        if not batch:
+            break
+
+        rows = []
+        for answer_id, session_id, survey_id, question_id, response_value in batch:
+            rows.extend(score_cell_rows(session_id, survey_id, {question_id: response_value.split(';')}))
+        if rows:
+            db.session.bulk_insert_mappings(ScoreCell, rows)
+        db.session.commit()
+
+        written += len(rows)
+        last_id = batch[-1].answer_id
+        logger.info(f"Score index backfill: {written} cells written (up to answer {last_id})")
+
+    db.session.add(AppState(key=BACKFILLED_MARKER, value=1))
+    db.session.commit()
+    return written
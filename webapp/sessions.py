@@ -0,0 +1,261 @@
+# webapp/sessions.py
+"""
+Server-side sessions.
+
+Flask's default session signs the whole session dict into the cookie, so
+password-reset OTP keys, the ranking draft and the login metadata travel
+with every request and response (and the draft is capped by the 4 KB
+cookie limit). With SESSION_BACKEND set to 'sql' or 'filesystem' the cookie
+only carries a random opaque session ID and the data is kept server-side:
+
+- 'sql': the server_sessions table, shared by every worker process
+- 'filesystem': one file per session under SESSION_FILE_DIR
+- 'cookie': Flask's signed cookie session (previous behaviour)
+
+Sessions expire SESSION_TTL_SECONDS after their last write; the expiry is
+extended at most once per half TTL so read-only requests do not write.
+Expired sessions are swept opportunistically every SESSION_SWEEP_INTERVAL_SECONDS
+per worker, or with `flask sweep-sessions`. Clearing the session (as the
+login route does) issues a fresh ID, so a pre-login ID cannot be fixated.
+"""
+import json
+import logging
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import select
+from werkzeug.datastructures import CallbackDict
+
+from .models import db, ServerSession
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 8 * 3600
+DEFAULT_SWEEP_INTERVAL_SECONDS = 600
+
+_SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{32,128}$')
+_serializer = TaggedJSONSerializer()
+
+
+def new_session_id():
+    return secrets.token_urlsafe(32)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that tracks modification and whether its ID must be regenerated."""
+
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+        self.regenerate = False
+
+    def clear(self):
+        super().clear()
+        # A cleared session (login/logout) gets a new ID
+        self.regenerate = True
+
+
+class SqlSessionStore:
+    """Session records in the server_sessions table, accessed outside the request's ORM session."""
+
+    def load(self, sid):
+        table = ServerSession.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.data, table.c.expires_at).where(table.c.session_id == sid)
+            ).first()
+        if not row or row.expires_at <= datetime.utcnow():
+            return None
+        return row.data, row.expires_at
+
+    def save(self, sid, data, expires_at):
+        table = ServerSession.__table__
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                table.update().where(table.c.session_id == sid).values(data=data, expires_at=expires_at)
+            ).rowcount
+            if not updated:
+                conn.execute(table.insert().values(session_id=sid, data=data, expires_at=expires_at))
+
+    def delete(self, sid):
+        table = ServerSession.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.session_id == sid))
+
+    def sweep(self):
+        table = ServerSession.__table__
+        with db.engine.begin() as conn:
+            return conn.execute(table.delete().where(table.c.expires_at <= datetime.utcnow())).rowcount
+
+
+class FilesystemSessionStore:
+    """One JSON file per session: {"expires_at": <unix time>, "data": <serialized session>}."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        try:
+            with open(self._path(sid), 'r', encoding='utf-8') as file:
+                record = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        expires_at = datetime.utcfromtimestamp(record['expires_at'])
+        if expires_at <= datetime.utcnow():
+            return None
+        return record['data'], expires_at
+
+    def save(self, sid, data, expires_at):
+        record = {'expires_at': (expires_at - datetime(1970, 1, 1)).total_seconds(), 'data': data}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(record, file)
+            os.replace(tmp_path, self._path(sid))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not _SESSION_ID_RE.match(name):
+                continue
+            if self.load(name) is None:
+                self.delete(name)
+                removed += 1
+        return removed
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface that keeps session data in a store and only an ID in the cookie."""
+
+    def __init__(self, store, ttl_seconds=DEFAULT_TTL_SECONDS, sweep_interval_seconds=DEFAULT_SWEEP_INTERVAL_SECONDS):
+        self.store = store
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.sweep_interval = sweep_interval_seconds
+        self._last_sweep = time.monotonic()
+        self._sweep_lock = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or not _SESSION_ID_RE.match(sid):
+            return ServerSideSession(sid=new_session_id(), new=True)
+
+        try:
+            record = self.store.load(sid)
+        except Exception as e:
+            logger.error(f"Error loading session: {e}")
+            record = None
+        if record is None:
+            return ServerSideSession(sid=new_session_id(), new=True)
+
+        data, expires_at = record
+        try:
+            initial = _serializer.loads(data)
+        except ValueError:
+            logger.warning("Discarding unreadable session record")
+            return ServerSideSession(sid=new_session_id(), new=True)
+        return ServerSideSession(initial, sid=sid, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.regenerate and not session.new:
+            self.store.delete(session.sid)
+            session.sid = new_session_id()
+            session.new = True
+
+        if not session:
+            # Nothing to keep: drop the record and the cookie
+            if not session.new:
+                self.store.delete(session.sid)
+            if not session.new or session.regenerate:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        now = datetime.utcnow()
+        needs_refresh = session.expires_at is None or session.expires_at - now < self.ttl / 2
+        if not (session.new or session.modified or needs_refresh):
+            return
+
+        session.expires_at = now + self.ttl
+        self.store.save(session.sid, _serializer.dumps(dict(session)), session.expires_at)
+        response.set_cookie(
+            name, session.sid,
+            expires=session.expires_at if session.permanent else None,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        self._maybe_sweep()
+
+    def _maybe_sweep(self):
+        if not self.sweep_interval or time.monotonic() - self._last_sweep < self.sweep_interval:
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = time.monotonic()
+            removed = self.store.sweep()
+            if removed:
+                logger.info(f"Swept {removed} expired sessions")
+        except Exception as e:
+            logger.error(f"Error sweeping expired sessions: {e}")
+        finally:
+            self._sweep_lock.release()
+
+
+def make_session_store(app):
+    """Session store for the configured backend, or None for cookie sessions."""
+    backend = app.config.get('SESSION_BACKEND', 'cookie')
+    if backend == 'sql':
+        return SqlSessionStore()
+    if backend == 'filesystem':
+        return FilesystemSessionStore(app.config.get('SESSION_FILE_DIR') or os.path.join(app.instance_path, 'sessions'))
+    return None
+
+
+def init_sessions(app):
+    """Install the server-side session interface unless SESSION_BACKEND is 'cookie'."""
+    store = make_session_store(app)
+    if store is None:
+        return
+    app.session_interface = ServerSideSessionInterface(
+        store,
+        ttl_seconds=app.config.get('SESSION_TTL_SECONDS', DEFAULT_TTL_SECONDS),
+        sweep_interval_seconds=app.config.get('SESSION_SWEEP_INTERVAL_SECONDS', DEFAULT_SWEEP_INTERVAL_SECONDS)
+    )
+    logger.info(f"Using {app.config['SESSION_BACKEND']} server-side sessions.")
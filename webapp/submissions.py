@@ -0,0 +1,322 @@
+# webapp/submissions.py
+"""
+Evaluation submission persistence.
+
+A submission is parsed from the form in a single pass and written in one
+transaction: the SurveySession row is upserted on (student_uuid, survey_id),
+the previous answers and comments of that session are removed, and the new
+ones are bulk inserted before a single commit.
+
+Each stored submission's scores are also kept as a compact answer map,
+{(staff_id, question_id): score}, keyed by (session_id, submission_date), so
+review mode can prefill the form without re-parsing the answers rows.
+
+The evaluation form also carries a one-time submission token. Outcomes are
+remembered per (student, token) for a short while, so a double-clicked or
+retried POST that reaches the same worker replays the first result instead
+of rewriting the session. The token store lives in one worker process: a
+retry routed to another worker is not recognised, and it is the upsert on
+(student_uuid, survey_id) that keeps it from storing a second submission.
+The token only saves the duplicate write, so a duplicate waits just briefly
+for the first request before answering that it is still being processed.
+"""
+import logging
+import secrets
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .cache import TTLCache
+from .models import db, SurveySession, Answer, StudentComment
+from .score_index import write_score_cells
+
+logger = logging.getLogger(__name__)
+
+# Parsed, database-independent form of one student's submission
+Submission = namedtuple('Submission', ['student_uuid', 'survey_id', 'survey_title', 'answers', 'comments'])
+
+SUBMISSION_TOKEN_FIELD = 'submission_token'
+DEFAULT_TOKEN_TTL_SECONDS = 600
+# How long a duplicate POST holds its request thread waiting for the first one to finish
+DUPLICATE_WAIT_SECONDS = 3
+
+
+class _PendingOutcome:
+    """Outcome slot for one (student, token); filled once the first request finishes."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.flashes = None
+
+
+_outcomes = TTLCache(ttl=DEFAULT_TOKEN_TTL_SECONDS)
+
+ANSWER_MAP_TTL_SECONDS = 3600
+_answer_maps = TTLCache(ttl=ANSWER_MAP_TTL_SECONDS, max_entries=5000)
+
+
+def new_submission_token():
+    """Return a fresh token to embed in the evaluation form."""
+    return secrets.token_urlsafe(16)
+
+
+def claim_submission_token(student_uuid, token, ttl=None):
+    """
+    Claim a submission token for processing.
+
+    Returns:
+        tuple: (claimed, flashes). ``claimed`` is True when this request should
+        process the submission. Otherwise ``flashes`` holds the outcome of the
+        earlier request with the same token, or None if it is still running.
+    """
+    if not token:
+        return True, None
+
+    key = (student_uuid, token)
+    claimed, pending = _outcomes.add(key, _PendingOutcome(), ttl=ttl)
+    if claimed:
+        return True, None
+
+    pending.done.wait(DUPLICATE_WAIT_SECONDS)
+    if pending.flashes is None and pending.done.is_set():
+        # The first request failed and released the token; this one may retry
+        claimed, pending = _outcomes.add(key, _PendingOutcome(), ttl=ttl)
+        if claimed:
+            return True, None
+    return False, pending.flashes
+
+
+def finish_submission_token(student_uuid, token, flashes):
+    """Record the outcome (list of (category, message) flashes) for replaying duplicates."""
+    if not token:
+        return
+    pending = _outcomes.get((student_uuid, token))
+    if pending is not None:
+        pending.flashes = list(flashes)
+        pending.done.set()
+
+
+def release_submission_token(student_uuid, token):
+    """Forget a token whose submission was not stored, so the student can retry with it."""
+    if not token:
+        return
+    pending = _outcomes.pop((student_uuid, token))
+    if pending is not None:
+        pending.done.set()
+
+
+def settle_submission_token_when_done(student_uuid, token, future, flashes):
+    """
+    Keep the token claimed while a submission is still being committed, then
+    record `flashes` for duplicates once it is stored, or release the token
+    if it failed.
+    """
+    if not token:
+        return
+
+    def settle(done_future):
+        if done_future.cancelled() or done_future.exception() is not None:
+            release_submission_token(student_uuid, token)
+        else:
+            finish_submission_token(student_uuid, token, flashes)
+
+    future.add_done_callback(settle)
+
+
+def parse_submission_form(form):
+    """
+    Parse the evaluation form in one pass.
+
+    Returns:
+        tuple: ({question_uuid: ["score|teacher_id", ...]}, [(teacher_uuid, comment_text), ...])
+    """
+    question_answers = {}
+    comments = []
+
+    for key, value in form.items():
+        if key.startswith('score_'):
+            try:
+                _, teacher_id_str, question_id_str = key.split('_')
+                score = int(value)
+                question_uuid = uuid.UUID(question_id_str)
+                question_answers.setdefault(question_uuid, []).append(f"{score}|{teacher_id_str}")
+            except ValueError as ve:
+                logger.error("Malformed form key/value: %s=%s, Error: %s", key, value, ve)
+                continue
+
+        elif key.startswith('comment_') and value.strip():
+            teacher_id_str = key.replace('comment_', '')
+            try:
+                comments.append((uuid.UUID(teacher_id_str), value.strip()))
+            except ValueError as ve:
+                logger.warning(f"Invalid teacher ID in comment: {teacher_id_str}, Error: {ve}")
+                continue
+
+    return question_answers, comments
+
+
+def _upsert_session(student_uuid, survey_id, survey_title, submitted_at):
+    """Insert or refresh the (student, survey) session row and return its session_id."""
+    if db.engine.dialect.name == 'postgresql':
+        stmt = pg_insert(SurveySession.__table__).values(
+            student_uuid=student_uuid,
+            survey_id=survey_id,
+            survey_title=survey_title,
+            submission_date=submitted_at,
+            is_submitted=True
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['student_uuid', 'survey_id'],
+            set_={'survey_title': survey_title, 'submission_date': submitted_at, 'is_submitted': True}
+        ).returning(SurveySession.session_id)
+        return db.session.execute(stmt).scalar()
+
+    # Other databases: lock the existing row (if any) and update it in place
+    existing = SurveySession.query.filter_by(
+        student_uuid=student_uuid, survey_id=survey_id
+    ).with_for_update().first()
+    if existing:
+        existing.survey_title = survey_title
+        existing.submission_date = submitted_at
+        existing.is_submitted = True
+        db.session.flush()
+        return existing.session_id
+
+    new_session = SurveySession(
+        student_uuid=student_uuid,
+        survey_id=survey_id,
+        survey_title=survey_title,
+        submission_date=submitted_at
+    )
+    db.session.add(new_session)
+    db.session.flush()
+    return new_session.session_id
+
+
+def write_submission(submission, submitted_at=None):
+    """
+    Stage one submission in the current transaction without committing.
+
+    Returns:
+        int: the session_id the answers were written to
+    """
+    submitted_at = submitted_at or datetime.utcnow()
+    session_id = _upsert_session(
+        submission.student_uuid, submission.survey_id, submission.survey_title, submitted_at
+    )
+
+    # Resubmission replaces the previous answers and comments of this session
+    Answer.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+    StudentComment.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+
+    db.session.bulk_insert_mappings(Answer, [
+        {
+            'session_id': session_id,
+            'question_identifier': question_uuid,
+            'response_value': ";".join(teacher_scores),  # Combine multiple teacher scores
+            'survey_id': submission.survey_id
+        }
+        for question_uuid, teacher_scores in submission.answers.items()
+    ])
+    write_score_cells(session_id, submission.survey_id, submission.answers)
+
+    if submission.comments:
+        db.session.bulk_insert_mappings(StudentComment, [
+            {
+                'id': uuid.uuid4(),
+                'session_id': session_id,
+                'teacher_id': teacher_uuid,
+                'comment_text': comment_text,
+                'created_at': submitted_at
+            }
+            for teacher_uuid, comment_text in submission.comments
+        ])
+
+    return session_id
+
+
+def save_submission(submission):
+    """
+    Persist one submission in a single transaction and commit it.
+
+    Returns:
+        int: the session_id of the stored submission
+    """
+    started = time.perf_counter()
+    submitted_at = datetime.utcnow()
+    try:
+        session_id = write_submission(submission, submitted_at)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    remember_answer_map(session_id, submitted_at, submission.answers)
+
+    logger.debug(f"Submission for student {submission.student_uuid} committed in "
+                 f"{(time.perf_counter() - started) * 1000:.1f} ms "
+                 f"({len(submission.answers)} answers, {len(submission.comments)} comments)")
+    return session_id
+
+
+def build_answer_map(answers):
+    """Turn {question_uuid: ["score|teacher_id", ...]} into {(teacher_id, question_id): score} with string IDs."""
+    answer_map = {}
+    for question_id, teacher_scores in answers.items():
+        question_key = str(question_id)
+        for entry in teacher_scores:
+            try:
+                score_str, teacher_id = entry.split('|', 1)
+                answer_map[(teacher_id, question_key)] = int(score_str)
+            except ValueError:
+                logger.warning(f"Skipping malformed answer entry {entry!r} for question {question_key}")
+    return answer_map
+
+
+def remember_answer_map(session_id, submitted_at, answers):
+    """Cache the answer map of a just-committed submission."""
+    _answer_maps.set((session_id, submitted_at), build_answer_map(answers))
+
+
+def get_answer_map(session_id, submitted_at):
+    """
+    Return {(teacher_id, question_id): score} for a session, parsing its answers once on a cache miss.
+
+    ``submitted_at`` is the session's submission_date; a resubmission changes it,
+    so a stale map is never returned.
+    """
+    key = (session_id, submitted_at)
+    answer_map = _answer_maps.get(key)
+    if answer_map is None:
+        rows = db.session.query(Answer.question_identifier, Answer.response_value).filter(
+            Answer.session_id == session_id
+        )
+        answer_map = build_answer_map({
+            question_id: (response_value or '').split(';')
+            for question_id, response_value in rows if response_value
+        })
+        _answer_maps.set(key, answer_map)
+    return answer_map
+
+
+def store_submission(submission, app=None):
+    """
+    Persist a submission, through the group-commit writer when SUBMISSION_GROUP_COMMIT is on.
+
+    Returns:
+        int: the session_id of the stored submission
+    """
+    from flask import current_app
+    app = app or current_app._get_current_object()
+
+    if not app.config.get('SUBMISSION_GROUP_COMMIT'):
+        return save_submission(submission)
+
+    from .group_commit import commit_via_group
+    # Hand the connection back before waiting; the writer thread does the writes
+    db.session.rollback()
+    return commit_via_group(app, submission)
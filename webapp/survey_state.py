@@ -0,0 +1,132 @@
+# webapp/survey_state.py
+"""
+Cached survey runtime state.
+
+The global evaluation switch (SurveyStatus), the active Survey and the
+ranking publication flags (RankingStatus) are read on every student page
+view and submission. They are kept here as a plain, immutable snapshot that
+is refreshed after SURVEY_STATE_TTL_SECONDS, and dropped immediately by
+`invalidate_survey_state()` when an admin activates/deactivates a survey or
+posts rankings. Other worker processes pick up the change within the TTL.
+
+The question list of a survey is cached the same way (as plain tuples) and
+dropped together with the state, which the question routes also invalidate.
+
+The snapshot also carries the evaluation setup generation, a counter in
+app_state that `bump_setup_generation()` increments after every survey,
+question, staff or section change. Caches derived from that setup (question
+lists, validation contexts, the staff roster) are keyed on it, so a worker
+that did not make the change switches all of them together as soon as it
+reloads the state, instead of keeping stale copies.
+"""
+import logging
+from collections import namedtuple
+
+from sqlalchemy.exc import IntegrityError
+
+from .cache import TTLCache
+from .models import db, AppState, SurveyStatus, Survey, RankingStatus, Question
+from .rankings import latest_snapshot_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 5
+# app_state key of the evaluation setup generation
+SETUP_GENERATION_KEY = 'evaluation_setup'
+
+SurveyState = namedtuple('SurveyState', [
+    'is_active',              # global evaluation period switch
+    'survey_id',              # first active survey, or None
+    'survey_title',
+    'survey_staff_type',
+    'is_posted_teaching',
+    'is_posted_non_teaching',
+    'display_survey_id',      # survey whose questions the dashboard shows (active, else the first one)
+    'teaching_ranking_snapshot_id',
+    'setup_generation'        # bumped by every survey, question, staff or section change
+])
+
+QuestionEntry = namedtuple('QuestionEntry', ['id', 'criteria', 'text'])
+
+_STATE_KEY = 'survey_state'
+_state = TTLCache(ttl=DEFAULT_TTL_SECONDS, max_entries=1)
+_questions = TTLCache(ttl=DEFAULT_TTL_SECONDS, max_entries=100)
+
+
+def _load_survey_state():
+    status = db.session.query(SurveyStatus.is_active).filter(SurveyStatus.id == 1).first()
+    survey = db.session.query(Survey.id, Survey.title, Survey.staff_type).filter(Survey.is_active == True).first()
+    ranking = db.session.query(RankingStatus.is_posted_teaching, RankingStatus.is_posted_non_teaching).first()
+    if survey:
+        display_survey_id = survey.id
+    else:
+        fallback = db.session.query(Survey.id).first()
+        display_survey_id = fallback.id if fallback else None
+    is_posted_teaching = bool(ranking and ranking.is_posted_teaching)
+    generation = db.session.query(AppState.value).filter(AppState.key == SETUP_GENERATION_KEY).scalar()
+
+    return SurveyState(
+        is_active=bool(status and status.is_active),
+        survey_id=survey.id if survey else None,
+        survey_title=survey.title if survey else None,
+        survey_staff_type=survey.staff_type if survey else None,
+        is_posted_teaching=is_posted_teaching,
+        is_posted_non_teaching=bool(ranking and ranking.is_posted_non_teaching),
+        display_survey_id=display_survey_id,
+        teaching_ranking_snapshot_id=latest_snapshot_id('teaching') if is_posted_teaching else None,
+        setup_generation=generation or 0
+    )
+
+
+def get_survey_state(ttl=None):
+    """Return the cached SurveyState, reloading it from the database when it has expired."""
+    if ttl == 0:
+        return _load_survey_state()
+
+    state = _state.get(_STATE_KEY)
+    if state is None:
+        state = _load_survey_state()
+        _state.set(_STATE_KEY, state, ttl=ttl)
+    return state
+
+
+def cached_survey_questions(survey_id, ttl=None, generation=0):
+    """Return the survey's questions as a tuple of QuestionEntry, cached like the state and keyed on the setup generation."""
+    if not survey_id:
+        return ()
+    if ttl == 0:
+        return _load_questions(survey_id)
+
+    key = (survey_id, generation)
+    questions = _questions.get(key)
+    if questions is None:
+        questions = _load_questions(survey_id)
+        _questions.set(key, questions, ttl=ttl)
+    return questions
+
+
+def _load_questions(survey_id):
+    rows = db.session.query(Question.id, Question.criteria, Question.text).filter(Question.survey_id == survey_id)
+    return tuple(QuestionEntry(*row) for row in rows)
+
+
+def invalidate_survey_state():
+    """Forget the cached state and question lists so the next read goes to the database."""
+    _state.clear()
+    _questions.clear()
+
+
+def bump_setup_generation():
+    """Increment the shared evaluation setup generation (call after the change is committed)."""
+    for _ in range(2):
+        updated = AppState.query.filter_by(key=SETUP_GENERATION_KEY).update(
+            {AppState.value: AppState.value + 1}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(AppState(key=SETUP_GENERATION_KEY, value=1))
+        try:
+            db.session.commit()
+            return
+        except IntegrityError:
+            # Another worker created the row first; increment that one
+            db.session.rollback()
@@ -0,0 +1,96 @@
+# webapp/validation.py
+"""
+Cached validation context for evaluation submissions.
+
+For each (survey, program, section) the context holds the question IDs of
+the survey, the staff a student of that section may evaluate (the section's
+teachers plus all non-teaching staff) and the valid score range. Contexts
+are built on first use and keyed on the evaluation setup generation from
+the survey state, so a submission is validated in memory without extra
+queries, and every worker builds new contexts once it sees that surveys,
+questions, staff or section assignments changed. The worker that made the
+change also drops its contexts at once with `invalidate_validation_contexts()`.
+"""
+import logging
+import uuid
+from collections import namedtuple
+
+from .cache import TTLCache
+from .models import db, Question
+from .roster import staff_for_section
+
+logger = logging.getLogger(__name__)
+
+MIN_SCORE = 1
+MAX_SCORE = 5
+# Bounds how long contexts of an old setup generation stay in memory
+CONTEXT_TTL_SECONDS = 3600
+
+ValidationContext = namedtuple('ValidationContext', ['survey_id', 'question_ids', 'staff_ids', 'min_score', 'max_score'])
+
+_contexts = TTLCache(ttl=CONTEXT_TTL_SECONDS, max_entries=1000)
+
+
+def _build_context(survey_id, program, section, generation):
+    question_ids = frozenset(
+        question_id for (question_id,) in
+        db.session.query(Question.id).filter(Question.survey_id == survey_id)
+    )
+
+    # Same staff list the student dashboard renders
+    staff_ids = frozenset(entry.id for entry in staff_for_section(program, section, generation))
+
+    return ValidationContext(survey_id, question_ids, staff_ids, MIN_SCORE, MAX_SCORE)
+
+
+def get_validation_context(survey_id, program, section, generation=0):
+    """Return the cached context for (survey, program, section) at a setup generation, building it on a miss."""
+    key = (survey_id, program, section, generation)
+    context = _contexts.get(key)
+    if context is None:
+        context = _build_context(survey_id, program, section, generation)
+        _contexts.set(key, context)
+        logger.debug(f"Built validation context for {key}: {len(context.question_ids)} questions, "
+                     f"{len(context.staff_ids)} staff")
+    return context
+
+
+def invalidate_validation_contexts():
+    """Drop every cached context (call after survey, question, staff or section changes)."""
+    _contexts.clear()
+
+
+def validate_submission(context, answers, comments):
+    """
+    Check a parsed submission against a validation context.
+
+    Args:
+        answers: {question_uuid: ["score|teacher_id", ...]} as returned by parse_submission_form
+        comments: [(teacher_uuid, text), ...]
+
+    Returns:
+        list: human-readable problems; empty when the submission is valid
+    """
+    errors = []
+    for question_uuid, teacher_scores in answers.items():
+        if question_uuid not in context.question_ids:
+            errors.append(f'Unknown question {question_uuid}')
+            continue
+        for entry in teacher_scores:
+            score_str, teacher_id_str = entry.split('|', 1)
+            score = int(score_str)
+            if not context.min_score <= score <= context.max_score:
+                errors.append(f'Score {score} out of range for question {question_uuid}')
+            try:
+                teacher_uuid = uuid.UUID(teacher_id_str)
+            except ValueError:
+                errors.append(f'Invalid staff id {teacher_id_str}')
+                continue
+            if teacher_uuid not in context.staff_ids:
+                errors.append(f'Staff {teacher_id_str} is not assigned to this section')
+
+    for teacher_uuid, _ in comments:
+        if teacher_uuid not in context.staff_ids:
+            errors.append(f'Comment for staff {teacher_uuid} who is not assigned to this section')
+
+    return errors